@@ -1,18 +1,59 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from ..rag.qdrant_handler import QdrantHandler, Distance
+from ..rag.qdrant_handler import QUANTIZATION_TYPES, Distance
+from ..rag.async_qdrant_handler import AsyncQdrantHandler
+from ..rag.local_store import AsyncLocalVectorStore
 from ..embedding.main import BGEEmbedding
-from ..utils.document_handler import DocumentHandler
-from ..llm.main import LLMHandler
+from ..embedding.cache import EmbeddingCache
+from ..rag.ingestion import IngestionPipeline
+from ..rag.context_builder import ContextBuilder
+from ..rag.filters import FilterError, PayloadIndexer, default_compiler
+from ..rag.sparse import SEARCH_MODES, SparseEncoder
+from ..rag.reranker import CrossEncoderReranker
+from ..utils.chunker import HuggingFaceTokenizer
+from ..llm.main import LLMError, LLMHandler
+from ..llm.lifecycle import ModelLifecycle, ModelNotReadyError
+from ..llm.prefix_cache import PrefixCache
+from ..llm.response_cache import ResponseCache, context_fingerprint
+from ..llm.speculative import SpeculativeDecoder
+from ..llm.scheduler import GenerationScheduler, GenerationTimeoutError, SchedulerOverloadedError
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
+import shutil
+import time
 import uuid
-from ..config import FastAPIConfig
+from pathlib import Path
+from ..config import ContextConfig, DocumentHandlerConfig, FastAPIConfig, EmbeddingConfig, EmbeddingCacheConfig, CollectionConfig, HybridSearchConfig, IngestionConfig, LLMConfig, PrefixCacheConfig, QdrantConfig, RerankConfig, ResponseCacheConfig, SpeculativeConfig, VectorStoreConfig
 load_dotenv()
 
-app = FastAPI(title="FLARE API", description="API for FLARE RAG system")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用程式生命週期：啟動時建立長連線，關閉時釋放"""
+    await qdrant_handler.start()
+    if embedding_cache is not None:
+        await asyncio.to_thread(embedding_cache.open)
+    generation_scheduler.start()
+    # 依 load_mode 立即、背景或在第一個請求時載入模型
+    await model_lifecycle.start()
+    # 預設開啟重新排序時先載入 cross-encoder，避免第一個請求因載入而超過延遲預算
+    if RerankConfig["enabled"]:
+        await asyncio.to_thread(reranker.load)
+    yield
+    generation_scheduler.stop()
+    await model_lifecycle.close()
+    await qdrant_handler.close()
+    await embedder.aclose()
+    ingestion_pipeline.close()
+    if embedding_cache is not None:
+        embedding_cache.close()
+
+app = FastAPI(title="FLARE API", description="API for FLARE RAG system", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,11 +63,85 @@ app.add_middleware(
     allow_headers=["*"],              # 允許所有 headers
 )
 
-# 初始化 QdrantHandler
-qdrant_handler = QdrantHandler(host=os.getenv("QDRANT_HOST"), port=os.getenv("QDRANT_PORT"))
+# 初始化向量庫：AsyncQdrantHandler（整個程序共用一個長連線的非同步客戶端）或程序內的本地向量庫
+if VectorStoreConfig["backend"] == "local":
+    qdrant_handler = AsyncLocalVectorStore(
+        path=VectorStoreConfig["path"],
+        vector_size=FastAPIConfig["vector_size"],
+        index=VectorStoreConfig["index"],
+        ivf_nlist=VectorStoreConfig["ivf_nlist"],
+        ivf_nprobe=VectorStoreConfig["ivf_nprobe"],
+        ivf_min_points=VectorStoreConfig["ivf_min_points"]
+    )
+else:
+    qdrant_handler = AsyncQdrantHandler(
+        host=os.getenv("QDRANT_HOST"),
+        port=os.getenv("QDRANT_PORT"),
+        grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+        upsert_batch_size=QdrantConfig["upsert_batch_size"],
+        upsert_parallel=QdrantConfig["upsert_parallel"],
+        payload_indexer=PayloadIndexer(QdrantConfig["auto_index_min_uses"]) if QdrantConfig["auto_index_min_uses"] else None
+    )
+
+def embedding_cache_dir() -> Optional[str]:
+    """
+    嵌入快取的磁碟目錄
+    
+    EMBEDDING_CACHE_DIR 環境變數優先於設定值；相對路徑以專案根目錄（src 的上一層）為準，
+    不受啟動時的工作目錄影響。
+    """
+    cache_dir = os.getenv("EMBEDDING_CACHE_DIR") or EmbeddingCacheConfig["cache_dir"]
+    if cache_dir is None:
+        return None
+    path = Path(cache_dir).expanduser()
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parents[3] / path
+    return str(path)
+
+# 初始化嵌入快取（/add、/upload、/search、/chat 共用），磁碟存放區在 lifespan 開啟
+embedding_cache = None
+if EmbeddingCacheConfig["enabled"]:
+    embedding_cache = EmbeddingCache(
+        model_name=EmbeddingConfig["model_name"],
+        cache_dir=embedding_cache_dir(),
+        memory_budget_bytes=EmbeddingCacheConfig["memory_budget_mb"] * 1024 * 1024
+    )
 
 # 初始化 BGEEmbedding
-embedder = BGEEmbedding()
+embedder = BGEEmbedding(**EmbeddingConfig, cache=embedding_cache)
+
+# 初始化 BM25 稀疏向量編碼器（混合檢索）
+sparse_encoder = SparseEncoder(
+    k1=HybridSearchConfig["k1"],
+    b=HybridSearchConfig["b"],
+    avg_length=HybridSearchConfig["avg_length"]
+)
+
+# 初始化文件匯入管線
+ingestion_pipeline = IngestionPipeline(
+    embedder=embedder,
+    qdrant_handler=qdrant_handler,
+    embed_batch_size=IngestionConfig["embed_batch_size"],
+    upsert_batch_size=IngestionConfig["upsert_batch_size"],
+    embed_concurrency=IngestionConfig["embed_concurrency"],
+    upsert_concurrency=IngestionConfig["upsert_concurrency"],
+    queue_size=IngestionConfig["queue_size"],
+    parallel_extraction=IngestionConfig["parallel_extraction"],
+    extraction_workers=IngestionConfig["extraction_workers"],
+    min_parallel_pages=IngestionConfig["min_parallel_pages"],
+    tokenizer_name=DocumentHandlerConfig["tokenizer_name"],
+    sparse_encoder=sparse_encoder
+)
+
+# 初始化 cross-encoder 重新排序（模型在第一次使用或啟動時載入）
+reranker = CrossEncoderReranker(
+    model_name=RerankConfig["model_name"],
+    device=RerankConfig["device"],
+    batch_size=RerankConfig["batch_size"],
+    max_length=RerankConfig["max_length"],
+    max_cached_scores=RerankConfig["max_cached_scores"],
+    quantize=RerankConfig["quantize"]
+)
 
 # 初始化 LLMHandler
 generation_config = {
@@ -37,29 +152,229 @@ generation_config = {
     "num_return_sequences": 1
 }
 
+# 初始化回應快取（鍵含檢查點、生成參數與檢索內容指紋）
+response_cache = None
+if ResponseCacheConfig["enabled"]:
+    response_cache = ResponseCache(
+        max_entries=ResponseCacheConfig["max_entries"],
+        ttl_seconds=ResponseCacheConfig["ttl_seconds"],
+        cache_sampled=ResponseCacheConfig["cache_sampled"],
+        semantic_threshold=ResponseCacheConfig["semantic_threshold"]
+    )
+
+prefix_cache = None
+if PrefixCacheConfig["enabled"]:
+    prefix_cache = PrefixCache(
+        max_bytes=PrefixCacheConfig["max_mb"] * 1024 * 1024,
+        block_size=PrefixCacheConfig["block_size"]
+    )
+
+speculative = None
+if SpeculativeConfig["enabled"]:
+    speculative = SpeculativeDecoder(
+        mode=SpeculativeConfig["mode"],
+        draft_model_path=SpeculativeConfig["draft_model_path"],
+        num_draft_tokens=SpeculativeConfig["num_draft_tokens"],
+        max_ngram_size=SpeculativeConfig["max_ngram_size"]
+    )
+
 llm_handler = LLMHandler(
-    fine_tuned_model_path="lora_model",
+    fine_tuned_model_path=LLMConfig["model_path"],
     generation_config=generation_config,
     max_retries=3,
     retry_delay=1.0,
-    use_cpu=os.getenv("USE_CPU") == "True"
+    use_cpu=os.getenv("USE_CPU") == "True",
+    response_cache=response_cache,
+    prefix_cache=prefix_cache,
+    speculative=speculative,
+    merge_lora=LLMConfig["merge_lora"],
+    merged_model_dir=LLMConfig["merged_model_dir"],
+    extra_adapters=LLMConfig["adapters"],
+    max_adapters=LLMConfig["max_adapters"],
+    cpu_precision=LLMConfig["cpu_precision"],
+    num_threads=LLMConfig["num_threads"],
+    num_interop_threads=LLMConfig["num_interop_threads"],
+    max_memory=LLMConfig["max_memory"]
+)
+
+# 模型不在匯入時載入，由 lifespan 依 load_mode 處理
+model_lifecycle = ModelLifecycle(
+    llm_handler,
+    load_mode=LLMConfig["load_mode"],
+    reload_interval=LLMConfig["adapter_reload_interval"]
 )
-llm_handler.load_fine_tuned_model()
 
-def ensure_handler_initialized():
-    """確保 Qdrant 處理器已初始化"""
+# 初始化批次生成排程器：併發的 /chat 請求會被合併成批次生成
+generation_scheduler = GenerationScheduler(
+    llm_handler,
+    max_batch_size=LLMConfig["max_batch_size"],
+    max_wait_ms=LLMConfig["batch_wait_ms"],
+    max_queue_size=LLMConfig["max_queue_size"],
+    max_streams=LLMConfig["max_streams"]
+)
+
+
+def overloaded(e: SchedulerOverloadedError) -> HTTPException:
+    """生成佇列已滿時回傳 429，並以 Retry-After 告知建議的重試秒數"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def model_not_ready(e: ModelNotReadyError) -> HTTPException:
+    """模型尚未就緒時回傳 503"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+def resolve_adapter(adapter: Optional[str], collection_name: str) -> Optional[str]:
+    """決定請求使用的 adapter：指定的 adapter 優先，其次是集合對應的 adapter"""
+    adapter = adapter or LLMConfig["collection_adapters"].get(collection_name)
+    if adapter is None:
+        return None
+    loaded = [info["name"] for info in llm_handler.adapter_stats()["adapters"]]
+    if adapter not in loaded:
+        raise HTTPException(status_code=404, detail=f"Adapter {adapter} not loaded")
+    return adapter
+
+# 以 LLM 的 tokenizer 計算參考資料的 token 數，模型載入後才建立
+context_builder: Optional[ContextBuilder] = None
+
+def get_context_builder() -> ContextBuilder:
+    """取得使用目前 LLM tokenizer 的 ContextBuilder"""
+    global context_builder
+    tokenizer = llm_handler.fine_tuned_tokenizer
+    if context_builder is None or context_builder.tokenizer.tokenizer is not tokenizer:
+        context_builder = ContextBuilder(
+            tokenizer=HuggingFaceTokenizer(tokenizer),
+            max_context_tokens=ContextConfig["max_context_tokens"],
+            max_cached_passages=ContextConfig["max_cached_passages"]
+        )
+    return context_builder
+
+def search_mode_args(query: str, mode: str, limit: int) -> Dict[str, Any]:
+    """
+    檢索模式的搜尋參數
+    
+    Args:
+        query (str): 查詢文字
+        mode (str): "dense"、"sparse"（BM25）或 "hybrid"（dense + BM25 以 RRF 融合）
+        limit (int): 結果數量
+        
+    Returns:
+        Dict[str, Any]: 傳給向量庫 search 的 mode、sparse_vector 與 prefetch_limit
+    """
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if mode == "dense":
+        return {"mode": mode}
+    return {
+        "mode": mode,
+        "sparse_vector": sparse_encoder.encode_query(query),
+        "prefetch_limit": limit * HybridSearchConfig["prefetch_factor"]
+    }
+
+def search_params_args(
+    rescore: Optional[bool] = CollectionConfig["search_rescore"],
+    oversampling: Optional[float] = CollectionConfig["search_oversampling"],
+    hnsw_ef: Optional[int] = CollectionConfig["search_hnsw_ef"]
+) -> Optional[Dict[str, Any]]:
+    """搜尋參數（rescore 與 oversampling 只影響量化的集合），皆未指定時回傳 None"""
+    params = {"rescore": rescore, "oversampling": oversampling, "hnsw_ef": hnsw_ef}
+    return {key: value for key, value in params.items() if value is not None} or None
+
+def validate_filter(filter_expression: Optional[Dict[str, Any]]) -> None:
+    """驗證過濾條件運算式，不合法時回傳 400（編譯結果會被快取，搜尋時不再重複驗證）"""
+    if filter_expression is None:
+        return
+    try:
+        default_compiler.compile(filter_expression)
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def candidate_limit(limit: int, rerank: bool) -> int:
+    """向量搜尋的結果數：重新排序時至少取 RerankConfig["candidates"] 個候選"""
+    return max(limit, RerankConfig["candidates"]) if rerank else limit
+
+async def rerank_results(query: str, results: List[Dict[str, Any]], top_k: int, started_at: float) -> List[Dict[str, Any]]:
+    """
+    以 cross-encoder 重新排序搜尋結果
+    
+    在執行緒中計算，不阻塞事件迴圈。延遲預算從請求開始（started_at，time.monotonic()）
+    計算，剩餘時間不足時維持搜尋順序並取前 top_k 個。
+    
+    Args:
+        query (str): 查詢文字
+        results (List[Dict[str, Any]]): 搜尋結果
+        top_k (int): 保留的結果數
+        started_at (float): 請求開始的 time.monotonic()
+        
+    Returns:
+        List[Dict[str, Any]]: 重新排序後的結果（score 為相關度，retrieval_score 為搜尋分數）
+    """
+    return await asyncio.to_thread(
+        reranker.rerank,
+        query,
+        results,
+        top_k=top_k,
+        deadline=started_at + RerankConfig["budget_ms"] / 1000,
+        min_score=RerankConfig["min_score"]
+    )
+
+async def retrieve_context(prompt: str, collection_name: str, limit: int, score_threshold: Optional[float], mode: str = HybridSearchConfig["default_mode"], filter_expression: Optional[Dict[str, Any]] = None, rerank: bool = RerankConfig["enabled"]):
+    """
+    檢索並組合參考資料，回傳 (查詢向量, 參考資料, instruction, input_text)
+    
+    rerank 時先取較多候選，以 cross-encoder 重新排序後只保留最相關的
+    min(limit, RerankConfig["top_k"]) 個段落，縮短提示。沒有檢索結果時維持原本的
+    提示（空 instruction 與原始問題）。
+    """
+    started_at = time.monotonic()
+    search_limit = candidate_limit(limit, rerank)
+    mode_args = search_mode_args(prompt, mode, search_limit)
+    validate_filter(filter_expression)
+    await ensure_handler_initialized()
+    vectors = await embedder.aget_embedding(prompt)
+    results = await qdrant_handler.search(
+        collection_name=collection_name,
+        query_vector=vectors.tolist(),
+        limit=search_limit,
+        score_threshold=score_threshold,
+        filter_expression=filter_expression,
+        search_params=search_params_args(),
+        **mode_args
+    )
+    if rerank:
+        results = await rerank_results(prompt, results, min(limit, RerankConfig["top_k"]), started_at)
+    await model_lifecycle.ensure_ready(LLMConfig["request_timeout"])
+    built = get_context_builder().build(results)
+    if not built.text:
+        return vectors, built, "", prompt
+    input_text = ContextConfig["input_template"].format(context=built.text, question=prompt)
+    return vectors, built, ContextConfig["instruction"], input_text
+
+async def ensure_handler_initialized():
+    """確保向量庫已初始化"""
     if not qdrant_handler.client:
-        qdrant_handler.start()
+        await qdrant_handler.start()
 
 @app.post("/collection/create")
-async def create_collection(collection_name: str, vector_size: int, distance: str):
-    """創建新的 collection"""
+async def create_collection(collection_name: str, vector_size: int, distance: str, sparse: bool = HybridSearchConfig["sparse"], quantization: Optional[str] = CollectionConfig["quantization"], on_disk: bool = CollectionConfig["on_disk"], on_disk_payload: Optional[bool] = CollectionConfig["on_disk_payload"], hnsw_m: Optional[int] = CollectionConfig["hnsw_m"], hnsw_ef_construct: Optional[int] = CollectionConfig["hnsw_ef_construct"]):
+    """
+    創建新的 collection
+
+    sparse=True 時同時儲存 BM25 稀疏向量（供 sparse 與 hybrid 檢索）；quantization 為
+    scalar、product 或 binary 時量化向量常駐記憶體，搭配 on_disk 可讓原始向量只存於磁碟
+    """
+    if quantization is not None and quantization not in QUANTIZATION_TYPES:
+        raise HTTPException(status_code=400, detail=f"quantization must be one of {', '.join(QUANTIZATION_TYPES)}")
     try:
-        ensure_handler_initialized()
-        qdrant_handler.create_collection(
+        await ensure_handler_initialized()
+        await qdrant_handler.create_collection(
             collection_name=collection_name,
             vector_size=vector_size,
-            distance=Distance[distance]
+            distance=Distance[distance],
+            sparse=sparse,
+            quantization=quantization,
+            on_disk=on_disk,
+            on_disk_payload=on_disk_payload,
+            hnsw_m=hnsw_m,
+            hnsw_ef_construct=hnsw_ef_construct
         )
         return {"message": f"Collection {collection_name} created successfully"}
     except Exception as e:
@@ -69,8 +384,8 @@ async def create_collection(collection_name: str, vector_size: int, distance: st
 async def add_vectors(collection_name: str, chunk: str, payloads: List[Dict[str, Any]]):
     """添加chunk到集合"""
     try:
-        ensure_handler_initialized()
-        vectors = embedder.get_embedding(chunk)
+        await ensure_handler_initialized()
+        vectors = await embedder.aget_embedding(chunk)
         # 將 numpy 數組轉換為 Python 列表
         vectors_list = vectors.tolist()
         
@@ -84,31 +399,84 @@ async def add_vectors(collection_name: str, chunk: str, payloads: List[Dict[str,
             merged_payload["text"] = chunk
             merged_payloads.append(merged_payload)
         
-        qdrant_handler.add(
+        await qdrant_handler.add(
             collection_name=collection_name,
             vectors=[vectors_list],  # 包裝成二維列表
             payloads=merged_payloads,
-            ids=[point_id]
+            ids=[point_id],
+            sparse_vectors=[sparse_encoder.encode_document(chunk)]
         )
         return {"message": "Vectors added successfully", "id": point_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/search")
-async def search_vectors(collection_name: str, query: str, limit: int = FastAPIConfig["search_limit"], score_threshold: Optional[float] = FastAPIConfig["score_threshold"]):
-    """搜索相似向量"""
+async def search_vectors(collection_name: str, query: str, limit: int = FastAPIConfig["search_limit"], score_threshold: Optional[float] = FastAPIConfig["score_threshold"], mode: str = HybridSearchConfig["default_mode"], filter_expression: Optional[Dict[str, Any]] = None, rescore: Optional[bool] = CollectionConfig["search_rescore"], oversampling: Optional[float] = CollectionConfig["search_oversampling"], hnsw_ef: Optional[int] = CollectionConfig["search_hnsw_ef"], rerank: bool = RerankConfig["enabled"]):
+    """搜索相似向量（mode：dense、sparse 或 hybrid；請求內容可帶巢狀的過濾條件運算式；rescore 與 oversampling 用於量化的集合；rerank 以 cross-encoder 重新排序）"""
     try:
-        ensure_handler_initialized()
-        vectors = embedder.get_embedding(query)
+        started_at = time.monotonic()
+        search_limit = candidate_limit(limit, rerank)
+        mode_args = search_mode_args(query, mode, search_limit)
+        validate_filter(filter_expression)
+        await ensure_handler_initialized()
+        vectors = await embedder.aget_embedding(query)
         # 將 numpy 數組轉換為 Python 列表
         vectors_list = vectors.tolist()
-        results = qdrant_handler.search(
+        results = await qdrant_handler.search(
             collection_name=collection_name,
             query_vector=vectors_list,
-            limit=limit,
-            score_threshold=score_threshold
+            limit=search_limit,
+            score_threshold=score_threshold,
+            filter_expression=filter_expression,
+            search_params=search_params_args(rescore, oversampling, hnsw_ef),
+            **mode_args
         )
+        if rerank:
+            results = await rerank_results(query, results, limit, started_at)
         return results
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BatchSearchQuery(BaseModel):
+    """/search/batch 的單一查詢"""
+    query: str
+    collection_name: str = FastAPIConfig["collection_name"]
+    limit: int = FastAPIConfig["search_limit"]
+    score_threshold: Optional[float] = FastAPIConfig["score_threshold"]
+    mode: str = HybridSearchConfig["default_mode"]
+    filter_expression: Optional[Dict[str, Any]] = None
+
+@app.post("/search/batch")
+async def search_vectors_batch(queries: List[BatchSearchQuery]):
+    """批次搜索：所有查詢一次嵌入，每個集合送出一個批次搜尋，結果依請求順序回傳"""
+    if len(queries) > FastAPIConfig["max_batch_queries"]:
+        raise HTTPException(status_code=400, detail=f"At most {FastAPIConfig['max_batch_queries']} queries per batch")
+    if not queries:
+        return []
+    mode_args = [search_mode_args(query.query, query.mode, query.limit) for query in queries]
+    for query in queries:
+        validate_filter(query.filter_expression)
+    try:
+        await ensure_handler_initialized()
+        # 相同的查詢文字（例如同一指標查詢多個集合）只嵌入一次
+        texts = list(dict.fromkeys(query.query for query in queries))
+        embeddings = await embedder.aget_embeddings(texts)
+        rows = {text: row for row, text in enumerate(texts)}
+        searches = [
+            {
+                "collection_name": query.collection_name,
+                "query_vector": embeddings[rows[query.query]].tolist(),
+                "limit": query.limit,
+                "score_threshold": query.score_threshold,
+                "filter_expression": query.filter_expression,
+                "search_params": search_params_args(),
+                **args
+            }
+            for query, args in zip(queries, mode_args)
+        ]
+        return await qdrant_handler.search_batch(searches)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -116,8 +484,8 @@ async def search_vectors(collection_name: str, query: str, limit: int = FastAPIC
 async def delete_collection(collection_name: str):
     """刪除指定的集合"""
     try:
-        ensure_handler_initialized()
-        result = qdrant_handler.manage("delete", collection_name=collection_name)
+        await ensure_handler_initialized()
+        result = await qdrant_handler.manage("delete", collection_name=collection_name)
         return {"message": f"Collection {collection_name} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -126,8 +494,8 @@ async def delete_collection(collection_name: str):
 async def get_collection_info(collection_name: str):
     """獲取指定集合的信息"""
     try:
-        ensure_handler_initialized()
-        info = qdrant_handler.manage("get_info", collection_name=collection_name)
+        await ensure_handler_initialized()
+        info = await qdrant_handler.manage("get_info", collection_name=collection_name)
         return info
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -136,64 +504,255 @@ async def get_collection_info(collection_name: str):
 async def list_collections():
     """列出所有可用的集合"""
     try:
-        ensure_handler_initialized()
-        collections = qdrant_handler.list_collections()
+        await ensure_handler_initialized()
+        collections = await qdrant_handler.list_collections()
         return {"collections": collections}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/embedding/cache/stats")
+async def get_embedding_cache_stats():
+    """取得嵌入快取的命中統計"""
+    if embedding_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_cache.stats()}
+
+
+@app.get("/rerank/stats")
+async def get_rerank_stats():
+    """取得重新排序的次數、略過次數（超過延遲預算）與分數快取的命中統計"""
+    return {"enabled": RerankConfig["enabled"], **reranker.stats()}
+
+
+@app.get("/health/live")
+async def health_live():
+    """存活檢查：程序可回應請求即為存活"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """就緒檢查：模型已載入且向量資料庫客戶端已啟動"""
+    model = model_lifecycle.status()
+    ready = model_lifecycle.ready and qdrant_handler.client is not None
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "model": model, "qdrant": qdrant_handler.client is not None}
+    )
+
+
+@app.get("/llm/stats")
+async def get_llm_stats():
+    """取得批次生成排程器、回應快取、前綴 KV cache 與推測解碼的統計"""
+    return {
+        "scheduler": generation_scheduler.stats(),
+        # cacheable 為 False 時目前的生成參數（取樣）不會被快取，命中率維持 0
+        "response_cache": {**response_cache.stats(), "cacheable": response_cache.is_cacheable(llm_handler.generation_config)} if response_cache is not None else {"enabled": False},
+        "prefix_cache": prefix_cache.stats() if prefix_cache is not None else {"enabled": False},
+        "speculative": speculative.stats() if speculative is not None else {"enabled": False},
+        "context_builder": context_builder.stats() if context_builder is not None else None
+    }
+
+
+@app.get("/llm/adapters")
+async def list_adapters():
+    """列出已載入的 adapter，含載入時間、記憶體用量與切換統計"""
+    return llm_handler.adapter_stats()
+
+
+@app.post("/llm/adapters")
+async def load_adapter(name: str, path: str, default: bool = False):
+    """在共用的基礎模型上載入 adapter"""
+    try:
+        await model_lifecycle.ensure_ready(LLMConfig["request_timeout"])
+        return await asyncio.to_thread(llm_handler.load_adapter, name, path, default)
+    except ModelNotReadyError as e:
+        raise model_not_ready(e)
+    except LLMError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/llm/adapters/{name}")
+async def unload_adapter(name: str):
+    """卸載 adapter"""
+    try:
+        await asyncio.to_thread(llm_handler.unload_adapter, name)
+        return {"message": f"Adapter {name} unloaded"}
+    except LLMError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/llm/adapters/reload")
+async def reload_adapters():
+    """立即檢查並載入新的檢查點"""
+    try:
+        await model_lifecycle.ensure_ready(LLMConfig["request_timeout"])
+        name = await asyncio.to_thread(llm_handler.refresh_adapters)
+        return {"loaded": name, **llm_handler.adapter_stats()}
+    except ModelNotReadyError as e:
+        raise model_not_ready(e)
+    except LLMError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def save_upload(file: UploadFile) -> str:
+    """將上傳的文件串流儲存在 upload_dir，避免整個文件載入記憶體"""
+    upload_dir = IngestionConfig["upload_dir"]
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, f"{uuid.uuid4()}_{os.path.basename(file.filename)}")
+
+    def write_file():
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(file.file, f)
+
+    await asyncio.to_thread(write_file)
+    return file_path
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...), collection_name: str = FastAPIConfig["collection_name"], chunk_size: int = FastAPIConfig["chunk_size"], chunk_overlap: int = FastAPIConfig["chunk_overlap"]):
-    """上傳文件"""
+    """上傳文件，於背景匯入並立即回傳工作 ID"""
     try:
-        ensure_handler_initialized()
-        # 讀取文件內容
-        file_content = await file.read()
-        # 將文件儲存在tmp
-        file_path = f"./tmp/{uuid.uuid4()}_{file.filename}"
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        # 使用 DocumentHandler 處理文件
-        document_handler = DocumentHandler()
-        chunks = document_handler.process_document(file_path, chunk_size, chunk_overlap)
-        # 將 chunks 添加到集合
-        for chunk in chunks:
-            vectors = embedder.get_embedding(chunk)
-            # 將 numpy 數組轉換為 Python 列表
-            vectors_list = vectors.tolist()
-            qdrant_handler.add(
+        await ensure_handler_initialized()
+        file_path = await save_upload(file)
+        # 由匯入管線在背景處理 解析 → 分塊 → 嵌入 → 寫入
+        job = ingestion_pipeline.submit(
+            file_path=file_path,
+            collection_name=collection_name,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            filename=file.filename,
+            delete_file=True
+        )
+        return {"message": "File accepted for ingestion", "job_id": job.job_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/upload/batch")
+async def upload_files(files: List[UploadFile] = File(...), collection_name: str = FastAPIConfig["collection_name"], chunk_size: int = FastAPIConfig["chunk_size"], chunk_overlap: int = FastAPIConfig["chunk_overlap"]):
+    """一次上傳多個文件，各文件為獨立的匯入工作並共用抽取程序池"""
+    try:
+        await ensure_handler_initialized()
+        job_ids = []
+        for file in files:
+            file_path = await save_upload(file)
+            job = ingestion_pipeline.submit(
+                file_path=file_path,
                 collection_name=collection_name,
-                vectors=[vectors_list],
-                payloads=[{"text": chunk}],
-                ids=[str(uuid.uuid4())]
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                filename=file.filename,
+                delete_file=True
             )
-            
-        return {"message": "File uploaded successfully"}
+            job_ids.append(job.job_id)
+        return {"message": f"{len(job_ids)} files accepted for ingestion", "job_ids": job_ids}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/upload/{job_id}")
+async def get_upload_status(job_id: str):
+    """查詢文件匯入工作的進度"""
+    job = ingestion_pipeline.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+
 @app.post("/chat")
-async def chat(prompt: str, collection_name: str = FastAPIConfig["collection_name"], limit: int = FastAPIConfig["search_limit"], score_threshold: Optional[float] = FastAPIConfig["score_threshold"]):
-    """聊天"""
+async def chat(prompt: str, collection_name: str = FastAPIConfig["collection_name"], limit: int = FastAPIConfig["search_limit"], score_threshold: Optional[float] = FastAPIConfig["score_threshold"], adapter: Optional[str] = None, mode: str = HybridSearchConfig["default_mode"], filter_expression: Optional[Dict[str, Any]] = None, rerank: bool = RerankConfig["enabled"]):
+    """聊天：以檢索到的參考資料（在 token 預算內，可先以 cross-encoder 重新排序）組合提示後生成回應"""
     try:
-        ensure_handler_initialized()
-        vectors = embedder.get_embedding(prompt)
-        # 將 numpy 數組轉換為 Python 列表
-        vectors_list = vectors.tolist()
-        results = qdrant_handler.search(
-            collection_name=collection_name,
-            query_vector=vectors_list,
-            limit=limit,
-            score_threshold=score_threshold
+        vectors, built, instruction, input_text = await retrieve_context(prompt, collection_name, limit, score_threshold, mode, filter_expression, rerank)
+        future = generation_scheduler.submit(
+            instruction=instruction,
+            input_text=input_text,
+            context=context_fingerprint([built.text]),
+            query_embedding=vectors,
+            timeout=LLMConfig["request_timeout"],
+            adapter=resolve_adapter(adapter, collection_name)
         )
-        print(results)
-        result = llm_handler.generate_fine_tuned_response(instruction="", input_text=prompt)
-        return result
+        # 逾時或用戶端斷線而取消時，wrap_future 會一併取消尚未開始的生成
+        result = await asyncio.wait_for(asyncio.wrap_future(future), LLMConfig["request_timeout"])
+        return {"response": result, "sources": built.passages, "context_tokens": built.token_count}
+    except HTTPException:
+        raise
+    except ModelNotReadyError as e:
+        raise model_not_ready(e)
+    except SchedulerOverloadedError as e:
+        raise overloaded(e)
+    except (asyncio.TimeoutError, GenerationTimeoutError):
+        raise HTTPException(status_code=504, detail="Generation timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """格式化一則 Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request, prompt: str, collection_name: str = FastAPIConfig["collection_name"], limit: int = FastAPIConfig["search_limit"], score_threshold: Optional[float] = FastAPIConfig["score_threshold"], adapter: Optional[str] = None, mode: str = HybridSearchConfig["default_mode"], filter_expression: Optional[Dict[str, Any]] = None, rerank: bool = RerankConfig["enabled"]):
+    """聊天（以 Server-Sent Events 先回傳參考資料，再逐段回傳生成的文字，最後回傳 TTFT 與生成速度）"""
+    try:
+        vectors, built, instruction, input_text = await retrieve_context(prompt, collection_name, limit, score_threshold, mode, filter_expression, rerank)
+        adapter = resolve_adapter(adapter, collection_name)
+        config = dict(llm_handler.generation_config)
+        context = context_fingerprint([built.text])
+        cached = llm_handler.cached_response(instruction, input_text, config, context, vectors, adapter)
+        stream = None
+        if cached is None:
+            # 切換 adapter 可能需要等待其他生成結束，不在事件迴圈上等待
+            stream = await asyncio.to_thread(
+                generation_scheduler.open_stream, instruction, input_text, config, adapter
+            )
+    except HTTPException:
+        raise
+    except ModelNotReadyError as e:
+        raise model_not_ready(e)
+    except SchedulerOverloadedError as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        yield sse_event({"sources": built.passages, "context_tokens": built.token_count}, event="context")
+        if cached is not None:
+            yield sse_event({"text": cached})
+            yield sse_event({"cached": True}, event="stats")
+            yield sse_event({}, event="done")
+            return
+        pieces = iter(stream)
+        generated = []
+        try:
+            while True:
+                # 用戶端斷線時停止生成，釋放模型運算
+                if await request.is_disconnected():
+                    return
+                text = await asyncio.to_thread(next, pieces, None)
+                if text is None:
+                    break
+                generated.append(text)
+                yield sse_event({"text": text})
+            # 只快取完整生成的回應
+            llm_handler.cache_response(instruction, input_text, config, "".join(generated).strip(), context, vectors, adapter)
+            yield sse_event({**stream.stats(), "cached": False}, event="stats")
+            yield sse_event({}, event="done")
+        except Exception as e:
+            yield sse_event({"detail": str(e)}, event="error")
+        finally:
+            stream.stop()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,15 +1,59 @@
 DocumentHandlerConfig = {
     "chunk_size": 1000,
-    "chunk_overlap": 200
+    "chunk_overlap": 200,
+    "tokenizer_name": "BAAI/bge-m3"
 }
 
 QdrantConfig = {
     "url": "http://localhost:6333",
-    "api_key": "1234567890"
+    "api_key": "1234567890",
+    "upsert_batch_size": 256,
+    "upsert_parallel": 4,
+    "auto_index_min_uses": 100  # 欄位被過濾的次數達到此值時自動建立 payload 索引，None 關閉
+}
+
+VectorStoreConfig = {
+    "backend": "qdrant",        # qdrant：連線 Qdrant 伺服器；local：程序內的嵌入式向量庫
+    "path": "vector_store",     # local 後端的資料目錄
+    "index": None,              # local 後端：None 為精確搜尋，"ivf" 為 IVF 索引
+    "ivf_nlist": None,          # IVF bucket 數，None 為集合大小的平方根
+    "ivf_nprobe": 8,            # 每次查詢掃描的 bucket 數
+    "ivf_min_points": 20000     # 集合達到此大小才使用 IVF 索引
+}
+
+CollectionConfig = {
+    # 建立集合的預設值（/collection/create 可逐一覆寫，只適用於 qdrant 後端）
+    "quantization": None,       # None、"scalar"（int8，約 1/4 記憶體）、"product"（x16）或 "binary"（1 bit，約 1/32）
+    "on_disk": False,           # 原始向量存於磁碟，搭配量化時記憶體只保留量化向量
+    "on_disk_payload": None,    # None 使用伺服器預設
+    "hnsw_m": None,             # HNSW 每個節點的連結數，None 使用伺服器預設（16）
+    "hnsw_ef_construct": None,  # HNSW 建立時的候選數，None 使用伺服器預設（100）
+    # 搜尋時的預設值
+    "search_rescore": True,     # 以原始向量重新計算量化搜尋候選的分數
+    "search_oversampling": 2.0, # 量化搜尋先取 limit * oversampling 個候選再重新計分
+    "search_hnsw_ef": None      # 搜尋時的 HNSW 候選數，None 使用伺服器預設
+}
+
+HybridSearchConfig = {
+    "sparse": True,             # 新建的集合同時儲存 BM25 稀疏向量
+    "default_mode": "hybrid",   # dense、sparse 或 hybrid（dense + BM25 以 RRF 融合）
+    "k1": 1.2,                  # BM25 詞頻飽和參數
+    "b": 0.75,                  # BM25 文件長度正規化
+    "avg_length": 256,          # 預估每個 chunk 的詞數
+    "prefetch_factor": 4        # hybrid 模式每種搜尋先取 limit * prefetch_factor 筆再融合
 }
 
 EmbeddingConfig = {
-    "model_name": "bge-m3:latest"
+    "base_url": "http://localhost:11434",
+    "model_name": "bge-m3:latest",
+    "batch_size": 32,
+    "max_batch_tokens": 8192,
+    "timeout": 60.0,
+    "connect_timeout": 5.0,
+    "max_retries": 3,
+    "backoff_factor": 0.5,
+    "max_connections": 10,
+    "max_concurrency": 4
 }
 
 FastAPIConfig = {
@@ -18,11 +62,89 @@ FastAPIConfig = {
     "distance": "COSINE",
     "search_limit": 10,
     "score_threshold": 0.5,
-    "chunk_size": 2000,
-    "chunk_overlap": 200
+    "chunk_size": 512,     # token 數
+    "chunk_overlap": 64,   # token 數
+    "max_batch_queries": 512  # /search/batch 每次請求的查詢數上限
+}
+
+EmbeddingCacheConfig = {
+    "enabled": True,
+    "cache_dir": "cache/embeddings",  # 相對路徑以專案根目錄為準，可用環境變數 EMBEDDING_CACHE_DIR 覆寫；None 只使用記憶體快取
+    "memory_budget_mb": 64
+}
+
+IngestionConfig = {
+    "embed_batch_size": 32,
+    "upsert_batch_size": 128,
+    "embed_concurrency": 2,
+    "upsert_concurrency": 2,
+    "queue_size": 8,
+    "upload_dir": "./tmp",
+    "parallel_extraction": True,
+    "extraction_workers": None,
+    "min_parallel_pages": 32
 }
 
 LLMConfig = {
     "model_path": "lora_model",
-    "use_cpu": True
+    "use_cpu": True,
+    "load_mode": "background",  # eager / background / lazy
+    "merge_lora": False,        # 合併 LoRA 權重並存成 safetensors，之後直接載入
+    "merged_model_dir": None,   # 預設為 <model_path>/merged
+    "adapters": {},             # 額外載入的 adapter：名稱 → 檢查點目錄
+    "collection_adapters": {},  # 集合名稱 → adapter 名稱，未列出的集合使用預設 adapter
+    "max_adapters": 4,
+    "adapter_reload_interval": 60,  # 檢查新檢查點的間隔（秒），None 表示不熱載入
+    "cpu_precision": "fp32",    # CPU 推論精度：fp32 / bf16 / int8（非 fp32 時合併 LoRA，停用 adapter 切換）
+    "num_threads": None,        # PyTorch intra-op 執行緒數，None 表示使用預設值
+    "num_interop_threads": None,
+    "max_memory": {0: "12GiB", "cpu": "24GiB"},
+    "max_batch_size": 8,
+    "batch_wait_ms": 20,
+    "max_queue_size": 64,     # 等待生成的請求上限，超過時回傳 429
+    "max_streams": 4,         # 同時進行的串流生成上限
+    "request_timeout": 120    # 每個生成請求的期限（秒）
+}
+
+SpeculativeConfig = {
+    "enabled": False,
+    "mode": "prompt_lookup",    # prompt_lookup：從提示（參考資料）比對 n-gram 產生草稿；draft：使用草稿模型
+    "draft_model_path": None,   # draft 模式的小模型，需與微調模型使用相同 tokenizer
+    "num_draft_tokens": 10,     # 每次驗證的草稿 token 數上限
+    "max_ngram_size": 2         # prompt_lookup 比對的最長 n-gram
+}
+
+ContextConfig = {
+    "max_context_tokens": 1024,   # 參考資料的 token 預算（以 LLM tokenizer 計算）
+    "max_cached_passages": 4096,  # 快取 tokenize 結果的段落數
+    "instruction": "請根據參考資料回答問題，資料不足時請說明。",
+    "input_template": "參考資料：\n{context}\n\n問題：{question}"
+}
+
+ResponseCacheConfig = {
+    "enabled": True,
+    "max_entries": 1024,
+    "ttl_seconds": 3600,
+    "cache_sampled": False,     # do_sample=True 的回應預設不快取；API 預設以取樣生成，需開啟此項（相同問題重複使用同一個取樣結果）快取才會命中
+    "semantic_threshold": None  # 例如 0.95，開啟語意快取
+}
+
+PrefixCacheConfig = {
+    "enabled": True,
+    "max_mb": 512,      # 前綴 KV 張量的記憶體上限（MiB），與模型在同一裝置
+    "block_size": 32    # 前綴比對的粒度（token 數）；只用於單一請求的生成與串流
+}
+
+RerankConfig = {
+    "enabled": False,                       # /search、/chat 預設是否重新排序（可逐一請求以 rerank 參數覆寫）
+    "model_name": "BAAI/bge-reranker-base", # cross-encoder 模型（多語系可用 BAAI/bge-reranker-v2-m3）
+    "device": "cpu",
+    "batch_size": 16,           # 每次前向計算的 (查詢, 段落) 數
+    "max_length": 512,          # 每對 (查詢, 段落) 的 token 上限
+    "quantize": False,          # CPU 上以 int8 動態量化 Linear 層
+    "max_cached_scores": 8192,  # 快取的 (查詢, 段落) 分數數量
+    "candidates": 30,           # 向量搜尋先取的候選數
+    "top_k": 4,                 # 重新排序後保留的段落數（/chat 不超過 limit）
+    "budget_ms": 300,           # 從請求開始計算的延遲預算，來不及時略過重新排序
+    "min_score": None           # 例如 0.1，捨棄相關度低於此值的段落
 }
\ No newline at end of file
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """正規化文本（Unicode NFC、合併空白），讓只差在空白的文本共用快取"""
+    return _WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """以 (模型名稱, 正規化文本) 計算快取鍵"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class _DiskStore:
+    """
+    磁碟快取層：向量存放於記憶體映射的 float32 檔案，索引為 append-only 文字檔
+
+    目錄內容：
+        meta.json    模型名稱、向量維度與容量
+        vectors.f32  (capacity, dimension) 的 float32 矩陣
+        index.tsv    每行一筆 "key<TAB>row"
+    """
+
+    def __init__(self, directory: Path, model_name: str, initial_capacity: int = 1024):
+        self.directory = directory
+        self.model_name = model_name
+        self.initial_capacity = initial_capacity
+        self.dimension: Optional[int] = None
+        self.capacity = 0
+        self.index: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._index_file = None
+        self._open()
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.directory / "meta.json"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def _index_path(self) -> Path:
+        return self.directory / "index.tsv"
+
+    def _open(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta = None
+        if self._meta_path.exists():
+            try:
+                meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+            except ValueError:
+                meta = None
+
+        if meta is None or meta.get("model_name") != self.model_name:
+            if meta is not None:
+                logger.info(f"嵌入模型已變更（{meta.get('model_name')} → {self.model_name}），清除磁碟快取")
+            self._reset()
+            return
+
+        self.dimension = meta.get("dimension")
+        self.capacity = meta.get("capacity", 0)
+        if self.dimension and self.capacity and self._vectors_path.exists():
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension)
+            )
+            if self._index_path.exists():
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        key, _, row = line.rstrip("\n").partition("\t")
+                        # 忽略寫入中斷而不完整的行
+                        if row.isdigit() and int(row) < self.capacity:
+                            self.index[key] = int(row)
+        self._index_file = open(self._index_path, "a", encoding="utf-8")
+
+    def _reset(self) -> None:
+        # 目錄可能與其他檔案共用，只刪除本存放區自己的檔案
+        self.close()
+        self._vectors = None
+        for path in (self._meta_path, self._vectors_path, self._index_path):
+            path.unlink(missing_ok=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimension = None
+        self.capacity = 0
+        self.index = {}
+        self._write_meta()
+        self._index_file = open(self._index_path, "a", encoding="utf-8")
+
+    def _write_meta(self) -> None:
+        meta = {"model_name": self.model_name, "dimension": self.dimension, "capacity": self.capacity}
+        self._meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    def _grow(self, minimum: int) -> None:
+        """將向量檔容量加倍直到至少 minimum 列"""
+        capacity = max(self.capacity, self.initial_capacity)
+        while capacity < minimum:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension)
+        )
+        self.capacity = capacity
+        self._write_meta()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return np.array(self._vectors[row])
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if key in self.index:
+            return
+        if self.dimension is None:
+            self.dimension = int(vector.shape[0])
+        elif vector.shape[0] != self.dimension:
+            logger.warning(f"向量維度不符（{vector.shape[0]} != {self.dimension}），略過磁碟快取")
+            return
+        row = len(self.index)
+        if row >= self.capacity:
+            self._grow(row + 1)
+        self._vectors[row] = vector
+        # 先寫入向量再寫入索引，中斷時最多遺失一筆
+        self._index_file.write(f"{key}\t{row}\n")
+        self._index_file.flush()
+        self.index[key] = row
+
+    def clear(self) -> None:
+        self._reset()
+
+    def close(self) -> None:
+        if self._vectors is not None:
+            self._vectors.flush()
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+
+class EmbeddingCache:
+    def __init__(self,
+                 model_name: str,
+                 cache_dir: Optional[str] = None,
+                 memory_budget_bytes: int = 64 * 1024 * 1024,
+                 disk_initial_capacity: int = 1024):
+        """
+        初始化兩層式嵌入向量快取
+
+        第一層為以位元組預算限制的程序內 LRU，第二層（可選）為記憶體映射的
+        磁碟存放區。快取鍵為 (模型名稱, 正規化文本雜湊)，磁碟快取記錄所屬模型，
+        模型名稱變更時自動清除。建立時不會碰觸磁碟，磁碟存放區在呼叫 open()
+        後才啟用，之前只使用記憶體快取。
+
+        Args:
+            model_name (str): 嵌入模型名稱
+            cache_dir (Optional[str]): 磁碟快取目錄，None 表示只使用記憶體快取
+            memory_budget_bytes (int): 記憶體快取的位元組上限
+            disk_initial_capacity (int): 磁碟向量檔的初始列數
+        """
+        self.model_name = model_name
+        self.memory_budget_bytes = memory_budget_bytes
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.cache_dir = cache_dir
+        self.disk_initial_capacity = disk_initial_capacity
+        self._disk = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def open(self) -> None:
+        """開啟磁碟快取（未設定 cache_dir 或已開啟時不做任何事）"""
+        with self._lock:
+            if self.cache_dir is not None and self._disk is None:
+                self._disk = _DiskStore(Path(self.cache_dir), self.model_name, self.disk_initial_capacity)
+
+    def _check_model(self, model_name: str) -> None:
+        """模型名稱變更時清除所有快取"""
+        if model_name != self.model_name:
+            logger.info(f"嵌入模型已變更（{self.model_name} → {model_name}），清除嵌入快取")
+            self.model_name = model_name
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._disk is not None:
+                self._disk.model_name = model_name
+                self._disk.clear()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """放入記憶體 LRU，超出位元組預算時淘汰最久未使用的項目"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if vector.nbytes > self.memory_budget_bytes:
+            return
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.memory_budget_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """
+        查詢單個文本的嵌入向量
+
+        Args:
+            model_name (str): 嵌入模型名稱
+            text (str): 輸入文本
+
+        Returns:
+            Optional[np.ndarray]: 快取的向量，未命中時為 None
+        """
+        key = cache_key(model_name, text)
+        with self._lock:
+            self._check_model(model_name)
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            if self._disk is not None:
+                vector = self._disk.get(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def get_many(self, model_name: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        查詢多個文本的嵌入向量
+
+        Returns:
+            Dict[int, np.ndarray]: 命中的文本索引與對應向量
+        """
+        found = {}
+        for index, text in enumerate(texts):
+            vector = self.get(model_name, text)
+            if vector is not None:
+                found[index] = vector
+        return found
+
+    def put(self, model_name: str, text: str, vector: np.ndarray) -> None:
+        """
+        寫入單個文本的嵌入向量
+
+        Args:
+            model_name (str): 嵌入模型名稱
+            text (str): 輸入文本
+            vector (np.ndarray): 嵌入向量
+        """
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        if not np.all(np.isfinite(vector)):
+            return
+        key = cache_key(model_name, text)
+        with self._lock:
+            self._check_model(model_name)
+            self._remember(key, vector)
+            if self._disk is not None:
+                self._disk.put(key, vector)
+
+    def clear(self) -> None:
+        """清除所有快取與統計"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._disk is not None:
+                self._disk.clear()
+            self.memory_hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            Dict[str, Any]: 命中、未命中、淘汰次數與容量資訊
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "disk_entries": len(self._disk.index) if self._disk is not None else 0
+            }
+
+    def close(self) -> None:
+        """將磁碟快取寫回並關閉檔案（之後可再以 open() 開啟）"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
@@ -1,37 +1,158 @@
+import asyncio
+import logging
+import re
+import threading
+import httpx
 import requests
 import numpy as np
-from typing import List, Union, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Union, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# CJK 字元大致上一個字就是一個 token，其餘文字約每 4 個字元一個 token
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
 
 class BGEEmbedding:
-    def __init__(self, base_url: str = "http://localhost:11434", model_name: str = "bge-m3:latest"):
+    def __init__(self,
+                 base_url: str = "http://localhost:11434",
+                 model_name: str = "bge-m3:latest",
+                 batch_size: int = 32,
+                 max_batch_tokens: int = 8192,
+                 timeout: float = 60.0,
+                 connect_timeout: float = 5.0,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 max_connections: int = 10,
+                 max_concurrency: int = 4,
+                 cache: Optional["EmbeddingCache"] = None):
         """
         初始化 BGEEmbedding 類別
         
+        同步呼叫使用共用的 requests.Session，非同步呼叫（a 開頭的方法）使用共用的
+        httpx.AsyncClient，兩者都保持連線池並對 5xx 與連線錯誤做指數退避重試。
+        
         Args:
             base_url (str): Ollama API 的基礎 URL
+            model_name (str): 嵌入模型名稱
+            batch_size (int): 批次模式下每個請求最多包含的文本數
+            max_batch_tokens (int): 批次模式下每個請求的估計 token 上限
+            timeout (float): 讀取逾時秒數
+            connect_timeout (float): 連線逾時秒數
+            max_retries (int): 5xx 或連線錯誤時的最大重試次數
+            backoff_factor (float): 重試間隔的退避係數（秒）
+            max_connections (int): 連線池大小
+            max_concurrency (int): 同時送往 Ollama 的請求上限
+            cache (Optional[EmbeddingCache]): 嵌入向量快取，None 表示不使用快取
         """
         self.base_url = base_url
         self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+
+        # 同步傳輸：keep-alive 連線池與 urllib3 重試
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["POST"],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._sync_semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        # 非同步傳輸：第一次使用時在目前的事件迴圈上建立
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+
+    def close(self) -> None:
+        """關閉同步連線池"""
+        self.session.close()
+
+    async def aclose(self) -> None:
+        """關閉非同步連線池"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_semaphore = None
+
+    def _build_payload(self, prompt: Union[str, List[str]]) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "input": prompt
+        }
         
-    def _call_ollama_api(self, prompt: str) -> Dict[str, Any]:
+    def _call_ollama_api(self, prompt: Union[str, List[str]]) -> Dict[str, Any]:
         """
         調用 Ollama API
         
         Args:
-            prompt (str): 輸入文本
+            prompt (Union[str, List[str]]): 輸入文本，或一次送出的文本列表
             
         Returns:
             Dict[str, Any]: API 響應
         """
         url = f"{self.base_url}/api/embed"
-        payload = {
-            "model": self.model_name,
-            "input": prompt
-        }
-        
-        response = requests.post(url, json=payload)
+        with self._sync_semaphore:
+            response = self.session.post(
+                url,
+                json=self._build_payload(prompt),
+                timeout=(self.connect_timeout, self.timeout)
+            )
         response.raise_for_status()
         return response.json()
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client
+
+    async def _acall_ollama_api(self, prompt: Union[str, List[str]]) -> Dict[str, Any]:
+        """
+        非同步調用 Ollama API，對 5xx 與連線錯誤做指數退避重試
+        
+        Args:
+            prompt (Union[str, List[str]]): 輸入文本，或一次送出的文本列表
+            
+        Returns:
+            Dict[str, Any]: API 響應
+        """
+        client = self._get_async_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._async_semaphore:
+                    response = await client.post("/api/embed", json=self._build_payload(prompt))
+                if response.status_code < 500 or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                logger.warning(f"Ollama 回應 {response.status_code}，第 {attempt + 1} 次重試")
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"連線 Ollama 失敗: {str(e)}，第 {attempt + 1} 次重試")
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
     
     def get_embedding(self, text: str) -> np.ndarray:
         """
@@ -46,8 +167,66 @@ class BGEEmbedding:
         if not text.strip():
             raise ValueError("輸入文本不能為空")
             
+        cached = self._cache_get(text)
+        if cached is not None:
+            return cached
+            
         response = self._call_ollama_api(text)
-        embedding = np.array(response["embeddings"])
+        return self._cache_put(text, self._to_vector(response))
+
+    async def aget_embedding(self, text: str) -> np.ndarray:
+        """
+        非同步獲取單個文本的嵌入向量
+        
+        Args:
+            text (str): 輸入文本
+            
+        Returns:
+            np.ndarray: 文本的嵌入向量（一維數組）
+        """
+        if not text.strip():
+            raise ValueError("輸入文本不能為空")
+            
+        cached = self._cache_get(text)
+        if cached is not None:
+            return cached
+            
+        response = await self._acall_ollama_api(text)
+        return self._cache_put(text, self._to_vector(response))
+
+    def _cache_get(self, text: str) -> Optional[np.ndarray]:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self.model_name, text)
+        return None if cached is None else cached.copy()
+
+    def _cache_put(self, text: str, embedding: np.ndarray) -> np.ndarray:
+        if self.cache is not None:
+            self.cache.put(self.model_name, text, embedding)
+        return embedding
+
+    def _lookup_cached(self,
+                       texts: List[str],
+                       indices: List[int],
+                       results: Dict[int, Any]) -> List[int]:
+        """將快取命中的向量寫入 results，回傳仍需向伺服器取得的索引"""
+        if self.cache is None:
+            return indices
+        hits = self.cache.get_many(self.model_name, [texts[i] for i in indices])
+        for position, vector in hits.items():
+            results[indices[position]] = vector
+        return [index for position, index in enumerate(indices) if position not in hits]
+
+    def _store_cached(self, texts: List[str], indices: List[int], results: Dict[int, Any]) -> None:
+        if self.cache is None:
+            return
+        for index in indices:
+            if index in results:
+                self.cache.put(self.model_name, texts[index], np.asarray(results[index], dtype=np.float32))
+
+    @staticmethod
+    def _to_vector(response: Dict[str, Any]) -> np.ndarray:
+        embedding = np.array(response["embeddings"], dtype=np.float32)
         
         if len(embedding) == 0:
             raise ValueError("獲取到的嵌入向量為空")
@@ -55,24 +234,224 @@ class BGEEmbedding:
         # 確保返回一維向量
         return embedding.flatten()
     
-    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """粗略估計文本的 token 數，用於批次的 token 預算"""
+        cjk_count = len(_CJK_PATTERN.findall(text))
+        return cjk_count + (len(text) - cjk_count) // 4 + 1
+
+    def _plan_batches(self,
+                      texts: List[str],
+                      batch_size: int,
+                      max_batch_tokens: int) -> List[List[int]]:
+        """
+        依照批次大小與 token 預算將文本索引分組
+        
+        單一文本超過 token 預算時會自成一批，交由伺服器端截斷。
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for index, text in enumerate(texts):
+            tokens = self._estimate_tokens(text)
+            if current and (len(current) >= batch_size or current_tokens + tokens > max_batch_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _check_batch_response(response: Dict[str, Any], count: int) -> List[List[float]]:
+        embeddings = response.get("embeddings") or []
+        if len(embeddings) != count:
+            raise ValueError(f"嵌入向量數量不符：預期 {count}，實際 {len(embeddings)}")
+        return embeddings
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """以單一請求取得一批文本的嵌入向量"""
+        return self._check_batch_response(self._call_ollama_api(texts), len(texts))
+
+    def _embed_isolating_failures(self,
+                                  texts: List[str],
+                                  indices: List[int],
+                                  results: Dict[int, List[float]],
+                                  failed: List[int]) -> None:
+        """
+        送出一批文本；若整批失敗則二分重試，只把真正有問題的文本標記為失敗
+        
+        連線錯誤、逾時與 5xx 伺服器錯誤與單一文本無關，直接向上拋出；
+        只有 4xx 或格式錯誤的回應才會二分。
+        """
+        try:
+            embeddings = self._embed_batch([texts[i] for i in indices])
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError):
+            raise
+        except (requests.RequestException, ValueError, KeyError) as e:
+            if isinstance(e, requests.HTTPError) and (e.response is None or e.response.status_code >= 500):
+                raise
+            if len(indices) == 1:
+                logger.warning(f"第 {indices[0]} 個文本嵌入失敗: {str(e)}")
+                failed.append(indices[0])
+                return
+            middle = len(indices) // 2
+            self._embed_isolating_failures(texts, indices[:middle], results, failed)
+            self._embed_isolating_failures(texts, indices[middle:], results, failed)
+            return
+        results.update(zip(indices, embeddings))
+
+    async def _aembed_isolating_failures(self,
+                                         texts: List[str],
+                                         indices: List[int],
+                                         results: Dict[int, List[float]],
+                                         failed: List[int]) -> None:
+        """_embed_isolating_failures 的非同步版本"""
+        try:
+            response = await self._acall_ollama_api([texts[i] for i in indices])
+            embeddings = self._check_batch_response(response, len(indices))
+        except httpx.TransportError:
+            raise
+        except (httpx.HTTPStatusError, ValueError, KeyError) as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500:
+                raise
+            if len(indices) == 1:
+                logger.warning(f"第 {indices[0]} 個文本嵌入失敗: {str(e)}")
+                failed.append(indices[0])
+                return
+            middle = len(indices) // 2
+            await self._aembed_isolating_failures(texts, indices[:middle], results, failed)
+            await self._aembed_isolating_failures(texts, indices[middle:], results, failed)
+            return
+        results.update(zip(indices, embeddings))
+
+    @staticmethod
+    def _assemble(count: int,
+                  results: Dict[int, List[float]],
+                  failed: List[int]) -> Tuple[np.ndarray, List[int]]:
+        """依輸入順序將結果寫入連續的 float32 矩陣，失敗的列填入 NaN"""
+        if not results:
+            return np.empty((count, 0), dtype=np.float32), sorted(failed)
+
+        dimension = len(next(iter(results.values())))
+        matrix = np.full((count, dimension), np.nan, dtype=np.float32)
+        for index, embedding in results.items():
+            matrix[index] = embedding
+        return matrix, sorted(failed)
+
+    def embed_texts(self,
+                    texts: List[str],
+                    batch_size: Optional[int] = None,
+                    max_batch_tokens: Optional[int] = None) -> Tuple[np.ndarray, List[int]]:
+        """
+        以批次模式獲取多個文本的嵌入向量，並回報失敗的文本
+        
+        已在快取中的文本不會再送往伺服器。
+        
+        Args:
+            texts (List[str]): 輸入文本列表
+            batch_size (Optional[int]): 每批文本數上限，預設使用初始化時的設定
+            max_batch_tokens (Optional[int]): 每批估計 token 上限，預設使用初始化時的設定
+            
+        Returns:
+            Tuple[np.ndarray, List[int]]: 依輸入順序排列的 float32 嵌入矩陣，
+                以及失敗文本的索引（其對應列為 NaN）
+        """
+        batch_size = batch_size or self.batch_size
+        max_batch_tokens = max_batch_tokens or self.max_batch_tokens
+
+        results: Dict[int, List[float]] = {}
+        failed = [i for i, text in enumerate(texts) if not text.strip()]
+        valid = [i for i, text in enumerate(texts) if text.strip()]
+
+        pending = self._lookup_cached(texts, valid, results)
+
+        for batch in self._plan_batches([texts[i] for i in pending], batch_size, max_batch_tokens):
+            self._embed_isolating_failures(texts, [pending[i] for i in batch], results, failed)
+
+        self._store_cached(texts, pending, results)
+        return self._assemble(len(texts), results, failed)
+
+    async def aembed_texts(self,
+                           texts: List[str],
+                           batch_size: Optional[int] = None,
+                           max_batch_tokens: Optional[int] = None) -> Tuple[np.ndarray, List[int]]:
+        """
+        embed_texts 的非同步版本，各批次並行送出（受 max_concurrency 限制）
+        
+        Args:
+            texts (List[str]): 輸入文本列表
+            batch_size (Optional[int]): 每批文本數上限
+            max_batch_tokens (Optional[int]): 每批估計 token 上限
+            
+        Returns:
+            Tuple[np.ndarray, List[int]]: float32 嵌入矩陣與失敗文本的索引
+        """
+        batch_size = batch_size or self.batch_size
+        max_batch_tokens = max_batch_tokens or self.max_batch_tokens
+
+        results: Dict[int, List[float]] = {}
+        failed = [i for i, text in enumerate(texts) if not text.strip()]
+        valid = [i for i, text in enumerate(texts) if text.strip()]
+
+        pending = self._lookup_cached(texts, valid, results)
+
+        batches = self._plan_batches([texts[i] for i in pending], batch_size, max_batch_tokens)
+        await asyncio.gather(*(
+            self._aembed_isolating_failures(texts, [pending[i] for i in batch], results, failed)
+            for batch in batches
+        ))
+
+        self._store_cached(texts, pending, results)
+        return self._assemble(len(texts), results, failed)
+
+    def get_embeddings(self,
+                       texts: List[str],
+                       batch_size: Optional[int] = None,
+                       max_batch_tokens: Optional[int] = None) -> np.ndarray:
         """
         獲取多個文本的嵌入向量
         
         Args:
             texts (List[str]): 輸入文本列表
+            batch_size (Optional[int]): 每批文本數上限
+            max_batch_tokens (Optional[int]): 每批估計 token 上限
+            
+        Returns:
+            np.ndarray: 文本嵌入向量矩陣（float32，依輸入順序排列）
+        """
+        if not texts:
+            raise ValueError("輸入文本列表不能為空")
+            
+        embeddings, failed = self.embed_texts(texts, batch_size, max_batch_tokens)
+        if failed:
+            raise ValueError(f"以下索引的文本無法取得嵌入向量：{failed}")
+        return embeddings
+
+    async def aget_embeddings(self,
+                              texts: List[str],
+                              batch_size: Optional[int] = None,
+                              max_batch_tokens: Optional[int] = None) -> np.ndarray:
+        """
+        非同步獲取多個文本的嵌入向量
+        
+        Args:
+            texts (List[str]): 輸入文本列表
+            batch_size (Optional[int]): 每批文本數上限
+            max_batch_tokens (Optional[int]): 每批估計 token 上限
             
         Returns:
-            np.ndarray: 文本嵌入向量矩陣
+            np.ndarray: 文本嵌入向量矩陣（float32，依輸入順序排列）
         """
         if not texts:
             raise ValueError("輸入文本列表不能為空")
             
-        embeddings = []
-        for text in texts:
-            embedding = self.get_embedding(text)
-            embeddings.append(embedding)
-        return np.array(embeddings)
+        embeddings, failed = await self.aembed_texts(texts, batch_size, max_batch_tokens)
+        if failed:
+            raise ValueError(f"以下索引的文本無法取得嵌入向量：{failed}")
+        return embeddings
     
     def compute_similarity(self, text1: str, text2: str) -> float:
         """
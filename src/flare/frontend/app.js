@@ -90,6 +90,21 @@ const handleChat = async (event) => {
     }
 };
 
+// 輪詢文件匯入工作直到完成
+const pollUploadJob = async (jobId, interval = 1000) => {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/upload/${jobId}`);
+        if (!response.ok) {
+            throw new Error('無法取得匯入進度');
+        }
+        const job = await response.json();
+        if (job.status === 'completed' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+};
+
 // 文件上傳功能
 const handleFileUpload = async (event) => {
     event.preventDefault();
@@ -120,8 +135,16 @@ const handleFileUpload = async (event) => {
         }
 
         const data = await response.json();
-        showNotification('文件上傳成功');
+        showNotification('文件已上傳，正在匯入');
         fileInput.value = '';
+
+        // 輪詢匯入工作進度
+        const job = await pollUploadJob(data.job_id);
+        if (job.status === 'completed') {
+            showNotification(`文件匯入完成，共 ${job.points_upserted} 個區塊`);
+        } else {
+            showNotification(`文件匯入失敗：${job.error}`, 'error');
+        }
     } catch (error) {
         console.error('上傳錯誤:', error);
         showNotification('文件上傳失敗', 'error');
@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def adapter_bytes(model, adapter_name: str) -> int:
+    """計算單一 LoRA adapter 權重佔用的位元組數"""
+    marker = f".{adapter_name}."
+    return sum(
+        param.numel() * param.element_size()
+        for name, param in model.named_parameters()
+        if "lora_" in name and marker in name
+    )
+
+
+class AdapterRegistry:
+    def __init__(self, model, max_adapters: int = 4):
+        """
+        管理掛載在同一個基礎模型上的多個 LoRA adapter
+
+        生成前以 use(name) 取得 adapter：切換 adapter 會等待使用其他 adapter 的生成
+        結束，使用同一個 adapter 的生成可以同時進行。超過 max_adapters 時淘汰最久
+        未使用、且不是預設也沒有在使用中的 adapter。
+
+        Args:
+            model: 已載入第一個 adapter 的 PeftModel
+            max_adapters (int): 同時保留的 adapter 上限
+        """
+        self.model = model
+        self.max_adapters = max_adapters
+        self.default: Optional[str] = None
+        self.adapters: Dict[str, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        self._current: Optional[str] = None
+        self._active = 0
+        self.switches = 0
+        self.switch_seconds = 0.0
+
+    def register(self, name: str, path: str, load_seconds: float, default: bool = False) -> Dict[str, Any]:
+        """登記已經載入到模型上的 adapter"""
+        info = {
+            "name": name,
+            "path": path,
+            "load_seconds": load_seconds,
+            "bytes": adapter_bytes(self.model, name),
+            "loaded_at": time.time(),
+            "last_used": time.monotonic(),
+            "requests": 0
+        }
+        with self._condition:
+            self.adapters[name] = info
+            if self._current is None:
+                self._current = name
+            if default or self.default is None:
+                self.default = name
+        logger.info(
+            f"Adapter {name} loaded from {path} in {load_seconds:.2f}s "
+            f"({info['bytes'] / 1024 / 1024:.1f} MiB)"
+        )
+        return info
+
+    def load(self, name: str, path: str, default: bool = False) -> Dict[str, Any]:
+        """
+        從檢查點目錄載入 adapter（不重新載入基礎模型）
+
+        Args:
+            name (str): adapter 名稱
+            path (str): 檢查點目錄
+            default (bool): 是否設為預設 adapter
+
+        Returns:
+            Dict[str, Any]: adapter 資訊（載入時間、記憶體用量等）
+        """
+        with self._condition:
+            if name in self.adapters:
+                if default:
+                    self.default = name
+                return self.adapters[name]
+            # load_adapter 會修改模型結構，需等待進行中的生成結束
+            while self._active:
+                self._condition.wait()
+            started_at = time.perf_counter()
+            self.model.load_adapter(path, adapter_name=name)
+            # load_adapter 不會切換 active adapter，維持 _current 與模型一致
+            if self._current is not None:
+                self.model.set_adapter(self._current)
+            load_seconds = time.perf_counter() - started_at
+        info = self.register(name, path, load_seconds, default=default)
+        self.evict()
+        return info
+
+    def unload(self, name: str) -> None:
+        """卸載 adapter，預設 adapter 不能卸載"""
+        with self._condition:
+            if name not in self.adapters:
+                raise ValueError(f"Unknown adapter: {name}")
+            if name == self.default:
+                raise ValueError(f"Cannot unload the default adapter: {name}")
+            while self._active:
+                self._condition.wait()
+            if self._current == name:
+                self.model.set_adapter(self.default)
+                self._current = self.default
+            self.model.delete_adapter(name)
+            del self.adapters[name]
+        logger.info(f"Adapter {name} unloaded")
+
+    def evict(self) -> List[str]:
+        """淘汰超出上限的 adapter"""
+        evicted = []
+        while len(self.adapters) > self.max_adapters:
+            with self._condition:
+                candidates = [
+                    info for name, info in self.adapters.items()
+                    if name != self.default and name != self._current
+                ]
+            if not candidates:
+                break
+            name = min(candidates, key=lambda info: info["last_used"])["name"]
+            self.unload(name)
+            evicted.append(name)
+        return evicted
+
+    def resolve(self, name: Optional[str]) -> str:
+        """取得 adapter 名稱，None 表示預設 adapter"""
+        name = name or self.default
+        if name not in self.adapters:
+            raise ValueError(f"Unknown adapter: {name}")
+        return name
+
+    def acquire(self, name: Optional[str]) -> str:
+        """切換到指定 adapter 並登記一個使用中的生成，需以 release() 釋放"""
+        name = self.resolve(name)
+        with self._condition:
+            while self._active and self._current != name:
+                self._condition.wait()
+            if name not in self.adapters:
+                raise ValueError(f"Unknown adapter: {name}")
+            if self._current != name:
+                started_at = time.perf_counter()
+                self.model.set_adapter(name)
+                self.switch_seconds += time.perf_counter() - started_at
+                self.switches += 1
+                self._current = name
+            self._active += 1
+            info = self.adapters[name]
+            info["last_used"] = time.monotonic()
+            info["requests"] += 1
+        return name
+
+    def release(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def use(self, name: Optional[str]) -> Iterator[str]:
+        """在生成期間使用指定 adapter"""
+        name = self.acquire(name)
+        try:
+            yield name
+        finally:
+            self.release()
+
+    def path(self, name: Optional[str]) -> str:
+        """adapter 的檢查點路徑，作為回應快取鍵的一部分"""
+        return self.adapters[self.resolve(name)]["path"]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得 adapter 統計
+
+        Returns:
+            Dict[str, Any]: 各 adapter 的載入時間與記憶體用量、切換次數與平均切換時間
+        """
+        with self._condition:
+            return {
+                "default": self.default,
+                "active": self._current,
+                "switches": self.switches,
+                "average_switch_seconds": self.switch_seconds / self.switches if self.switches else 0.0,
+                "max_adapters": self.max_adapters,
+                "adapters": [
+                    {key: value for key, value in info.items() if key != "last_used"}
+                    for info in self.adapters.values()
+                ]
+            }
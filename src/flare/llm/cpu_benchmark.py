@@ -0,0 +1,135 @@
+"""
+CPU 推論基準測試：比較 fp32、bf16 與動態 int8 量化的延遲與記憶體用量
+
+每種精度在獨立的子程序中載入模型，避免彼此的記憶體用量互相影響。指定
+--speculative 時，每種精度會再以推測解碼測試一次，比較 greedy 解碼的加速。
+
+用法:
+    python -m flare.llm.cpu_benchmark --model-path lora_model --precisions fp32 int8 --runs 5
+    python -m flare.llm.cpu_benchmark --precisions fp32 --speculative prompt_lookup
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+# 設置日誌
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROMPTS = [
+    ("請解釋什麼是機器學習", "用簡單的語言解釋"),
+    ("Summarize the vulnerability", "CVE-2014-0160 Heartbleed in OpenSSL"),
+    (
+        "請根據參考資料回答問題",
+        "參考資料：\nThe TLS heartbeat extension in OpenSSL 1.0.1 before 1.0.1g does not properly handle "
+        "Heartbeat Extension packets, which allows remote attackers to obtain sensitive information from "
+        "process memory via crafted packets that trigger a buffer over-read.\n\n問題：Which versions are affected?"
+    ),
+]
+
+
+def current_rss_mb() -> float:
+    """目前程序的常駐記憶體（MiB），讀取 /proc/self/status，無法讀取時回傳峰值"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(model_path: str,
+                  precision: str,
+                  runs: int,
+                  max_new_tokens: int,
+                  num_threads: Optional[int],
+                  speculative: Optional[str] = None,
+                  draft_model_path: Optional[str] = None) -> Dict[str, Any]:
+    """在目前程序中載入模型並量測生成延遲"""
+    from flare.llm.main import LLMHandler
+    from flare.llm.speculative import SpeculativeDecoder
+
+    generation_config = {"max_new_tokens": max_new_tokens, "min_new_tokens": max_new_tokens, "do_sample": False}
+    decoder = SpeculativeDecoder(speculative, draft_model_path) if speculative else None
+    rss_before = current_rss_mb()
+    llm = LLMHandler(
+        fine_tuned_model_path=model_path,
+        generation_config=generation_config,
+        use_cpu=True,
+        cpu_precision=precision,
+        num_threads=num_threads,
+        speculative=decoder
+    )
+    started_at = time.perf_counter()
+    llm.load_fine_tuned_model()
+    load_seconds = time.perf_counter() - started_at
+    rss_loaded = current_rss_mb()
+
+    # 暖機一次，不列入統計
+    llm.generate_batch([PROMPTS[0]])
+    latencies: List[float] = []
+    for i in range(runs):
+        started_at = time.perf_counter()
+        llm.generate_batch([PROMPTS[i % len(PROMPTS)]])
+        latencies.append(time.perf_counter() - started_at)
+    llm.close()
+
+    return {
+        "precision": f"{precision}+{speculative}" if speculative else precision,
+        "acceptance_rate": round(decoder.stats()["acceptance_rate"], 3) if decoder else None,
+        "load_seconds": round(load_seconds, 2),
+        "model_rss_mb": round(rss_loaded - rss_before, 1),
+        "rss_mb": round(rss_loaded, 1),
+        "latency_mean_s": round(statistics.mean(latencies), 3),
+        "latency_p50_s": round(statistics.median(latencies), 3),
+        "tokens_per_second": round(max_new_tokens / statistics.mean(latencies), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 CPU 推論精度的延遲與記憶體用量")
+    parser.add_argument("--model-path", default="lora_model", help="存放 checkpoint-* 的目錄")
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument("--speculative", choices=["prompt_lookup", "draft"], default=None,
+                        help="另外以推測解碼測試每種精度")
+    parser.add_argument("--draft-model", default=None, help="draft 模式的草稿模型路徑")
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    modes = [None, args.speculative] if args.speculative else [None]
+    for precision in args.precisions:
+        for speculative in modes:
+            logger.info(f"測試 {precision}{f' + {speculative}' if speculative else ''} ...")
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    run_benchmark,
+                    (args.model_path, precision, args.runs, args.max_new_tokens, args.num_threads,
+                     speculative, args.draft_model)
+                )
+            logger.info(json.dumps(result, ensure_ascii=False))
+            results.append(result)
+
+    baseline = results[0]
+    print(f"{'precision':<24}{'load s':>8}{'model MiB':>11}{'p50 s':>9}{'tok/s':>9}{'accept':>8}{'speedup':>9}")
+    for result in results:
+        speedup = baseline["latency_mean_s"] / result["latency_mean_s"]
+        acceptance = result["acceptance_rate"] if result["acceptance_rate"] is not None else "-"
+        print(
+            f"{result['precision']:<24}{result['load_seconds']:>8}{result['model_rss_mb']:>11}"
+            f"{result['latency_p50_s']:>9}{result['tokens_per_second']:>9}{acceptance:>8}{speedup:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from .main import LLMError, LLMHandler
+
+logger = logging.getLogger(__name__)
+
+LOAD_MODES = ("eager", "background", "lazy")
+
+
+class ModelNotReadyError(LLMError):
+    """模型尚未載入完成或載入失敗"""
+    pass
+
+
+class ModelLifecycle:
+    def __init__(self,
+                 llm_handler: LLMHandler,
+                 load_mode: str = "background",
+                 reload_interval: Optional[float] = None):
+        """
+        管理模型的載入時機與狀態
+
+        load_mode:
+            eager       啟動時載入，載入完成後才開始接受請求
+            background  啟動時在背景執行緒載入，期間 /health/ready 回報未就緒
+            lazy        第一個需要模型的請求才開始載入
+
+        載入完成後若設定 reload_interval，會定期檢查模型目錄，出現新的檢查點時
+        將其載入為預設 adapter，不需重新啟動或重新載入基礎模型。
+
+        Args:
+            llm_handler (LLMHandler): 模型處理器
+            load_mode (str): 載入模式
+            reload_interval (Optional[float]): 檢查新檢查點的間隔（秒），None 表示不檢查
+        """
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"load_mode 必須是 {', '.join(LOAD_MODES)} 之一")
+        self.llm_handler = llm_handler
+        self.load_mode = load_mode
+        self.state = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.reload_interval = reload_interval
+        self._task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    async def start(self) -> None:
+        """依載入模式在應用程式啟動時開始（或等待）載入"""
+        if self.load_mode == "eager":
+            await self.ensure_ready()
+        elif self.load_mode == "background":
+            self._ensure_task()
+
+    def _ensure_task(self) -> asyncio.Task:
+        # 載入失敗後的下一次請求會重新嘗試
+        if self._task is None or (self._task.done() and not self.ready):
+            self._task = asyncio.create_task(self._load())
+        return self._task
+
+    async def _load(self) -> None:
+        self.state = "loading"
+        self.error = None
+        started_at = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.llm_handler.load_fine_tuned_model)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"模型載入失敗: {str(e)}")
+            raise
+        self.load_seconds = time.perf_counter() - started_at
+        self.state = "ready"
+        if self.reload_interval and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        """定期熱載入新的檢查點"""
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await asyncio.to_thread(self.llm_handler.refresh_adapters)
+            except Exception as e:
+                logger.warning(f"檢查新檢查點失敗: {str(e)}")
+
+    async def ensure_ready(self, timeout: Optional[float] = None) -> None:
+        """
+        等待模型載入完成，尚未開始載入時會先開始載入
+
+        Args:
+            timeout (Optional[float]): 最長等待秒數，None 表示一直等待
+
+        Raises:
+            ModelNotReadyError: 等待逾時或載入失敗
+        """
+        if self.ready:
+            return
+        task = self._ensure_task()
+        try:
+            # shield：等待的請求被取消時不中斷載入
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise ModelNotReadyError(f"Model is still loading ({self.state})")
+        except Exception as e:
+            raise ModelNotReadyError(f"Model failed to load: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        """
+        取得模型載入狀態
+
+        Returns:
+            Dict[str, Any]: 狀態、載入模式、錯誤訊息、載入時間與檢查點
+        """
+        return {
+            "state": self.state,
+            "load_mode": self.load_mode,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "checkpoint": self.llm_handler.checkpoint_id,
+            "reload_interval": self.reload_interval
+        }
+
+    async def close(self) -> None:
+        """等待進行中的載入結束後釋放模型"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._task is not None and not self._task.done():
+            try:
+                await self._task
+            except Exception:
+                pass
+        self.llm_handler.close()
+        self.state = "not_loaded"
@@ -1,4 +1,5 @@
-from main import LLMHandler
+from flare.llm.main import LLMHandler
+from flare.llm.response_cache import ResponseCache
 import logging
 import time
 
@@ -26,7 +27,8 @@ def main():
             generation_config=generation_config,
             max_retries=3,
             retry_delay=1.0,
-            use_cpu=True  # 強制使用 CPU
+            use_cpu=True,  # 強制使用 CPU
+            response_cache=ResponseCache(cache_sampled=True)  # 示範用：取樣生成也快取
         )
         
         # 載入模型
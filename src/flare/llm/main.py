@@ -1,17 +1,27 @@
 import logging
 from pathlib import Path
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, DynamicCache
 from peft import PeftModel, PeftConfig
 import re
-from typing import Optional, Dict, Any
-from functools import lru_cache
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator
 import time
 import torch
 
+from .adapters import AdapterRegistry
+from .prefix_cache import PrefixCache
+from .response_cache import ResponseCache
+from .speculative import SpeculativeDecoder
+from .streaming import GenerationStream
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CPU_PRECISIONS = ("fp32", "bf16", "int8")
+
 class LLMError(Exception):
     """自定義異常類別"""
     pass
@@ -22,8 +32,61 @@ class LLMHandler:
                  generation_config: Optional[Dict[str, Any]] = None,
                  max_retries: int = 3,
                  retry_delay: float = 1.0,
-                 use_cpu: bool = False):
+                 use_cpu: bool = False,
+                 response_cache: Optional[ResponseCache] = None,
+                 merge_lora: bool = False,
+                 merged_model_dir: Optional[str] = None,
+                 extra_adapters: Optional[Dict[str, str]] = None,
+                 max_adapters: int = 4,
+                 cpu_precision: str = "fp32",
+                 num_threads: Optional[int] = None,
+                 num_interop_threads: Optional[int] = None,
+                 max_memory: Optional[Dict[Any, str]] = None,
+                 prefix_cache: Optional[PrefixCache] = None,
+                 speculative: Optional[SpeculativeDecoder] = None):
+        """
+        初始化微調模型處理器
+        
+        Args:
+            fine_tuned_model_path: 存放 checkpoint-* 目錄的路徑
+            generation_config: 預設生成參數
+            max_retries: 載入與生成的重試次數
+            retry_delay: 重試間隔（秒）
+            use_cpu: 強制使用 CPU
+            response_cache: 回應快取
+            merge_lora: 將 LoRA 權重合併進基礎模型，並以 safetensors 存到 merged_model_dir，
+                之後啟動時直接載入合併後的模型
+            merged_model_dir: 合併模型的存放目錄，預設為 <fine_tuned_model_path>/merged
+            extra_adapters: 啟動時額外載入的 adapter（名稱 → 檢查點目錄）
+            max_adapters: 同時掛載在基礎模型上的 adapter 上限
+            cpu_precision: CPU 推論精度，"fp32"、"bf16" 或 "int8"（動態量化線性層）；
+                非 fp32 時會先合併 LoRA，因此無法切換 adapter
+            num_threads: PyTorch intra-op 執行緒數，None 表示使用預設值
+            num_interop_threads: PyTorch inter-op 執行緒數，None 表示使用預設值
+            max_memory: 各裝置的記憶體上限（例如 {0: "12GiB", "cpu": "24GiB"}）
+            prefix_cache: prompt 前綴的 KV cache，單一請求生成時重用相同前綴的 prefill 結果
+            speculative: 推測解碼設定，用於單一請求的生成與串流；啟用時不使用 prefix_cache
+        """
         self.fine_tuned_model_path = fine_tuned_model_path
+        self.merge_lora = merge_lora
+        self.merged_model_dir = merged_model_dir or str(Path(fine_tuned_model_path) / "merged")
+        self._checkpoint_cache: Dict[str, Tuple[float, str]] = {}
+        self.checkpoint_id: Optional[str] = None
+        self.extra_adapters = extra_adapters or {}
+        self.max_adapters = max_adapters
+        self.adapters: Optional[AdapterRegistry] = None
+        if cpu_precision not in CPU_PRECISIONS:
+            raise ValueError(f"cpu_precision must be one of {', '.join(CPU_PRECISIONS)}")
+        self.cpu_precision = cpu_precision
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        self.max_memory = max_memory or {
+            0: "12GiB",  # GPU 記憶體
+            "cpu": "24GiB"  # CPU 記憶體
+        }
+        self.response_cache = response_cache
+        self.prefix_cache = prefix_cache
+        self.speculative = speculative
         self.fine_tuned_model = None
         self.fine_tuned_tokenizer = None
         self.generation_config = generation_config or {
@@ -48,6 +111,11 @@ class LLMHandler:
                 if hasattr(self, 'fine_tuned_model') and self.fine_tuned_model is not None:
                     del self.fine_tuned_model
                     self.fine_tuned_model = None
+                    self.adapters = None
+                if getattr(self, 'prefix_cache', None) is not None:
+                    self.prefix_cache.clear()
+                if getattr(self, 'speculative', None) is not None:
+                    self.speculative.close()
                 if hasattr(self, 'fine_tuned_tokenizer') and self.fine_tuned_tokenizer is not None:
                     del self.fine_tuned_tokenizer
                     self.fine_tuned_tokenizer = None
@@ -57,10 +125,16 @@ class LLMHandler:
             logger.error(f"清理資源時發生錯誤: {str(e)}")
 
     def find_latest_checkpoint(self, base_path: str) -> str:
-        """找到最新的檢查點目錄"""
+        """找到最新的檢查點目錄（目錄內容未變更時沿用上次的結果）"""
         for attempt in range(self.max_retries):
             try:
                 base_path = Path(base_path)
+                # 新增或刪除檢查點會更新目錄的 mtime
+                mtime = base_path.stat().st_mtime
+                cached = self._checkpoint_cache.get(str(base_path))
+                if cached is not None and cached[0] == mtime:
+                    return cached[1]
+                
                 checkpoint_dirs = [d for d in base_path.glob("checkpoint-*") if d.is_dir()]
                 
                 if not checkpoint_dirs:
@@ -79,6 +153,7 @@ class LLMHandler:
                 latest_checkpoint_dir = base_path / f"checkpoint-{latest_checkpoint}"
                 
                 logger.info(f"Found latest checkpoint at: {latest_checkpoint_dir}")
+                self._checkpoint_cache[str(base_path)] = (mtime, str(latest_checkpoint_dir))
                 return str(latest_checkpoint_dir)
                 
             except Exception as e:
@@ -88,15 +163,111 @@ class LLMHandler:
                 else:
                     raise LLMError(f"Failed to find latest checkpoint after {self.max_retries} attempts: {str(e)}")
 
+    def _merged_path(self, checkpoint: str) -> Path:
+        return Path(self.merged_model_dir) / Path(checkpoint).name
+
+    def _load_merged_model(self, merged_path: Path):
+        """直接載入已合併的 safetensors 模型（權重以 mmap 讀取）"""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tokenizer_future = executor.submit(
+                AutoTokenizer.from_pretrained, str(merged_path), trust_remote_code=True
+            )
+            model_future = executor.submit(
+                AutoModelForCausalLM.from_pretrained,
+                str(merged_path),
+                device_map="auto" if not self.use_cpu else None,
+                trust_remote_code=True,
+                use_safetensors=True
+            )
+            return model_future.result(), tokenizer_future.result()
+
+    def _load_adapter_model(self, checkpoint: str, quantization_config, memory_config):
+        """基礎模型與 tokenizer 同時載入後套用 LoRA 權重，adapter 以檢查點目錄名稱命名"""
+        peft_config = PeftConfig.from_pretrained(checkpoint)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # 載入tokenizer
+            tokenizer_future = executor.submit(
+                AutoTokenizer.from_pretrained,
+                peft_config.base_model_name_or_path,
+                trust_remote_code=True
+            )
+            # 載入基礎模型
+            model_future = executor.submit(
+                AutoModelForCausalLM.from_pretrained,
+                peft_config.base_model_name_or_path,
+                quantization_config=quantization_config,
+                device_map="auto" if not self.use_cpu else None,
+                trust_remote_code=True,
+                max_memory=memory_config,
+                offload_folder="offload",
+                offload_state_dict=True,
+                offload_buffers=True
+            )
+            base_model = model_future.result()
+            tokenizer = tokenizer_future.result()
+        
+        # 載入LoRA權重
+        started_at = time.perf_counter()
+        model = PeftModel.from_pretrained(
+            base_model,
+            checkpoint,
+            adapter_name=Path(checkpoint).name,
+            device_map="auto" if not self.use_cpu else None,
+            max_memory=memory_config,
+            offload_folder="offload",
+            offload_state_dict=True,
+            offload_buffers=True
+        )
+        return model, tokenizer, time.perf_counter() - started_at
+
+    def _merge_and_save(self, model, tokenizer, merged_path: Path):
+        """將 LoRA 合併進基礎權重並以 safetensors 儲存"""
+        model = model.merge_and_unload()
+        tmp_path = merged_path.with_name(merged_path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        model.save_pretrained(str(tmp_path), safe_serialization=True)
+        tokenizer.save_pretrained(str(tmp_path))
+        # 寫完後才換上正式名稱，中斷時不會留下不完整的合併模型
+        shutil.rmtree(merged_path, ignore_errors=True)
+        tmp_path.replace(merged_path)
+        logger.info(f"Merged LoRA weights saved to {merged_path}")
+        return model
+
+    def _configure_threads(self):
+        """設定 PyTorch 執行緒數"""
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        if self.num_interop_threads:
+            try:
+                torch.set_num_interop_threads(self.num_interop_threads)
+            except RuntimeError as e:
+                # inter-op 執行緒數只能在任何平行運算開始前設定一次
+                logger.warning(f"無法設定 inter-op 執行緒數: {str(e)}")
+
+    def _optimize_for_cpu(self, model):
+        """CPU 快速路徑：合併 LoRA 後轉為 bf16 或對線性層做動態 int8 量化"""
+        if isinstance(model, PeftModel):
+            model = model.merge_and_unload()
+        if self.cpu_precision == "bf16":
+            if torch.ops.mkldnn._is_mkldnn_bf16_supported():
+                model = model.to(torch.bfloat16)
+            else:
+                logger.warning("此 CPU 不支援 bf16 運算，維持 fp32")
+        elif self.cpu_precision == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info(f"CPU fast path enabled ({self.cpu_precision})")
+        return model
+
     def load_fine_tuned_model(self):
         """載入微調後的模型"""
         for attempt in range(self.max_retries):
             try:
                 logger.info("Loading fine-tuned model...")
+                started_at = time.perf_counter()
+                self._configure_threads()
                 
                 latest_checkpoint = self.find_latest_checkpoint(self.fine_tuned_model_path)
-                
-                peft_config = PeftConfig.from_pretrained(latest_checkpoint)
+                merged_path = self._merged_path(latest_checkpoint)
                 
                 # 配置量化參數
                 quantization_config = None
@@ -108,45 +279,50 @@ class LLMHandler:
                     )
                 
                 # 設定記憶體配置
-                memory_config = {
-                    0: "12GiB",  # GPU 記憶體
-                    "cpu": "24GiB"  # CPU 記憶體
-                }
-                
-                # 載入基礎模型
-                base_model = AutoModelForCausalLM.from_pretrained(
-                    peft_config.base_model_name_or_path,
-                    quantization_config=quantization_config,
-                    device_map="auto" if not self.use_cpu else None,
-                    trust_remote_code=True,
-                    max_memory=memory_config,
-                    offload_folder="offload",
-                    offload_state_dict=True,
-                    offload_buffers=True
-                )
+                memory_config = self.max_memory
                 
-                # 載入tokenizer
-                self.fine_tuned_tokenizer = AutoTokenizer.from_pretrained(
-                    peft_config.base_model_name_or_path,
-                    trust_remote_code=True
-                )
-                
-                # 載入LoRA權重
-                self.fine_tuned_model = PeftModel.from_pretrained(
-                    base_model,
-                    latest_checkpoint,
-                    device_map="auto" if not self.use_cpu else None,
-                    max_memory=memory_config,
-                    offload_folder="offload",
-                    offload_state_dict=True,
-                    offload_buffers=True
-                )
+                adapter_seconds = None
+                if self.merge_lora and (merged_path / "config.json").exists():
+                    logger.info(f"Loading merged model from {merged_path}")
+                    self.fine_tuned_model, self.fine_tuned_tokenizer = self._load_merged_model(merged_path)
+                else:
+                    self.fine_tuned_model, self.fine_tuned_tokenizer, adapter_seconds = self._load_adapter_model(
+                        latest_checkpoint, quantization_config, memory_config
+                    )
+                    if self.merge_lora:
+                        if quantization_config is not None:
+                            logger.warning("量化的基礎模型無法合併 LoRA 權重，略過合併")
+                        else:
+                            self.fine_tuned_model = self._merge_and_save(
+                                self.fine_tuned_model, self.fine_tuned_tokenizer, merged_path
+                            )
+                            adapter_seconds = None
                 
                 if self.use_cpu:
                     self.fine_tuned_model = self.fine_tuned_model.to(self.device)
                 
+                if self.device == "cpu" and self.cpu_precision != "fp32":
+                    self.fine_tuned_model = self._optimize_for_cpu(self.fine_tuned_model)
+                    adapter_seconds = None
+                self.fine_tuned_model.eval()
+                if self.speculative is not None:
+                    self.speculative.load(self.device, self.fine_tuned_model.dtype)
+                
+                # 合併後的模型沒有可切換的 adapter
+                self.adapters = None
+                if adapter_seconds is not None:
+                    self.adapters = AdapterRegistry(self.fine_tuned_model, self.max_adapters)
+                    self.adapters.register(Path(latest_checkpoint).name, latest_checkpoint, adapter_seconds, default=True)
+                    for name, path in self.extra_adapters.items():
+                        self.adapters.load(name, path)
+                
+                # 快取的回應只對產生它的檢查點有效
+                self.checkpoint_id = latest_checkpoint
                 self._is_initialized = True
-                logger.info(f"Fine-tuned model loaded successfully on {self.device}")
+                logger.info(
+                    f"Fine-tuned model loaded successfully on {self.device} "
+                    f"in {time.perf_counter() - started_at:.1f}s"
+                )
                 return
                 
             except Exception as e:
@@ -156,27 +332,360 @@ class LLMHandler:
                 else:
                     raise LLMError(f"Failed to load model after {self.max_retries} attempts: {str(e)}")
 
-    @lru_cache(maxsize=100)
-    def generate_fine_tuned_response(self, instruction: str, input_text: str) -> str:
-        """使用微調後的模型生成回應"""
+    def load_adapter(self, name: str, path: str, default: bool = False) -> Dict[str, Any]:
+        """
+        在共用的基礎模型上載入 adapter
+        
+        Args:
+            name: adapter 名稱
+            path: 檢查點目錄
+            default: 是否設為預設 adapter
+            
+        Returns:
+            Dict[str, Any]: adapter 的載入時間與記憶體用量
+        """
+        if self.adapters is None:
+            raise LLMError("Adapters cannot be loaded onto a merged or uninitialized model")
+        try:
+            return self.adapters.load(name, path, default=default)
+        except Exception as e:
+            raise LLMError(f"Failed to load adapter {name}: {str(e)}")
+
+    def unload_adapter(self, name: str) -> None:
+        """卸載 adapter"""
+        if self.adapters is None:
+            raise LLMError("No adapters are loaded")
+        try:
+            self.adapters.unload(name)
+        except ValueError as e:
+            raise LLMError(str(e))
+
+    def refresh_adapters(self) -> Optional[str]:
+        """
+        出現新的檢查點時載入為預設 adapter（基礎模型不重新載入）
+        
+        Returns:
+            Optional[str]: 新載入的 adapter 名稱，沒有新檢查點時為 None
+        """
+        if self.adapters is None:
+            return None
+        latest_checkpoint = Path(self.find_latest_checkpoint(self.fine_tuned_model_path))
+        name = latest_checkpoint.name
+        if name in self.adapters.adapters:
+            return None
+        # 訓練程式可能還在寫入檢查點，權重檔齊全後才載入
+        if not (latest_checkpoint / "adapter_config.json").exists() or not (
+            (latest_checkpoint / "adapter_model.safetensors").exists()
+            or (latest_checkpoint / "adapter_model.bin").exists()
+        ):
+            return None
+        self.load_adapter(name, str(latest_checkpoint), default=True)
+        self.checkpoint_id = str(latest_checkpoint)
+        logger.info(f"Switched default adapter to {name}")
+        return name
+
+    def adapter_stats(self) -> Dict[str, Any]:
+        """取得 adapter 統計，合併模型時只回報檢查點"""
+        if self.adapters is None:
+            return {"merged": self.merge_lora, "checkpoint": self.checkpoint_id, "adapters": []}
+        return {"merged": False, **self.adapters.stats()}
+
+    def _checkpoint_for(self, adapter: Optional[str]) -> Optional[str]:
+        """adapter 對應的檢查點，作為回應快取鍵的一部分"""
+        if self.adapters is None:
+            if adapter is not None:
+                raise LLMError(f"Unknown adapter: {adapter}")
+            return self.checkpoint_id
+        try:
+            return self.adapters.path(adapter)
+        except ValueError as e:
+            raise LLMError(str(e))
+
+    def _acquire_adapter(self, adapter: Optional[str]) -> None:
+        if self.adapters is None:
+            if adapter is not None:
+                raise LLMError(f"Unknown adapter: {adapter}")
+            return
+        try:
+            self.adapters.acquire(adapter)
+        except ValueError as e:
+            raise LLMError(str(e))
+
+    def _release_adapter(self) -> None:
+        if self.adapters is not None:
+            self.adapters.release()
+
+    @contextmanager
+    def _use_adapter(self, adapter: Optional[str]) -> Iterator[None]:
+        """生成期間固定使用指定 adapter"""
+        self._acquire_adapter(adapter)
+        try:
+            yield
+        finally:
+            self._release_adapter()
+
+    def _prepare_config(self, generation_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """複製生成參數並補上 pad_token_id 與 KV cache 設定"""
+        config = dict(generation_config or self.generation_config)
+        tokenizer = self.fine_tuned_tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        config.setdefault("pad_token_id", tokenizer.pad_token_id)
+        config.setdefault("use_cache", True)
+        return config
+
+    @staticmethod
+    def build_prompt(instruction: str, input_text: str) -> str:
+        """組合微調時使用的提示模板"""
+        return f"Instruction: {instruction}\nInput: {input_text}\nOutput:"
+
+    @staticmethod
+    def _single_sequence(inputs, config: Dict[str, Any]) -> bool:
+        """前綴 KV 重用與推測解碼只適用單一序列（beam search 與多個回傳序列會複製 cache）"""
+        return (
+            inputs["input_ids"].shape[0] == 1
+            and config.get("num_beams", 1) == 1
+            and config.get("num_return_sequences", 1) == 1
+        )
+
+    def _prefill(self, inputs, adapter: Optional[str]) -> Tuple[Dict[str, Any], int]:
+        """
+        以前綴 KV cache 完成 prompt 的 prefill
+        
+        命中的前綴直接沿用，其餘 token 除了最後一個之外在這裡計算並寫回快取；
+        最後一個 token 留給 generate 產生第一個輸出的 logits。需在已取得 adapter、
+        且在 torch.inference_mode() 之下呼叫。
+        
+        Args:
+            inputs: tokenizer 的輸出（單一序列、無填充）
+            adapter: 使用的 adapter 名稱
+            
+        Returns:
+            Tuple[Dict[str, Any], int]: 含 past_key_values 的 generate 輸入，以及實際 prefill 的 token 數
+        """
+        input_ids = inputs["input_ids"]
+        prompt_length = input_ids.shape[1]
+        namespace = f"{self._checkpoint_for(adapter)}|{adapter}|{self.cpu_precision}"
+        hashes = self.prefix_cache.block_hashes(namespace, input_ids[0])
+        past, reused = self.prefix_cache.lookup(hashes, prompt_length - 1)
+        if past is None:
+            past = DynamicCache()
+        computed = prompt_length - 1 - reused
+        if computed > 0:
+            # 只需要 KV，不計算 prefill 各位置的 logits
+            self.fine_tuned_model(
+                input_ids=input_ids[:, reused:-1], past_key_values=past, use_cache=True, logits_to_keep=1
+            )
+            self.prefix_cache.store(hashes, past, prompt_length - 1)
+        return {**inputs, "past_key_values": past}, computed
+
+    def _generate(self, inputs, config: Dict[str, Any], adapter: Optional[str]):
+        """
+        呼叫 generate，單一序列時使用推測解碼，或先以前綴 KV cache 完成 prefill
+        
+        generate 的推測解碼會自行計算整段提示，不接受預先填好的 KV cache，
+        因此兩者擇一，推測解碼優先。
+        """
+        if not self._single_sequence(inputs, config):
+            return self.fine_tuned_model.generate(**inputs, **config)
+        if self.speculative is not None:
+            prompt_tokens = inputs["input_ids"].shape[1]
+            with self.speculative.track(self.fine_tuned_model, prompt_tokens) as counts:
+                outputs = self.fine_tuned_model.generate(**inputs, **config, **self.speculative.generate_kwargs())
+                counts["generated"] = outputs.shape[1] - prompt_tokens
+            return outputs
+        if self.prefix_cache is None:
+            return self.fine_tuned_model.generate(**inputs, **config)
+        started_at = time.perf_counter()
+        inputs, computed = self._prefill(inputs, adapter)
+        prefilled_at = time.perf_counter()
+        outputs = self.fine_tuned_model.generate(**inputs, **config)
+        self.prefix_cache.record(computed, prefilled_at - started_at, time.perf_counter() - prefilled_at)
+        return outputs
+
+    def cached_response(self,
+                        instruction: str,
+                        input_text: str,
+                        generation_config: Dict[str, Any],
+                        context: str = "",
+                        query_embedding=None,
+                        adapter: Optional[str] = None) -> Optional[str]:
+        """查詢回應快取，未設定快取或未命中時回傳 None"""
+        if self.response_cache is None or self.checkpoint_id is None:
+            return None
+        return self.response_cache.get(
+            self._checkpoint_for(adapter), generation_config, instruction, input_text, context, query_embedding
+        )
+
+    def cache_response(self,
+                       instruction: str,
+                       input_text: str,
+                       generation_config: Dict[str, Any],
+                       response: str,
+                       context: str = "",
+                       query_embedding=None,
+                       adapter: Optional[str] = None) -> None:
+        """將生成的回應寫入回應快取"""
+        if self.response_cache is None or self.checkpoint_id is None:
+            return
+        self.response_cache.put(
+            self._checkpoint_for(adapter), generation_config, instruction, input_text, response, context, query_embedding
+        )
+
+    def generate_fine_tuned_response(self,
+                                     instruction: str,
+                                     input_text: str,
+                                     generation_config: Optional[Dict[str, Any]] = None,
+                                     context: str = "",
+                                     query_embedding=None,
+                                     adapter: Optional[str] = None) -> str:
+        """
+        使用微調後的模型生成回應
+        
+        Args:
+            instruction: 指令
+            input_text: 輸入內容
+            generation_config: 生成參數，預設使用 self.generation_config
+            context: 檢索內容指紋，作為回應快取鍵的一部分
+            query_embedding: 查詢嵌入向量，供語意快取使用
+            adapter: 使用的 adapter 名稱，None 表示預設 adapter
+            
+        Returns:
+            str: 生成的回應
+        """
         if not self._is_initialized:
             raise LLMError("Model not initialized. Please call load_fine_tuned_model() first.")
             
+        config = dict(generation_config or self.generation_config)
+        cached = self.cached_response(instruction, input_text, config, context, query_embedding, adapter)
+        generate_config = self._prepare_config(config)
+        if cached is not None:
+            return cached
+            
         for attempt in range(self.max_retries):
             try:
-                prompt = f"Instruction: {instruction}\nInput: {input_text}\nOutput:"
+                prompt = self.build_prompt(instruction, input_text)
                 inputs = self.fine_tuned_tokenizer(prompt, return_tensors="pt").to(self.device)
-                outputs = self.fine_tuned_model.generate(
-                    **inputs,
-                    **self.generation_config
-                )
+                with self._use_adapter(adapter), torch.inference_mode():
+                    outputs = self._generate(dict(inputs), generate_config, adapter)
                 response = self.fine_tuned_tokenizer.decode(outputs[0], skip_special_tokens=True)
                 response = response.split("Output:")[-1].strip()
+                self.cache_response(instruction, input_text, config, response, context, query_embedding, adapter)
                 return response
                 
+            except LLMError:
+                raise
             except Exception as e:
                 if attempt < self.max_retries - 1:
                     logger.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
                     time.sleep(self.retry_delay)
                 else:
                     raise LLMError(f"Failed to generate response after {self.max_retries} attempts: {str(e)}")
+
+    def stream_fine_tuned_response(self,
+                                   instruction: str,
+                                   input_text: str,
+                                   generation_config: Optional[Dict[str, Any]] = None,
+                                   on_finish: Optional[Callable[[], None]] = None,
+                                   adapter: Optional[str] = None) -> GenerationStream:
+        """
+        以串流方式生成回應
+        
+        generate 在背景執行緒上執行，迭代回傳的 GenerationStream 可逐段取得
+        解碼後的文字；呼叫其 stop() 會提前結束生成。切換 adapter 時會等待
+        使用其他 adapter 的生成結束，因此不應在事件迴圈上直接呼叫。
+        
+        Args:
+            instruction: 指令
+            input_text: 輸入內容
+            generation_config: 生成參數，預設使用 self.generation_config
+            on_finish: 生成結束（完成、停止或失敗）時呼叫
+            adapter: 使用的 adapter 名稱，None 表示預設 adapter
+            
+        Returns:
+            GenerationStream: 文字片段迭代器，結束後可由 stats() 取得 TTFT 與生成速度
+        """
+        if not self._is_initialized:
+            raise LLMError("Model not initialized. Please call load_fine_tuned_model() first.")
+            
+        config = self._prepare_config(generation_config)
+        tokenizer = self.fine_tuned_tokenizer
+        
+        started_at = time.perf_counter()
+        prefill = None
+        
+        def finish():
+            if prefill is not None:
+                self.prefix_cache.record(prefill[0], prefill[1] - started_at, time.perf_counter() - prefill[1])
+            # adapter 在生成執行緒結束後才釋放
+            self._release_adapter()
+            if on_finish is not None:
+                on_finish()
+        
+        self._acquire_adapter(adapter)
+        try:
+            prompt = self.build_prompt(instruction, input_text)
+            inputs = dict(tokenizer(prompt, return_tensors="pt").to(self.device))
+            if self._single_sequence(inputs, config) and self.speculative is not None:
+                config.update(self.speculative.generate_kwargs())
+            elif self._single_sequence(inputs, config) and self.prefix_cache is not None:
+                with torch.inference_mode():
+                    inputs, computed = self._prefill(inputs, adapter)
+                prefill = (computed, time.perf_counter())
+            return GenerationStream(self.fine_tuned_model, tokenizer, inputs, config, finish, started_at=started_at)
+        except Exception as e:
+            self._release_adapter()
+            raise LLMError(f"Failed to start streaming generation: {str(e)}")
+
+    def generate_batch(self,
+                       requests: List[Tuple[str, str]],
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       adapter: Optional[str] = None) -> List[str]:
+        """
+        以一次 generate 呼叫為多個請求生成回應
+        
+        提示採左側填充（left padding）對齊，只解碼新生成的 token。
+        
+        Args:
+            requests: (instruction, input_text) 列表
+            generation_config: 生成參數，預設使用 self.generation_config
+            adapter: 使用的 adapter 名稱，None 表示預設 adapter
+            
+        Returns:
+            List[str]: 與輸入順序相同的回應
+        """
+        if not self._is_initialized:
+            raise LLMError("Model not initialized. Please call load_fine_tuned_model() first.")
+        if not requests:
+            return []
+            
+        config = self._prepare_config(generation_config)
+        num_return_sequences = config.get("num_return_sequences", 1)
+        tokenizer = self.fine_tuned_tokenizer
+            
+        for attempt in range(self.max_retries):
+            try:
+                prompts = [self.build_prompt(instruction, input_text) for instruction, input_text in requests]
+                padding_side = tokenizer.padding_side
+                tokenizer.padding_side = "left"
+                try:
+                    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+                finally:
+                    tokenizer.padding_side = padding_side
+                with self._use_adapter(adapter), torch.inference_mode():
+                    outputs = self._generate(dict(inputs), config, adapter)
+                prompt_length = inputs["input_ids"].shape[1]
+                # 每個請求只取第一個回傳序列
+                return [
+                    tokenizer.decode(outputs[i * num_return_sequences][prompt_length:], skip_special_tokens=True).strip()
+                    for i in range(len(requests))
+                ]
+                
+            except LLMError:
+                raise
+            except Exception as e:
+                if attempt < self.max_retries - 1:
+                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
+                    time.sleep(self.retry_delay)
+                else:
+                    raise LLMError(f"Failed to generate batch after {self.max_retries} attempts: {str(e)}")
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("layers", "length", "hashes", "nbytes")
+
+    def __init__(self, layers: List[Tuple[torch.Tensor, torch.Tensor]], length: int, hashes: List[str]):
+        self.layers = layers
+        self.length = length
+        self.hashes = hashes
+        self.nbytes = sum(keys.nbytes + values.nbytes for keys, values in layers)
+
+
+class PrefixCache:
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, block_size: int = 32):
+        """
+        初始化 prompt 前綴的 KV cache
+
+        提示依 block_size 個 token 切塊，每塊的鍵是「前一塊的鍵 + 本塊 token」的雜湊，
+        因此相同的鍵代表從開頭起完全相同的 token 前綴。一個項目保存一段前綴的
+        key/value 張量，其中每一塊的鍵都指向它，所以只共用前面幾塊（例如相同的
+        指令與參考資料、不同的問題）的提示也能重用。項目總大小超過 max_bytes 時
+        淘汰最久未使用的項目。
+
+        Args:
+            max_bytes (int): KV 張量佔用的記憶體上限（位元組）
+            block_size (int): 前綴比對的粒度（token 數）
+        """
+        if max_bytes <= 0 or block_size <= 0:
+            raise ValueError("max_bytes 與 block_size 必須大於 0")
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._index: Dict[str, str] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+        self.prefill_tokens = 0
+        self.prefill_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.requests = 0
+
+    def block_hashes(self, namespace: str, input_ids: torch.Tensor) -> List[str]:
+        """
+        計算每個完整區塊結尾的前綴雜湊
+
+        Args:
+            namespace (str): 模型識別（檢查點、adapter 與精度），不同模型的 KV 不能共用
+            input_ids (torch.Tensor): 一維 token id
+
+        Returns:
+            List[str]: 第 i 個元素代表前 (i + 1) * block_size 個 token
+        """
+        ids = input_ids.tolist()
+        hashes = []
+        previous = namespace.encode("utf-8")
+        for end in range(self.block_size, len(ids) + 1, self.block_size):
+            digest = hashlib.sha1(previous)
+            digest.update(repr(ids[end - self.block_size:end]).encode("ascii"))
+            previous = digest.digest()
+            hashes.append(digest.hexdigest())
+        return hashes
+
+    def lookup(self, hashes: List[str], max_length: int) -> Tuple[Optional[DynamicCache], int]:
+        """
+        取得最長的已快取前綴
+
+        Args:
+            hashes (List[str]): block_hashes 的結果
+            max_length (int): 可重用的最大 token 數（至少要留一個 token 給 generate）
+
+        Returns:
+            Tuple[Optional[DynamicCache], int]: 可直接傳給模型的 KV cache 副本與其 token 數，
+            未命中時為 (None, 0)
+        """
+        with self._lock:
+            for i in range(min(len(hashes), max_length // self.block_size) - 1, -1, -1):
+                key = self._index.get(hashes[i])
+                if key is None:
+                    continue
+                entry = self._entries[key]
+                self._entries.move_to_end(key)
+                length = (i + 1) * self.block_size
+                layers = entry.layers
+                self.hits += 1
+                self.reused_tokens += length
+                break
+            else:
+                self.misses += 1
+                return None, 0
+        # DynamicCache 以 torch.cat 寫入，快取中的張量不會被後續生成修改
+        return DynamicCache([(keys[:, :, :length], values[:, :, :length]) for keys, values in layers]), length
+
+    def store(self, hashes: List[str], cache: DynamicCache, max_length: int) -> None:
+        """
+        保存 prefill 後 KV cache 中最長的完整區塊前綴
+
+        Args:
+            hashes (List[str]): block_hashes 的結果
+            cache (DynamicCache): 至少包含 max_length 個 token 的 KV cache
+            max_length (int): 可保存的最大 token 數
+        """
+        blocks = min(len(hashes), max_length // self.block_size)
+        if blocks == 0 or any(getattr(cache, "is_sliding", None) or []):
+            return
+        hashes = hashes[:blocks]
+        key = hashes[-1]
+        with self._lock:
+            if key in self._index:
+                # 已有項目涵蓋這段前綴
+                self._entries.move_to_end(self._index[key])
+                return
+        length = blocks * self.block_size
+        layers = [
+            (layer.keys[:, :, :length].clone(), layer.values[:, :, :length].clone())
+            for layer in cache.layers
+        ]
+        entry = _Entry(layers, length, hashes)
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = {self._index.get(block_hash) for block_hash in hashes} - {None}
+            for block_hash in hashes:
+                self._index[block_hash] = key
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            # 所有區塊都被新項目取代的舊項目已無法命中
+            for old_key in previous:
+                old = self._entries.get(old_key)
+                if old is not None and all(self._index.get(h) != old_key for h in old.hashes):
+                    self._remove(old_key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+        for block_hash in entry.hashes:
+            if self._index.get(block_hash) == key:
+                del self._index[block_hash]
+
+    def record(self, prefill_tokens: int, prefill_seconds: float, decode_seconds: float) -> None:
+        """記錄一次生成的 prefill 與 decode 時間"""
+        with self._lock:
+            self.requests += 1
+            self.prefill_tokens += prefill_tokens
+            self.prefill_seconds += prefill_seconds
+            self.decode_seconds += decode_seconds
+
+    def clear(self) -> None:
+        """清除所有項目（模型重新載入時使用）"""
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得前綴快取統計
+
+        Returns:
+            Dict[str, Any]: 項目數與記憶體用量、命中率、重用與實際 prefill 的 token 數、
+            平均 prefill 與 decode 時間
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "block_size": self.block_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "reused_tokens": self.reused_tokens,
+                "prefill_tokens": self.prefill_tokens,
+                "average_prefill_seconds": self.prefill_seconds / self.requests if self.requests else 0.0,
+                "average_decode_seconds": self.decode_seconds / self.requests if self.requests else 0.0
+            }
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def context_fingerprint(passages: Iterable[Any]) -> str:
+    """
+    計算檢索內容的指紋，檢索結果不同時快取鍵也不同
+
+    Args:
+        passages (Iterable[Any]): 檢索結果（字典或文字），依序計入
+
+    Returns:
+        str: sha256 十六進位字串
+    """
+    digest = hashlib.sha256()
+    for passage in passages:
+        if isinstance(passage, dict):
+            # 以 id 與文字識別段落，分數會隨查詢浮動而不計入
+            passage = {"id": passage.get("id"), "payload": passage.get("payload")}
+        digest.update(json.dumps(passage, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _canonical_config(generation_config: Dict[str, Any]) -> str:
+    return json.dumps(generation_config, sort_keys=True, default=str)
+
+
+class _Entry:
+    __slots__ = ("response", "expires_at", "partition", "embedding")
+
+    def __init__(self, response: str, expires_at: Optional[float], partition: str,
+                 embedding: Optional[np.ndarray]):
+        self.response = response
+        self.expires_at = expires_at
+        self.partition = partition
+        self.embedding = embedding
+
+
+class ResponseCache:
+    def __init__(self,
+                 max_entries: int = 1024,
+                 ttl_seconds: Optional[float] = 3600,
+                 cache_sampled: bool = False,
+                 semantic_threshold: Optional[float] = None):
+        """
+        初始化生成回應快取
+
+        快取鍵包含模型檢查點、正規化的生成參數、提示與檢索內容指紋，
+        以 TTL 與項目數上限（LRU）淘汰。do_sample=True 的生成預設不快取，
+        避免每次都回傳同一個取樣結果。設定 semantic_threshold 後，精確鍵未命中
+        時會在同一檢查點、生成參數、指令與檢索內容下，尋找查詢嵌入向量餘弦相似度
+        不低於門檻的回應；檢索到不同參考資料（例如不同集合）的相似問題不會共用回應。
+
+        Args:
+            max_entries (int): 快取項目上限
+            ttl_seconds (Optional[float]): 項目存活秒數，None 表示不過期
+            cache_sampled (bool): 是否快取取樣生成（do_sample=True）的回應
+            semantic_threshold (Optional[float]): 語意快取的相似度門檻，None 表示關閉
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries 必須大於 0")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_sampled = cache_sampled
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_threshold is not None
+
+    def is_cacheable(self, generation_config: Dict[str, Any]) -> bool:
+        """取樣生成只有在 cache_sampled 時才快取"""
+        return self.cache_sampled or not generation_config.get("do_sample", False)
+
+    @staticmethod
+    def _partition(checkpoint: str, generation_config: Dict[str, Any], instruction: str, context: str) -> str:
+        """語意查詢的範圍：回應只能在相同模型、生成參數、指令與檢索內容下共用"""
+        digest = hashlib.sha256()
+        for part in (checkpoint, _canonical_config(generation_config), instruction, context):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def _key(partition: str, input_text: str) -> str:
+        digest = hashlib.sha256()
+        for part in (partition, input_text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return entry.expires_at is not None and entry.expires_at <= now
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if self._expired(entry, now)]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def _semantic_lookup(self, partition: str, query_embedding: np.ndarray, now: float) -> Optional[str]:
+        candidates: List[str] = []
+        vectors: List[np.ndarray] = []
+        for key, entry in self._entries.items():
+            if entry.partition == partition and entry.embedding is not None and not self._expired(entry, now):
+                candidates.append(key)
+                vectors.append(entry.embedding)
+        if not candidates:
+            return None
+        scores = np.stack(vectors) @ query_embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        self._entries.move_to_end(candidates[best])
+        return self._entries[candidates[best]].response
+
+    @staticmethod
+    def _normalize(embedding: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if not np.isfinite(norm) or norm == 0:
+            return None
+        return vector / norm
+
+    def get(self,
+            checkpoint: str,
+            generation_config: Dict[str, Any],
+            instruction: str,
+            input_text: str,
+            context: str = "",
+            query_embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        """
+        查詢快取的回應
+
+        Args:
+            checkpoint (str): 模型檢查點識別
+            generation_config (Dict[str, Any]): 生成參數
+            instruction (str): 指令
+            input_text (str): 輸入內容
+            context (str): 檢索內容指紋（context_fingerprint）
+            query_embedding (Optional[np.ndarray]): 查詢嵌入向量，語意模式使用
+
+        Returns:
+            Optional[str]: 快取的回應，未命中或不可快取時為 None
+        """
+        if not self.is_cacheable(generation_config):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        partition = self._partition(checkpoint, generation_config, instruction, context)
+        key = self._key(partition, input_text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.response
+                del self._entries[key]
+                self.expirations += 1
+            if self.semantic:
+                embedding = self._normalize(query_embedding)
+                if embedding is not None:
+                    response = self._semantic_lookup(partition, embedding, now)
+                    if response is not None:
+                        self.semantic_hits += 1
+                        return response
+            self.misses += 1
+            return None
+
+    def put(self,
+            checkpoint: str,
+            generation_config: Dict[str, Any],
+            instruction: str,
+            input_text: str,
+            response: str,
+            context: str = "",
+            query_embedding: Optional[np.ndarray] = None) -> None:
+        """
+        寫入生成的回應
+
+        Args:
+            checkpoint (str): 模型檢查點識別
+            generation_config (Dict[str, Any]): 生成參數
+            instruction (str): 指令
+            input_text (str): 輸入內容
+            response (str): 生成的回應
+            context (str): 檢索內容指紋（context_fingerprint）
+            query_embedding (Optional[np.ndarray]): 查詢嵌入向量，語意模式使用
+        """
+        if not self.is_cacheable(generation_config):
+            return
+        partition = self._partition(checkpoint, generation_config, instruction, context)
+        key = self._key(partition, input_text)
+        now = time.monotonic()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds is not None else None
+        embedding = self._normalize(query_embedding) if self.semantic else None
+        with self._lock:
+            self._entries[key] = _Entry(response, expires_at, partition, embedding)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._purge_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清除所有項目與統計"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.semantic_hits = self.misses = 0
+            self.bypassed = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            Dict[str, Any]: 精確與語意命中、未命中、略過、淘汰與過期次數
+        """
+        with self._lock:
+            hits = self.hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "semantic": self.semantic
+            }
@@ -0,0 +1,316 @@
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from .main import LLMError, LLMHandler
+from .streaming import GenerationStream
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerOverloadedError(LLMError):
+    """等待佇列已滿，請求被拒絕"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GenerationTimeoutError(LLMError):
+    """請求在開始生成前已超過期限"""
+    pass
+
+
+class GenerationRequest:
+    """排入排程器的單一生成請求"""
+
+    def __init__(self,
+                 instruction: str,
+                 input_text: str,
+                 generation_config: Dict[str, Any],
+                 context: str = "",
+                 query_embedding=None,
+                 timeout: Optional[float] = None,
+                 adapter: Optional[str] = None):
+        self.instruction = instruction
+        self.adapter = adapter
+        self.input_text = input_text
+        self.generation_config = generation_config
+        self.context = context
+        self.query_embedding = query_embedding
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + timeout if timeout is not None else None
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+    @property
+    def config_key(self) -> str:
+        """adapter 與生成參數相同的請求才能放在同一批"""
+        return json.dumps([self.adapter, self.generation_config], sort_keys=True, default=str)
+
+
+class GenerationScheduler:
+    def __init__(self,
+                 llm_handler: LLMHandler,
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 20.0,
+                 max_queue_size: int = 64,
+                 max_streams: int = 4):
+        """
+        初始化批次生成排程器
+
+        背景執行緒收集一小段時間窗內的並行請求，依生成參數分組後以左側填充的
+        批次一次呼叫 generate，並透過各自的 Future 回傳結果。等待時間窗從該批第
+        一個請求到達時開始計算，因此低負載時延遲最多增加 max_wait_ms。
+
+        等待中的請求超過 max_queue_size、或串流生成超過 max_streams 時，新請求會以
+        SchedulerOverloadedError 拒絕並附上建議的重試秒數。已取消或已超過期限的
+        請求在開始生成前會被略過。
+
+        Args:
+            llm_handler (LLMHandler): 已載入模型的處理器
+            max_batch_size (int): 每批最多的請求數
+            max_wait_ms (float): 收集同批請求的最長等待時間（毫秒）
+            max_queue_size (int): 等待佇列的請求上限
+            max_streams (int): 同時進行的串流生成上限
+        """
+        self.llm_handler = llm_handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.max_streams = max_streams
+        self._queue: "queue.Queue[Optional[GenerationRequest]]" = queue.Queue()
+        self._admission_lock = threading.Lock()
+        self._pending = 0
+        self._active_streams = 0
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.batches_run = 0
+        self.requests_served = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.batch_seconds = 0.0
+
+    def start(self) -> None:
+        """啟動背景排程執行緒"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止排程執行緒，尚未處理的請求會收到例外"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                self._release()
+                if request.future.set_running_or_notify_cancel():
+                    request.future.set_exception(RuntimeError("Generation scheduler stopped"))
+
+    def submit(self,
+               instruction: str,
+               input_text: str,
+               generation_config: Optional[Dict[str, Any]] = None,
+               context: str = "",
+               query_embedding=None,
+               timeout: Optional[float] = None,
+               adapter: Optional[str] = None) -> Future:
+        """
+        提交生成請求，回應快取命中時直接回傳已完成的 Future
+
+        取消回傳的 Future 可讓尚未開始的請求不再生成。
+
+        Args:
+            instruction (str): 指令
+            input_text (str): 輸入內容
+            generation_config (Optional[Dict[str, Any]]): 生成參數，預設使用處理器的設定
+            context (str): 檢索內容指紋，作為回應快取鍵的一部分
+            query_embedding: 查詢嵌入向量，供語意快取使用
+            timeout (Optional[float]): 從提交起算的期限（秒），逾期未開始的請求會失敗
+            adapter (Optional[str]): 使用的 adapter 名稱，None 表示預設 adapter
+
+        Returns:
+            Future: 完成時為生成的回應字串
+
+        Raises:
+            SchedulerOverloadedError: 等待佇列已滿
+        """
+        if not self._running:
+            raise RuntimeError("Generation scheduler not started. Call start() first.")
+        config = dict(generation_config or self.llm_handler.generation_config)
+        cached = self.llm_handler.cached_response(instruction, input_text, config, context, query_embedding, adapter)
+        if cached is not None:
+            self.cache_hits += 1
+            future: Future = Future()
+            future.set_result(cached)
+            return future
+        with self._admission_lock:
+            if self._pending >= self.max_queue_size:
+                self.rejected += 1
+                raise SchedulerOverloadedError(
+                    f"Generation queue is full ({self._pending} pending)", self.retry_after()
+                )
+            self._pending += 1
+        request = GenerationRequest(instruction, input_text, config, context, query_embedding, timeout, adapter)
+        self._queue.put(request)
+        return request.future
+
+    def open_stream(self,
+                    instruction: str,
+                    input_text: str,
+                    generation_config: Optional[Dict[str, Any]] = None,
+                    adapter: Optional[str] = None) -> GenerationStream:
+        """
+        在串流名額內開始串流生成，生成結束時自動釋放名額
+
+        Args:
+            instruction (str): 指令
+            input_text (str): 輸入內容
+            generation_config (Optional[Dict[str, Any]]): 生成參數，預設使用處理器的設定
+            adapter (Optional[str]): 使用的 adapter 名稱，None 表示預設 adapter
+
+        Returns:
+            GenerationStream: 文字片段迭代器
+
+        Raises:
+            SchedulerOverloadedError: 串流生成已達上限
+        """
+        with self._admission_lock:
+            if self._active_streams >= self.max_streams:
+                self.rejected += 1
+                raise SchedulerOverloadedError(
+                    f"Too many streaming generations ({self._active_streams} active)", self.retry_after()
+                )
+            self._active_streams += 1
+        try:
+            return self.llm_handler.stream_fine_tuned_response(
+                instruction, input_text, generation_config, on_finish=self._release_stream, adapter=adapter
+            )
+        except Exception:
+            self._release_stream()
+            raise
+
+    def _release(self) -> None:
+        with self._admission_lock:
+            self._pending -= 1
+
+    def _release_stream(self) -> None:
+        with self._admission_lock:
+            self._active_streams -= 1
+
+    def retry_after(self) -> int:
+        """依目前佇列長度與平均批次時間估計的重試秒數"""
+        average = self.batch_seconds / self.batches_run if self.batches_run else 1.0
+        batches_ahead = math.ceil((self._pending + 1) / self.max_batch_size)
+        return max(1, math.ceil(batches_ahead * average))
+
+    def _collect(self, first: GenerationRequest) -> List[GenerationRequest]:
+        """從第一個請求開始，在時間窗內收集最多 max_batch_size 個請求"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # 停止訊號：處理完這一批後結束
+                self._running = False
+                break
+            batch.append(request)
+        return batch
+
+    def _loop(self) -> None:
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+
+            groups: Dict[str, List[GenerationRequest]] = {}
+            now = time.monotonic()
+            for request in batch:
+                self._release()
+                if not request.future.set_running_or_notify_cancel():
+                    self.cancelled += 1
+                elif request.expired(now):
+                    self.expired += 1
+                    request.future.set_exception(
+                        GenerationTimeoutError("Request deadline exceeded before generation started")
+                    )
+                else:
+                    groups.setdefault(request.config_key, []).append(request)
+
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group: List[GenerationRequest]) -> None:
+        started_at = time.monotonic()
+        try:
+            responses = self.llm_handler.generate_batch(
+                [(request.instruction, request.input_text) for request in group],
+                group[0].generation_config,
+                adapter=group[0].adapter
+            )
+        except Exception as e:
+            logger.error(f"批次生成失敗（{len(group)} 個請求）: {str(e)}")
+            for request in group:
+                request.future.set_exception(e)
+            return
+        self.batches_run += 1
+        self.requests_served += len(group)
+        self.batch_seconds += time.monotonic() - started_at
+        for request, response in zip(group, responses):
+            self.llm_handler.cache_response(
+                request.instruction, request.input_text, request.generation_config,
+                response, request.context, request.query_embedding, request.adapter
+            )
+            request.future.set_result(response)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得排程統計
+
+        Returns:
+            Dict[str, Any]: 批次數、已處理請求數、快取命中數、拒絕／逾期／取消數、
+            平均批次大小與時間、佇列長度與串流數
+        """
+        return {
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "cache_hits": self.cache_hits,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "average_batch_size": self.requests_served / self.batches_run if self.batches_run else 0.0,
+            "average_batch_seconds": self.batch_seconds / self.batches_run if self.batches_run else 0.0,
+            "pending": self._pending,
+            "max_queue_size": self.max_queue_size,
+            "active_streams": self._active_streams,
+            "max_streams": self.max_streams,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms
+        }
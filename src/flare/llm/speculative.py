@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import torch
+from transformers import AutoModelForCausalLM
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_MODES = ("prompt_lookup", "draft")
+
+
+class SpeculativeDecoder:
+    def __init__(self,
+                 mode: str = "prompt_lookup",
+                 draft_model_path: Optional[str] = None,
+                 num_draft_tokens: int = 10,
+                 max_ngram_size: int = 2):
+        """
+        初始化推測解碼（speculative decoding）設定
+
+        prompt_lookup 從提示中尋找與目前結尾相同的 n-gram，把其後的 token 當作草稿，
+        適合會引用參考資料的 RAG 回答，不需要額外模型；draft 以較小的草稿模型
+        （需與微調模型使用相同 tokenizer）逐步產生草稿。兩者都由微調模型一次驗證
+        整段草稿，只接受與其預測相同的 token，因此 greedy 解碼的輸出不變。
+
+        Args:
+            mode (str): "prompt_lookup" 或 "draft"
+            draft_model_path (Optional[str]): 草稿模型路徑，draft 模式必填
+            num_draft_tokens (int): 每次驗證的草稿 token 數上限
+            max_ngram_size (int): prompt_lookup 比對的最長 n-gram
+        """
+        if mode not in SPECULATIVE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SPECULATIVE_MODES)}")
+        if mode == "draft" and not draft_model_path:
+            raise ValueError("draft mode requires draft_model_path")
+        self.mode = mode
+        self.draft_model_path = draft_model_path
+        self.num_draft_tokens = num_draft_tokens
+        self.max_ngram_size = max_ngram_size
+        self.draft_model = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.generated_tokens = 0
+        self.drafted_tokens = 0
+        self.accepted_tokens = 0
+        self.verify_steps = 0
+        self.decode_seconds = 0.0
+
+    def load(self, device: str, dtype: Optional[torch.dtype] = None) -> None:
+        """載入草稿模型（prompt_lookup 模式不需要），與微調模型放在同一裝置並使用相同精度"""
+        if self.mode != "draft" or self.draft_model is not None:
+            return
+        started_at = time.perf_counter()
+        model = AutoModelForCausalLM.from_pretrained(self.draft_model_path, trust_remote_code=True).to(device)
+        if dtype is not None:
+            model = model.to(dtype)
+        model.generation_config.num_assistant_tokens = self.num_draft_tokens
+        self.draft_model = model.eval()
+        logger.info(f"Draft model loaded from {self.draft_model_path} in {time.perf_counter() - started_at:.1f}s")
+
+    def close(self) -> None:
+        self.draft_model = None
+
+    def generate_kwargs(self) -> Dict[str, Any]:
+        """傳給 generate 的推測解碼參數"""
+        if self.mode == "draft":
+            return {"assistant_model": self.draft_model}
+        return {"prompt_lookup_num_tokens": self.num_draft_tokens, "max_matching_ngram_size": self.max_ngram_size}
+
+    @contextmanager
+    def track(self, model, prompt_tokens: int) -> Iterator[Dict[str, int]]:
+        """
+        統計一次 generate 中微調模型的驗證次數與草稿 token 數
+
+        每次驗證（forward）的輸入是尚未寫入 KV cache 的 token：第一次是提示，之後
+        是上一步自己產生的一個 token，其餘都是草稿。每次驗證會產生一個自己的 token，
+        所以被接受的草稿數為「生成的 token 數 − 驗證次數」。只計入呼叫 generate 的
+        執行緒，其他執行緒同時在同一模型上的生成不影響統計。
+
+        Args:
+            model: 執行驗證的模型
+            prompt_tokens (int): 提示的 token 數
+
+        Yields:
+            Dict[str, int]: 結束後由呼叫端填入 "generated" 生成的 token 數
+        """
+        thread_id = threading.get_ident()
+        counts = {"steps": 0, "input_tokens": 0, "generated": 0}
+
+        def count(module, args, kwargs):
+            if threading.get_ident() != thread_id:
+                return
+            input_ids = kwargs.get("input_ids", args[0] if args else None)
+            if input_ids is not None:
+                counts["steps"] += 1
+                counts["input_tokens"] += input_ids.shape[-1]
+
+        base_model = model.get_base_model() if hasattr(model, "get_base_model") else model
+        handle = base_model.register_forward_pre_hook(count, with_kwargs=True)
+        started_at = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            handle.remove()
+        if counts["steps"] == 0:
+            return
+        drafted = max(counts["input_tokens"] - prompt_tokens - (counts["steps"] - 1), 0)
+        accepted = min(max(counts["generated"] - counts["steps"], 0), drafted)
+        with self._lock:
+            self.requests += 1
+            self.generated_tokens += counts["generated"]
+            self.drafted_tokens += drafted
+            self.accepted_tokens += accepted
+            self.verify_steps += counts["steps"]
+            self.decode_seconds += time.perf_counter() - started_at
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得推測解碼統計
+
+        Returns:
+            Dict[str, Any]: 草稿接受率、每次驗證產生的 token 數（不計草稿成本時的加速上限）
+            與生成速度
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "num_draft_tokens": self.num_draft_tokens,
+                "requests": self.requests,
+                "generated_tokens": self.generated_tokens,
+                "drafted_tokens": self.drafted_tokens,
+                "accepted_tokens": self.accepted_tokens,
+                "acceptance_rate": self.accepted_tokens / self.drafted_tokens if self.drafted_tokens else 0.0,
+                "tokens_per_step": self.generated_tokens / self.verify_steps if self.verify_steps else 0.0,
+                "tokens_per_second": self.generated_tokens / self.decode_seconds if self.decode_seconds else 0.0
+            }
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+logger = logging.getLogger(__name__)
+
+
+class _StopOnEvent(StoppingCriteria):
+    """外部設定 stop_event 時讓 generate 在下一個 token 停止"""
+
+    def __init__(self, stop_event: threading.Event):
+        self.stop_event = stop_event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full(
+            (input_ids.shape[0],), self.stop_event.is_set(), dtype=torch.bool, device=input_ids.device
+        )
+
+
+class _TimingStreamer(TextIteratorStreamer):
+    """記錄第一個生成 token 的時間與生成 token 數的 TextIteratorStreamer"""
+
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.first_token_at: Optional[float] = None
+        self.generated_tokens = 0
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.generated_tokens += value.shape[-1] if value.dim() > 0 else 1
+        super().put(value)
+
+
+class GenerationStream:
+    def __init__(self,
+                 model,
+                 tokenizer,
+                 inputs: Dict[str, Any],
+                 generation_config: Dict[str, Any],
+                 on_finish: Optional[Callable[[], None]] = None,
+                 started_at: Optional[float] = None):
+        """
+        在背景執行緒上執行 generate，並以迭代器逐段回傳解碼後的文字
+
+        迭代結束後可由 stats() 取得首個 token 延遲（TTFT）與生成速度；
+        呼叫 stop() 會在下一個 token 停止生成（例如用戶端已斷線）。
+
+        Args:
+            model: 已載入的模型
+            tokenizer: 對應的 tokenizer
+            inputs (Dict[str, Any]): tokenizer 輸出的模型輸入
+            generation_config (Dict[str, Any]): 生成參數
+            on_finish (Optional[Callable[[], None]]): 生成執行緒結束時呼叫
+            started_at (Optional[float]): 請求開始時間（perf_counter），在建立串流前已先
+                完成部分 prefill 時傳入，TTFT 才會包含 prefill
+        """
+        self.stop_event = threading.Event()
+        self.streamer = _TimingStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.prompt_tokens = int(inputs["input_ids"].shape[-1])
+        self.error: Optional[BaseException] = None
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.stopped = False
+        self.on_finish = on_finish
+
+        stopping_criteria = StoppingCriteriaList(generation_config.pop("stopping_criteria", None) or [])
+        stopping_criteria.append(_StopOnEvent(self.stop_event))
+        self._thread = threading.Thread(
+            target=self._generate,
+            args=(model, inputs, {**generation_config, "stopping_criteria": stopping_criteria}),
+            name="generation-stream",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _generate(self, model, inputs: Dict[str, Any], generation_config: Dict[str, Any]) -> None:
+        try:
+            with torch.inference_mode():
+                model.generate(**inputs, streamer=self.streamer, **generation_config)
+        except BaseException as e:
+            self.error = e
+            # generate 中途失敗時不會呼叫 end()，需手動結束迭代
+            self.streamer.end()
+        finally:
+            self.finished_at = time.perf_counter()
+            if self.on_finish is not None:
+                self.on_finish()
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for text in self.streamer:
+                if text:
+                    yield text
+        finally:
+            self._thread.join()
+            self._log_stats()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self) -> None:
+        """要求生成在下一個 token 停止"""
+        if not self.stop_event.is_set() and self._thread.is_alive():
+            self.stopped = True
+        self.stop_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得本次生成的延遲與速度統計
+
+        Returns:
+            Dict[str, Any]: prompt 與生成 token 數、首個 token 延遲、總時間與每秒生成 token 數
+        """
+        finished_at = self.finished_at or time.perf_counter()
+        first_token_at = self.streamer.first_token_at
+        generated = self.streamer.generated_tokens
+        ttft = first_token_at - self.started_at if first_token_at is not None else None
+        # 生成速度不含 prefill：從第一個 token 之後計算
+        decode_seconds = finished_at - first_token_at if first_token_at is not None else 0.0
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "generated_tokens": generated,
+            "time_to_first_token": ttft,
+            "total_seconds": finished_at - self.started_at,
+            "tokens_per_second": (generated - 1) / decode_seconds if generated > 1 and decode_seconds > 0 else None,
+            "stopped": self.stopped
+        }
+
+    def _log_stats(self) -> None:
+        stats = self.stats()
+        ttft = stats["time_to_first_token"]
+        rate = stats["tokens_per_second"]
+        logger.info(
+            f"Streamed {stats['generated_tokens']} tokens: "
+            f"TTFT {f'{ttft * 1000:.0f} ms' if ttft is not None else 'n/a'}, "
+            f"{f'{rate:.1f}' if rate is not None else 'n/a'} tokens/s"
+            f"{' (stopped)' if stats['stopped'] else ''}"
+        )
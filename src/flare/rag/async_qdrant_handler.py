@@ -0,0 +1,412 @@
+from typing import List, Dict, Any, Optional, Set, Union
+import asyncio
+import importlib.util
+import logging
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+from qdrant_client.http.models import Distance
+import numpy as np
+
+from .filters import CompiledFilter, PayloadIndexer, compile_filter
+from .qdrant_handler import (
+    align_sparse_vectors,
+    build_search_params,
+    collection_config,
+    drop_existing_points,
+    filter_arguments,
+    format_hits,
+    group_searches,
+    has_sparse_vectors,
+    hybrid_query,
+    missing_payload_indexes,
+    prepare_points,
+    query_request,
+    search_arguments,
+    split_batches
+)
+from .sparse import validate_mode
+from .vector_store import AsyncVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def grpc_available() -> bool:
+    """qdrant-client 的 gRPC 傳輸是否可用"""
+    return importlib.util.find_spec("grpc") is not None
+
+
+class AsyncQdrantHandler(AsyncVectorStore):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6333,
+        vector_size: int = 1024,
+        distance: Distance = Distance.COSINE,
+        grpc_port: int = 6334,
+        prefer_grpc: Optional[bool] = None,
+        timeout: Optional[int] = None,
+        upsert_batch_size: int = 256,
+        upsert_parallel: int = 4,
+        payload_indexer: Optional[PayloadIndexer] = None
+    ):
+        """
+        初始化非同步 Qdrant 處理器
+
+        QdrantHandler 的非同步版本。start() 建立單一長期存在的 AsyncQdrantClient，
+        所有呼叫共用，其連線池（HTTP keep-alive 或 gRPC channel）在請求之間重複使用。
+
+        Args:
+            host (str): Qdrant 伺服器主機位址
+            port (int): Qdrant 伺服器 REST 埠號
+            vector_size (int): 向量維度
+            distance (Distance): 距離度量
+            grpc_port (int): Qdrant 伺服器 gRPC 埠號
+            prefer_grpc (Optional[bool]): 以 gRPC 取代 REST（預設在已安裝 grpcio 時使用 gRPC）
+            timeout (Optional[int]): 請求逾時秒數
+            upsert_batch_size (int): 每個 upsert 請求的資料點上限
+            upsert_parallel (int): 同時送出的 upsert 請求數
+            payload_indexer (Optional[PayloadIndexer]): 在經常被過濾的欄位上建立 payload 索引
+        """
+        self.host = host
+        self.port = port
+        self.vector_size = vector_size
+        self.distance = distance
+        self.grpc_port = grpc_port
+        self.prefer_grpc = grpc_available() if prefer_grpc is None else prefer_grpc
+        self.timeout = timeout
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_parallel = upsert_parallel
+        self.client: Optional[AsyncQdrantClient] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._pending: List[asyncio.Task] = []
+        self._sparse_collections: Dict[str, bool] = {}
+        self.payload_indexer = payload_indexer
+
+    async def start(self) -> None:
+        """啟動 Qdrant 客戶端（已啟動時不做任何事）"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.client is None:
+                self.client = AsyncQdrantClient(
+                    host=self.host,
+                    port=self.port,
+                    grpc_port=self.grpc_port,
+                    prefer_grpc=self.prefer_grpc,
+                    timeout=self.timeout
+                )
+
+    async def close(self) -> None:
+        """等待尚未完成的 upsert 並關閉客戶端"""
+        try:
+            await self.flush()
+        finally:
+            if self.client is not None:
+                await self.client.close()
+                self.client = None
+
+    def _require_client(self) -> AsyncQdrantClient:
+        if not self.client:
+            raise RuntimeError("Qdrant client not initialized. Call start() first.")
+        return self.client
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        vector_size: Optional[int] = None,
+        distance: Optional[Distance] = None,
+        sparse: bool = False,
+        quantization: Optional[str] = None,
+        on_disk: bool = False,
+        on_disk_payload: Optional[bool] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None
+    ) -> None:
+        """
+        建立新集合
+
+        Args:
+            collection_name (str): 集合名稱
+            vector_size (Optional[int]): 向量維度，未指定時使用預設值
+            distance (Optional[Distance]): 距離度量，未指定時使用預設值
+            sparse (bool): 同時保存 BM25 稀疏向量，供稀疏與混合搜尋使用
+            quantization (Optional[str]): None、"scalar"（int8）、"product"（x16）或 "binary"（1 bit）；
+                量化後的向量保留在記憶體中
+            on_disk (bool): 原始向量保存在磁碟上（記憶體映射）
+            on_disk_payload (Optional[bool]): payload 保存在磁碟上（None 使用伺服器預設值）
+            hnsw_m (Optional[int]): HNSW 圖的連接數（None 使用伺服器預設值）
+            hnsw_ef_construct (Optional[int]): HNSW 建構時的候選列表大小（None 使用伺服器預設值）
+        """
+        client = self._require_client()
+        if not await client.collection_exists(collection_name=collection_name):
+            await client.create_collection(
+                collection_name=collection_name,
+                **collection_config(
+                    vector_size or self.vector_size, distance or self.distance, sparse,
+                    quantization, on_disk, on_disk_payload, hnsw_m, hnsw_ef_construct
+                )
+            )
+            self._sparse_collections.pop(collection_name, None)
+
+    async def has_sparse(self, collection_name: str) -> bool:
+        """集合是否保存稀疏向量（依集合快取）"""
+        if collection_name not in self._sparse_collections:
+            info = await self._require_client().get_collection(collection_name=collection_name)
+            self._sparse_collections[collection_name] = has_sparse_vectors(info)
+        return self._sparse_collections[collection_name]
+
+    async def add(
+        self,
+        collection_name: str,
+        vectors: Union[List[List[float]], np.ndarray],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        skip_existing: bool = False,
+        sparse_vectors: Optional[List[models.SparseVector]] = None
+    ) -> None:
+        """
+        將向量與相關資料加入集合
+
+        集合建立時未指定 sparse=True 時，稀疏向量會被捨棄。
+
+        Args:
+            collection_name (str): 集合名稱
+            vectors (Union[List[List[float]], np.ndarray]): 向量列表
+            payloads (List[Dict[str, Any]]): 相關資料列表
+            ids (Optional[List[str]]): id 列表，未提供時依內容雜湊產生
+            batch_size (Optional[int]): 每個 upsert 請求的資料點數，預設為 upsert_batch_size
+            parallel (Optional[int]): 同時進行的請求數，預設為 upsert_parallel
+            wait (bool): 等待 upsert 完成；wait=False 時請求以背景工作執行，以 flush() 等待完成
+            skip_existing (bool): 不重新送出 id 已存在的資料點
+            sparse_vectors (Optional[List[models.SparseVector]]): BM25 稀疏向量（SparseEncoder.encode_documents）
+        """
+        client = self._require_client()
+        ids, vectors, payloads = prepare_points(vectors, payloads, ids)
+        all_ids = ids
+        if skip_existing:
+            existing = await self.existing_ids(collection_name, ids)
+            if existing:
+                ids, vectors, payloads = drop_existing_points(ids, vectors, payloads, existing)
+        if sparse_vectors is not None and not await self.has_sparse(collection_name):
+            sparse_vectors = None
+        sparse_vectors = align_sparse_vectors(all_ids, sparse_vectors, ids)
+        if not ids:
+            return
+
+        batches = split_batches(ids, vectors, payloads, batch_size or self.upsert_batch_size, sparse_vectors)
+        semaphore = asyncio.Semaphore(parallel or self.upsert_parallel)
+
+        async def upsert(batch: models.Batch) -> models.UpdateResult:
+            async with semaphore:
+                return await client.upsert(collection_name=collection_name, points=batch, wait=wait)
+
+        if wait:
+            await asyncio.gather(*(upsert(batch) for batch in batches))
+        else:
+            self._pending.extend(asyncio.create_task(upsert(batch)) for batch in batches)
+
+    async def flush(self) -> List[models.UpdateResult]:
+        """
+        等待所有以 wait=False 送出的 upsert 完成
+
+        Returns:
+            List[models.UpdateResult]: 尚未完成的 upsert 的更新結果
+
+        Raises:
+            Exception: 尚未完成的 upsert 中第一個發生的錯誤
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return list(results)
+
+    async def existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """
+        回傳 ids 中已存在於集合的部分
+
+        Args:
+            collection_name (str): 集合名稱
+            ids (List[str]): 候選資料點 id
+
+        Returns:
+            Set[str]: 已存在的 id
+        """
+        client = self._require_client()
+        if not ids:
+            return set()
+        records = await client.retrieve(
+            collection_name=collection_name,
+            ids=ids,
+            with_payload=False,
+            with_vectors=False
+        )
+        return {str(record.id) for record in records}
+
+    async def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        payload_filter: Optional[Dict[str, Any]] = None,
+        filter_conditions: Optional[List[Dict[str, Any]]] = None,
+        filter_type: str = "must",
+        sparse_vector: Optional[models.SparseVector] = None,
+        mode: str = "dense",
+        prefetch_limit: Optional[int] = None,
+        filter_expression: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        搜尋最相似的向量
+
+        集合建立時沒有稀疏向量時，sparse 與 hybrid 模式退回稠密搜尋。
+
+        Args:
+            collection_name (str): 集合名稱
+            query_vector (List[float]): 查詢向量
+            limit (int): 結果數量
+            score_threshold (Optional[float]): 相似度門檻
+            payload_filter (Optional[Dict[str, Any]]): payload 欄位的簡單過濾條件
+            filter_conditions (Optional[List[Dict[str, Any]]]): 複雜過濾條件列表
+            filter_type (str): 過濾條件的組合方式（"must"、"should"、"must_not"）
+            sparse_vector (Optional[models.SparseVector]): 稀疏查詢向量（SparseEncoder.encode_query）
+            mode (str): "dense"、"sparse"（僅 BM25）或 "hybrid"（稠密與 BM25 以 RRF 融合）
+            prefetch_limit (Optional[int]): 融合前每個搜尋取得的候選數
+            filter_expression (Optional[Dict[str, Any]]): 巢狀過濾運算式（見 FilterCompiler），與其他過濾參數以 "and" 組合
+            search_params (Optional[Dict[str, Any]]): 稠密搜尋選項（"hnsw_ef"、"exact"，量化的集合另有 "rescore" 與 "oversampling"）
+
+        Returns:
+            List[Dict[str, Any]]: 搜尋結果列表
+        """
+        client = self._require_client()
+        validate_mode(mode, sparse_vector)
+        compiled = compile_filter(payload_filter, filter_conditions, filter_type, filter_expression)
+        await self._index_filtered_fields(collection_name, compiled)
+        query_filter = compiled.filter if compiled is not None else None
+        params = build_search_params(search_params)
+        if mode != "dense" and await self.has_sparse(collection_name):
+            response = await client.query_points(
+                collection_name=collection_name,
+                **hybrid_query(
+                    mode, query_vector, sparse_vector, limit, score_threshold, query_filter, prefetch_limit, params
+                )
+            )
+            return format_hits(response.points)
+
+        search_kwargs = {}
+        if score_threshold is not None:
+            search_kwargs["score_threshold"] = score_threshold
+
+        if query_filter is not None:
+            search_kwargs["query_filter"] = query_filter
+
+        if params is not None:
+            search_kwargs["search_params"] = params
+
+        results = await client.search(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            **search_kwargs
+        )
+        return format_hits(results)
+
+    async def _index_filtered_fields(self, collection_name: str, compiled: Optional[CompiledFilter]) -> None:
+        """在達到 payload 索引門檻的欄位上建立 payload 索引"""
+        if self.payload_indexer is None:
+            return
+        due = self.payload_indexer.observe(collection_name, compiled)
+        if not due:
+            return
+        try:
+            info = await self.client.get_collection(collection_name=collection_name)
+            for field, schema in missing_payload_indexes(info, due):
+                await self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field,
+                    field_schema=schema,
+                    wait=False
+                )
+                logger.info(f"Creating {schema.value} payload index on {collection_name}.{field}")
+        except Exception as e:
+            # 建立索引失敗不影響搜尋
+            logger.warning(f"Failed to create payload indexes on {collection_name}: {e}")
+
+    async def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        執行多個搜尋，每個集合只送出一個 query_batch_points 請求，不同集合的請求同時送出
+
+        Args:
+            searches (List[Dict[str, Any]]): search() 的關鍵字參數，每項都含 collection_name
+
+        Returns:
+            List[List[Dict[str, Any]]]: 各搜尋的結果，依請求順序排列
+        """
+        client = self._require_client()
+        groups = group_searches(searches)
+
+        async def run(collection_name: str, positions: List[int]) -> List[models.QueryResponse]:
+            for i in positions:
+                await self._index_filtered_fields(collection_name, compile_filter(**filter_arguments(searches[i])))
+            sparse = (
+                any(searches[i].get("mode", "dense") != "dense" for i in positions)
+                and await self.has_sparse(collection_name)
+            )
+            return await client.query_batch_points(
+                collection_name=collection_name,
+                requests=[query_request(**search_arguments(searches[i]), sparse=sparse) for i in positions]
+            )
+
+        responses = await asyncio.gather(*(run(name, positions) for name, positions in groups.items()))
+        results: List[List[Dict[str, Any]]] = [[] for _ in searches]
+        for positions, group_responses in zip(groups.values(), responses):
+            for position, response in zip(positions, group_responses):
+                results[position] = format_hits(response.points)
+        return results
+
+    async def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+        """
+        管理集合操作
+
+        Args:
+            action (str): 操作類型（'delete'、'update'、'get_info'）
+            collection_name (str): 集合名稱
+            **kwargs: 操作相關參數
+
+        Returns:
+            Any: 操作結果
+        """
+        client = self._require_client()
+        if action == "delete":
+            self._sparse_collections.pop(collection_name, None)
+            if self.payload_indexer is not None:
+                self.payload_indexer.forget(collection_name)
+            return await client.delete_collection(collection_name=collection_name)
+        elif action == "update":
+            return await client.update_collection(
+                collection_name=collection_name,
+                **kwargs
+            )
+        elif action == "get_info":
+            return await client.get_collection(collection_name=collection_name)
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+    async def list_collections(self) -> List[str]:
+        """
+        列出所有可用的集合
+
+        Returns:
+            List[str]: 集合名稱列表
+        """
+        client = self._require_client()
+        collections = (await client.get_collections()).collections
+        return [collection.name for collection in collections]
@@ -0,0 +1,243 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from ..embedding.cache import normalize_text
+from ..utils.chunker import load_tokenizer
+
+
+class Passage:
+    """檢索到的文本塊，可能已與重疊的文本塊合併"""
+
+    def __init__(
+        self,
+        text: str,
+        score: float,
+        source: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        page: Optional[int] = None,
+        ids: Optional[List[Any]] = None
+    ):
+        self.text = text
+        self.score = score
+        self.source = source
+        self.start = start
+        self.end = end
+        self.page = page
+        self.ids = ids or []
+
+    @property
+    def has_offsets(self) -> bool:
+        return self.source is not None and self.start is not None and self.end is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ids": self.ids,
+            "score": self.score,
+            "source": self.source,
+            "page": self.page,
+            "start": self.start,
+            "end": self.end
+        }
+
+
+class BuiltContext(NamedTuple):
+    """已組裝、可直接放入提示詞的參考資料"""
+    text: str
+    passages: List[Dict[str, Any]]
+    token_count: int
+    dropped: int
+
+
+def passages_from_hits(results: List[Dict[str, Any]]) -> List[Passage]:
+    """
+    將搜尋結果（format_hits 的輸出）轉為段落
+
+    Args:
+        results (List[Dict[str, Any]]): 含 "id"、"score" 與 "payload" 的搜尋結果
+
+    Returns:
+        List[Passage]: payload 中有文字的結果所對應的段落
+    """
+    passages = []
+    for hit in results:
+        payload = hit.get("payload") or {}
+        text = payload.get("text")
+        if not text:
+            continue
+        passages.append(Passage(
+            text=text,
+            score=hit.get("score") or 0.0,
+            source=payload.get("source"),
+            start=payload.get("start"),
+            end=payload.get("end"),
+            page=payload.get("page"),
+            ids=[hit.get("id")]
+        ))
+    return passages
+
+
+def merge_overlapping(passages: List[Passage]) -> List[Passage]:
+    """
+    合併同一文件中字元範圍重疊或相接的文本塊
+
+    相鄰文本塊共用 chunk_overlap 個 token，兩者都送入提示詞會重複這段文字。
+    合併後的段落保留各部分中最高的分數。沒有位置資訊的段落若文字已包含在
+    合併後的段落中則捨棄，其餘依正規化後的文字去除重複。
+
+    Args:
+        passages (List[Passage]): 檢索到的段落
+
+    Returns:
+        List[Passage]: 去除重複後的段落
+    """
+    by_source: Dict[str, List[Passage]] = {}
+    others: List[Passage] = []
+    for passage in passages:
+        if passage.has_offsets:
+            by_source.setdefault(passage.source, []).append(passage)
+        else:
+            others.append(passage)
+
+    merged: List[Passage] = []
+    for source, items in by_source.items():
+        items.sort(key=lambda passage: passage.start)
+        current = None
+        for passage in items:
+            if current is not None and passage.start <= current.end:
+                if passage.end > current.end:
+                    # 只接上超出目前範圍的部分
+                    current.text += passage.text[current.end - passage.start:]
+                    current.end = passage.end
+                current.score = max(current.score, passage.score)
+                current.ids.extend(passage.ids)
+                continue
+            current = Passage(
+                passage.text, passage.score, source, passage.start, passage.end, passage.page, list(passage.ids)
+            )
+            merged.append(current)
+
+    # 沒有位置資訊的段落若已包含在合併後的段落中則捨棄，其餘依正規化文字去除重複
+    merged_texts = [normalize_text(passage.text) for passage in merged]
+    unique: Dict[str, Passage] = {}
+    for passage in merged + others:
+        key = normalize_text(passage.text)
+        if not passage.has_offsets:
+            container = next((i for i, text in enumerate(merged_texts) if key in text), None)
+            if container is not None:
+                merged[container].score = max(merged[container].score, passage.score)
+                merged[container].ids.extend(passage.ids)
+                continue
+        kept = unique.get(key)
+        if kept is None or passage.score > kept.score:
+            unique[key] = passage
+    return list(unique.values())
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        tokenizer=None,
+        max_context_tokens: int = 1024,
+        separator: str = "\n\n",
+        max_cached_passages: int = 4096
+    ):
+        """
+        初始化上下文組裝器，在 token 預算內組裝檢索到的段落
+
+        先合併重疊的文本塊，再依分數由高到低放入段落，直到超過
+        max_context_tokens 為止。若連最相關的段落都放不下，則在 token 邊界
+        截斷，提示詞不會超過預算。段落的 token 位置依文字快取，重複被檢索到
+        的段落只需 tokenize 一次。
+
+        Args:
+            tokenizer: 提供 token_spans(text) 的物件（見 utils.chunker），未提供時使用近似的正規表示式 tokenizer
+            max_context_tokens (int): 組裝後上下文的 token 預算
+            separator (str): 段落之間的分隔文字
+            max_cached_passages (int): 快取的已 tokenize 段落數上限
+        """
+        if max_context_tokens <= 0:
+            raise ValueError("max_context_tokens must be positive")
+        self.tokenizer = tokenizer or load_tokenizer(None)
+        self.max_context_tokens = max_context_tokens
+        self.separator = separator
+        self.max_cached_passages = max_cached_passages
+        self._separator_tokens = len(self.tokenizer.token_spans(separator)) if separator.strip() else 0
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _token_ends(self, text: str) -> np.ndarray:
+        """文字中每個 token 的結束位置（有快取）"""
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            ends = self._cache.get(key)
+            if ends is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return ends
+            self.cache_misses += 1
+        ends = np.fromiter((end for _, end in self.tokenizer.token_spans(text)), dtype=np.int32)
+        with self._lock:
+            self._cache[key] = ends
+            while len(self._cache) > self.max_cached_passages:
+                self._cache.popitem(last=False)
+        return ends
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._token_ends(text))
+
+    def build(self, results: List[Dict[str, Any]], max_context_tokens: Optional[int] = None) -> BuiltContext:
+        """
+        由搜尋結果組裝查詢的上下文
+
+        Args:
+            results (List[Dict[str, Any]]): 搜尋結果（format_hits 的輸出）
+            max_context_tokens (Optional[int]): 本次呼叫使用的 token 預算，預設使用初始化時的設定
+
+        Returns:
+            BuiltContext: 組裝後的文字、使用的段落、token 數與未放入的段落數
+        """
+        budget = max_context_tokens or self.max_context_tokens
+        passages = merge_overlapping(passages_from_hits(results))
+        passages.sort(key=lambda passage: passage.score, reverse=True)
+
+        selected: List[Passage] = []
+        used = 0
+        for passage in passages:
+            ends = self._token_ends(passage.text)
+            cost = len(ends) + (self._separator_tokens if selected else 0)
+            if used + cost <= budget:
+                selected.append(passage)
+                used += cost
+            elif not selected and len(ends):
+                # 最相關的段落本身就超過預算時截斷，避免沒有任何參考資料
+                passage.text = passage.text[:ends[budget - 1]]
+                if passage.start is not None:
+                    passage.end = passage.start + len(passage.text)
+                selected.append(passage)
+                used = budget
+
+        return BuiltContext(
+            text=self.separator.join(passage.text for passage in selected),
+            passages=[passage.to_dict() for passage in selected],
+            token_count=used,
+            dropped=len(passages) - len(selected)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """取得 tokenize 快取的統計"""
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "cached_passages": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "max_context_tokens": self.max_context_tokens
+            }
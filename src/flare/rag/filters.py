@@ -0,0 +1,332 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import threading
+from qdrant_client.http import models
+
+BOOLEAN_OPERATORS = ("and", "or", "not")
+FIELD_OPERATORS = ("match", "any", "except", "text", "range", "is_empty", "is_null")
+RANGE_BOUNDS = ("gt", "gte", "lt", "lte")
+LEGACY_FILTER_TYPES = {"must": "and", "should": "or", "must_not": "not"}
+
+
+class FilterError(ValueError):
+    """無效的過濾運算式"""
+
+
+class CompiledFilter:
+    """已驗證的過濾器，以及其過濾的每個欄位所需的 payload 索引類型"""
+
+    __slots__ = ("filter", "fields")
+
+    def __init__(self, query_filter: models.Filter, fields: Dict[str, models.PayloadSchemaType]):
+        self.filter = query_filter
+        self.fields = fields
+
+
+def _parse_datetime(value: str, path: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise FilterError(f"{path}: {value!r} is not an ISO 8601 datetime")
+    # 沒有時區的時間視為 UTC
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _value_schema(value: Any) -> models.PayloadSchemaType:
+    if isinstance(value, bool):
+        return models.PayloadSchemaType.BOOL
+    if isinstance(value, int):
+        return models.PayloadSchemaType.INTEGER
+    if isinstance(value, float):
+        return models.PayloadSchemaType.FLOAT
+    return models.PayloadSchemaType.KEYWORD
+
+
+class _Compiler:
+    """編譯單一運算式，同時收集被過濾的欄位"""
+
+    def __init__(self):
+        self.fields: Dict[str, models.PayloadSchemaType] = {}
+
+    def filter(self, expression: Any, path: str) -> models.Filter:
+        if not isinstance(expression, dict):
+            raise FilterError(f"{path}: expected an object, got {type(expression).__name__}")
+        operators = [operator for operator in BOOLEAN_OPERATORS if operator in expression]
+        if not operators:
+            return models.Filter(must=[self.condition(expression, path)])
+        if len(operators) > 1 or len(expression) > 1:
+            raise FilterError(f"{path}: a boolean node takes exactly one of {', '.join(BOOLEAN_OPERATORS)}")
+        operator = operators[0]
+        children = expression[operator]
+        # not 可接單一條件，代表排除該條件
+        if operator == "not" and isinstance(children, dict):
+            children = [children]
+        if not isinstance(children, list):
+            raise FilterError(f"{path}.{operator}: expected a list of conditions")
+        conditions = [self.condition(child, f"{path}.{operator}[{i}]") for i, child in enumerate(children)]
+        if operator == "and":
+            return models.Filter(must=conditions)
+        if operator == "or":
+            return models.Filter(should=conditions)
+        return models.Filter(must_not=conditions)
+
+    def condition(self, expression: Any, path: str) -> Any:
+        if not isinstance(expression, dict):
+            raise FilterError(f"{path}: expected an object, got {type(expression).__name__}")
+        if any(operator in expression for operator in BOOLEAN_OPERATORS):
+            return self.filter(expression, path)
+        if "has_id" in expression:
+            ids = expression["has_id"]
+            if len(expression) > 1 or not isinstance(ids, list) or not ids:
+                raise FilterError(f"{path}: has_id takes a non-empty list of point ids")
+            return models.HasIdCondition(has_id=ids)
+
+        key = expression.get("key")
+        if not isinstance(key, str) or not key:
+            raise FilterError(f"{path}: a field condition needs a non-empty \"key\"")
+        operators = [operator for operator in FIELD_OPERATORS if operator in expression]
+        unknown = set(expression) - set(FIELD_OPERATORS) - {"key"}
+        if unknown:
+            raise FilterError(f"{path}: unknown field {', '.join(sorted(unknown))}")
+        if len(operators) != 1:
+            raise FilterError(f"{path}: a field condition takes exactly one of {', '.join(FIELD_OPERATORS)}")
+        operator = operators[0]
+        value = expression[operator]
+        path = f"{path}.{operator}"
+
+        if operator == "match":
+            if isinstance(value, (dict, list)) or value is None:
+                raise FilterError(f"{path}: expected a keyword, number or boolean (use \"any\" for a list)")
+            self._field(key, _value_schema(value))
+            return models.FieldCondition(key=key, match=models.MatchValue(value=value))
+        if operator in ("any", "except"):
+            if not isinstance(value, list) or not value:
+                raise FilterError(f"{path}: expected a non-empty list")
+            if not (all(isinstance(item, str) for item in value) or all(type(item) is int for item in value)):
+                raise FilterError(f"{path}: values must be all strings or all integers")
+            self._field(key, _value_schema(value[0]))
+            if operator == "any":
+                return models.FieldCondition(key=key, match=models.MatchAny(any=value))
+            return models.FieldCondition(key=key, match=models.MatchExcept(**{"except": value}))
+        if operator == "text":
+            if not isinstance(value, str) or not value:
+                raise FilterError(f"{path}: expected a non-empty string")
+            self._field(key, models.PayloadSchemaType.TEXT)
+            return models.FieldCondition(key=key, match=models.MatchText(text=value))
+        if operator == "range":
+            return models.FieldCondition(key=key, range=self.range(key, value, path))
+        if value is not True:
+            raise FilterError(f"{path}: expected true")
+        if operator == "is_empty":
+            return models.IsEmptyCondition(is_empty=models.PayloadField(key=key))
+        return models.IsNullCondition(is_null=models.PayloadField(key=key))
+
+    def range(self, key: str, bounds: Any, path: str) -> Any:
+        if not isinstance(bounds, dict) or not bounds:
+            raise FilterError(f"{path}: expected an object with some of {', '.join(RANGE_BOUNDS)}")
+        unknown = set(bounds) - set(RANGE_BOUNDS)
+        if unknown:
+            raise FilterError(f"{path}: unknown bound {', '.join(sorted(unknown))}")
+        values = [value for value in bounds.values() if value is not None]
+        if values and all(isinstance(value, str) for value in values):
+            # 字串邊界為日期時間範圍
+            self._field(key, models.PayloadSchemaType.DATETIME)
+            return models.DatetimeRange(**{
+                bound: None if value is None else _parse_datetime(value, f"{path}.{bound}")
+                for bound, value in bounds.items()
+            })
+        if not all(_is_number(value) for value in values):
+            raise FilterError(f"{path}: bounds must be all numbers or all ISO 8601 datetimes")
+        floats = any(isinstance(value, float) for value in values)
+        self._field(key, models.PayloadSchemaType.FLOAT if floats else models.PayloadSchemaType.INTEGER)
+        return models.Range(**bounds)
+
+    def _field(self, key: str, schema: models.PayloadSchemaType) -> None:
+        # 同一欄位有多種條件時以第一個條件的型別建立索引
+        self.fields.setdefault(key, schema)
+
+
+class FilterCompiler:
+    def __init__(self, max_entries: int = 1024):
+        """
+        初始化過濾運算式編譯器，將運算式編譯為 Qdrant 過濾器，並依正規形式記憶結果
+
+        運算式為欄位條件或布林節點，可任意巢狀：
+
+            {"and": [
+                {"key": "source", "any": ["nvd.pdf", "mitre.pdf"]},
+                {"or": [
+                    {"key": "severity", "range": {"gte": 7}},
+                    {"key": "published", "range": {"gte": "2024-01-01T00:00:00Z"}}
+                ]},
+                {"not": {"key": "status", "match": "rejected"}}
+            ]}
+
+        欄位條件取下列其中之一：match（單一值）、any、except（字串或整數列表）、
+        text（全文）、range（數值，或 ISO 8601 字串表示日期時間範圍）、is_empty 或
+        is_null（true）；{"has_id": [...]} 比對資料點 id。運算式只驗證一次，重複的
+        運算式直接回傳快取中已驗證的過濾器。
+
+        Args:
+            max_entries (int): 保留的已編譯過濾器數量（淘汰最久未使用者）
+        """
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, CompiledFilter]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def canonical(expression: Dict[str, Any]) -> str:
+        """運算式的正規形式（與鍵的順序無關）"""
+        try:
+            return json.dumps(expression, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            raise FilterError(f"filter is not JSON serializable: {e}")
+
+    def compile(self, expression: Dict[str, Any]) -> CompiledFilter:
+        """
+        編譯運算式（或取得快取中的編譯結果）
+
+        Args:
+            expression (Dict[str, Any]): 過濾運算式
+
+        Returns:
+            CompiledFilter: Qdrant 過濾器與被過濾的欄位
+
+        Raises:
+            FilterError: 運算式無效
+        """
+        key = self.canonical(expression)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        compiler = _Compiler()
+        compiled = CompiledFilter(compiler.filter(expression, "filter"), compiler.fields)
+        with self._lock:
+            self._cache[key] = compiled
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+default_compiler = FilterCompiler()
+
+
+def legacy_expression(
+    payload_filter: Optional[Dict[str, Any]] = None,
+    filter_conditions: Optional[List[Dict[str, Any]]] = None,
+    filter_type: str = "must"
+) -> Optional[Dict[str, Any]]:
+    """
+    與 payload_filter / filter_conditions 參數等價的運算式
+
+    與原本相同，含 range 的過濾條件會忽略其 match。
+    """
+    if payload_filter is None and filter_conditions is None:
+        return None
+    if filter_type not in LEGACY_FILTER_TYPES:
+        raise ValueError(f"Unsupported filter type: {filter_type}")
+    conditions = [{"key": key, "match": value} for key, value in (payload_filter or {}).items()]
+    for condition in filter_conditions or []:
+        if condition.get("range") is not None:
+            bounds = {bound: condition["range"][bound] for bound in RANGE_BOUNDS if bound in condition["range"]}
+            conditions.append({"key": condition["key"], "range": bounds})
+        elif condition.get("match") is not None:
+            conditions.append({"key": condition["key"], "match": condition["match"]})
+    return {LEGACY_FILTER_TYPES[filter_type]: conditions}
+
+
+def compile_filter(
+    payload_filter: Optional[Dict[str, Any]] = None,
+    filter_conditions: Optional[List[Dict[str, Any]]] = None,
+    filter_type: str = "must",
+    filter_expression: Optional[Dict[str, Any]] = None,
+    compiler: Optional[FilterCompiler] = None
+) -> Optional[CompiledFilter]:
+    """
+    編譯搜尋的過濾參數
+
+    Args:
+        payload_filter (Optional[Dict[str, Any]]): payload 欄位的簡單過濾條件
+        filter_conditions (Optional[List[Dict[str, Any]]]): 複雜過濾條件列表
+        filter_type (str): 過濾條件的組合方式（"must"、"should"、"must_not"）
+        filter_expression (Optional[Dict[str, Any]]): 巢狀過濾運算式（見 FilterCompiler），與其他參數以 "and" 組合
+        compiler (Optional[FilterCompiler]): 使用的編譯器，預設為共用的編譯器
+
+    Returns:
+        Optional[CompiledFilter]: 編譯後的過濾器，未指定任何條件時為 None
+    """
+    parts = [
+        part for part in (legacy_expression(payload_filter, filter_conditions, filter_type), filter_expression)
+        if part is not None
+    ]
+    if not parts:
+        return None
+    expression = parts[0] if len(parts) == 1 else {"and": parts}
+    return (compiler or default_compiler).compile(expression)
+
+
+class PayloadIndexer:
+    def __init__(self, min_uses: int = 100):
+        """
+        初始化 payload 索引判斷器，決定哪些 payload 欄位值得建立索引
+
+        計算每個集合中各欄位被過濾的次數；欄位的次數達到 min_uses 時只回報一次，
+        呼叫端只需建立一次 payload 索引。
+
+        Args:
+            min_uses (int): 欄位被過濾多少次搜尋後建立索引
+        """
+        self.min_uses = min_uses
+        self._uses: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, collection_name: str, compiled: Optional[CompiledFilter]) -> List[Tuple[str, models.PayloadSchemaType]]:
+        """
+        記錄一次有過濾條件的搜尋
+
+        Args:
+            collection_name (str): 集合名稱
+            compiled (Optional[CompiledFilter]): 搜尋的過濾器
+
+        Returns:
+            List[Tuple[str, models.PayloadSchemaType]]: 剛達到 min_uses 的 (欄位, 索引類型)
+        """
+        if compiled is None or not compiled.fields:
+            return []
+        due = []
+        with self._lock:
+            for field, schema in compiled.fields.items():
+                uses = self._uses.get((collection_name, field), 0) + 1
+                self._uses[(collection_name, field)] = uses
+                if uses == self.min_uses:
+                    due.append((field, schema))
+        return due
+
+    def forget(self, collection_name: str) -> None:
+        """重設已刪除集合的計數"""
+        with self._lock:
+            for key in [key for key in self._uses if key[0] == collection_name]:
+                del self._uses[key]
@@ -0,0 +1,364 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..embedding.main import BGEEmbedding
+from ..utils.chunker import Chunk
+from ..utils.document_handler import DocumentHandler, spawn_context
+from .qdrant_handler import make_point_id
+from .sparse import SparseEncoder
+from .vector_store import AsyncVectorStore
+
+logger = logging.getLogger(__name__)
+
+# 通知階段工作者其輸入佇列已結束的哨兵值
+_DONE = object()
+
+
+class IngestionJob:
+    """單一文件匯入的進度紀錄"""
+
+    def __init__(self, job_id: str, filename: str, collection_name: str):
+        self.job_id = job_id
+        self.filename = filename
+        self.collection_name = collection_name
+        self.status = "pending"
+        self.chunks_total: Optional[int] = None
+        self.chunks_produced = 0
+        self.chunks_embedded = 0
+        self.chunks_failed = 0
+        self.chunks_skipped = 0
+        self.points_upserted = 0
+        self.pages_extracted = 0
+        self.extraction_seconds = 0.0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        序列化工作進度
+
+        Returns:
+            Dict[str, Any]: 描述工作狀態的字典
+        """
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "collection_name": self.collection_name,
+            "status": self.status,
+            "chunks_total": self.chunks_total,
+            "chunks_produced": self.chunks_produced,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_failed": self.chunks_failed,
+            "chunks_skipped": self.chunks_skipped,
+            "points_upserted": self.points_upserted,
+            "pages_extracted": self.pages_extracted,
+            "extraction_seconds": self.extraction_seconds,
+            "error": self.error,
+            "elapsed_seconds": elapsed
+        }
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        embedder: BGEEmbedding,
+        qdrant_handler: AsyncVectorStore,
+        embed_batch_size: int = 32,
+        upsert_batch_size: int = 128,
+        embed_concurrency: int = 2,
+        upsert_concurrency: int = 2,
+        queue_size: int = 8,
+        max_jobs: int = 100,
+        parallel_extraction: bool = False,
+        extraction_workers: Optional[int] = None,
+        min_parallel_pages: int = 32,
+        tokenizer_name: Optional[str] = None,
+        sparse_encoder: Optional[SparseEncoder] = None
+    ):
+        """
+        初始化分階段的匯入流程：解析 -> 分塊 -> 嵌入 -> 寫入
+
+        各階段同時執行並以有界佇列連接，較慢的階段會對上游施加背壓，而不是把整份
+        文件緩存在記憶體中。嵌入與 Qdrant 呼叫以非同步客戶端 await，解析則交給工作
+        執行緒，事件迴圈不會被阻塞。
+
+        Args:
+            embedder (BGEEmbedding): 嵌入客戶端
+            qdrant_handler (AsyncVectorStore): 向量儲存處理器（Qdrant 或本地後端）
+            embed_batch_size (int): 每個嵌入請求的文本塊數
+            upsert_batch_size (int): 每次寫入的資料點上限
+            embed_concurrency (int): 同時進行的嵌入工作者數
+            upsert_concurrency (int): 同時進行的寫入工作者數
+            queue_size (int): 各階段之間佇列的容量（以批次計）
+            max_jobs (int): 保留供查詢的工作紀錄數
+            parallel_extraction (bool): 在所有工作共用的程序池中抽取 PDF 頁面與 Word 文件
+            extraction_workers (Optional[int]): 抽取程序池的大小
+            min_parallel_pages (int): 頁數少於此值的 PDF 依序抽取
+            tokenizer_name (Optional[str]): 計算文本塊大小（token 數）所使用的 tokenizer
+            sparse_encoder (Optional[SparseEncoder]): 同時保存文本塊的 BM25 稀疏向量
+        """
+        self.embedder = embedder
+        self.qdrant_handler = qdrant_handler
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.upsert_concurrency = upsert_concurrency
+        self.queue_size = queue_size
+        self.max_jobs = max_jobs
+        self.parallel_extraction = parallel_extraction
+        self.extraction_workers = extraction_workers
+        self.min_parallel_pages = min_parallel_pages
+        self.tokenizer_name = tokenizer_name
+        self.sparse_encoder = sparse_encoder
+        self._extraction_executor: Optional[ProcessPoolExecutor] = None
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+
+    def submit(
+        self,
+        file_path: str,
+        collection_name: str,
+        chunk_size: int,
+        chunk_overlap: int,
+        filename: Optional[str] = None,
+        delete_file: bool = False
+    ) -> IngestionJob:
+        """
+        在執行中的事件迴圈上排程一份文件的匯入
+
+        Args:
+            file_path (str): 文件在磁碟上的路徑
+            collection_name (str): 目標集合
+            chunk_size (int): 文本塊大小（token 數）
+            chunk_overlap (int): 文本塊重疊大小（token 數）
+            filename (Optional[str]): 存入 payload 的原始檔名
+            delete_file (bool): 工作結束後刪除 file_path
+
+        Returns:
+            IngestionJob: 建立的工作，可用 get_job() 查詢進度
+        """
+        job = IngestionJob(
+            job_id=str(uuid.uuid4()),
+            filename=filename or os.path.basename(file_path),
+            collection_name=collection_name
+        )
+        self._register(job)
+        document_handler = DocumentHandler(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            parallel=self.parallel_extraction,
+            max_workers=self.extraction_workers,
+            min_parallel_pages=self.min_parallel_pages,
+            executor=self._get_extraction_executor(),
+            tokenizer_name=self.tokenizer_name
+        )
+        job.task = asyncio.create_task(self.run(job, file_path, document_handler, delete_file))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def _get_extraction_executor(self) -> Optional[ProcessPoolExecutor]:
+        """所有工作共用的程序池，啟動成本只需支付一次"""
+        if not self.parallel_extraction:
+            return None
+        if self._extraction_executor is None:
+            self._extraction_executor = ProcessPoolExecutor(
+                max_workers=self.extraction_workers, mp_context=spawn_context()
+            )
+        return self._extraction_executor
+
+    def close(self) -> None:
+        """關閉抽取程序池"""
+        if self._extraction_executor is not None:
+            self._extraction_executor.shutdown(wait=False, cancel_futures=True)
+            self._extraction_executor = None
+
+    def _register(self, job: IngestionJob) -> None:
+        self.jobs[job.job_id] = job
+        # 只保留最近的工作紀錄，優先淘汰已完成的工作
+        while len(self.jobs) > self.max_jobs:
+            finished = next((key for key, value in self.jobs.items() if value.done), None)
+            if finished is None:
+                break
+            del self.jobs[finished]
+
+    async def run(
+        self,
+        job: IngestionJob,
+        file_path: str,
+        document_handler: DocumentHandler,
+        delete_file: bool = False
+    ) -> IngestionJob:
+        """
+        對一份文件執行所有流程階段直到完成
+
+        Args:
+            job (IngestionJob): 就地更新的工作紀錄
+            file_path (str): 文件在磁碟上的路徑
+            document_handler (DocumentHandler): 用於解析與分塊的處理器
+            delete_file (bool): 工作結束後刪除 file_path
+
+        Returns:
+            IngestionJob: 已完成的工作
+        """
+        job.status = "running"
+        job.started_at = time.time()
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        point_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def embed_stage() -> None:
+            workers = [
+                asyncio.create_task(self._embed_worker(job, chunk_queue, point_queue))
+                for _ in range(self.embed_concurrency)
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+            for _ in range(self.upsert_concurrency):
+                await point_queue.put(_DONE)
+
+        stages = [
+            asyncio.create_task(self._produce_chunks(job, file_path, document_handler, chunk_queue)),
+            asyncio.create_task(embed_stage())
+        ] + [
+            asyncio.create_task(self._upsert_worker(job, point_queue))
+            for _ in range(self.upsert_concurrency)
+        ]
+
+        try:
+            await asyncio.gather(*stages)
+            job.status = "completed"
+            logger.info(
+                f"Ingestion job {job.job_id} completed: "
+                f"{job.points_upserted} points, {job.chunks_failed} failed chunks"
+            )
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Ingestion job {job.job_id} failed: {str(e)}")
+        finally:
+            for stage in stages:
+                stage.cancel()
+            job.finished_at = time.time()
+            if delete_file:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+        return job
+
+    async def _produce_chunks(
+        self,
+        job: IngestionJob,
+        file_path: str,
+        document_handler: DocumentHandler,
+        chunk_queue: asyncio.Queue
+    ) -> None:
+        """
+        解析文件並分塊，產生嵌入請求大小的批次
+
+        文本塊從文件串流中延遲取出，記憶體中只保留佇列中的批次。
+        """
+        chunks = document_handler.iter_chunks(file_path)
+        while True:
+            batch = await asyncio.to_thread(self._next_batch, chunks)
+            if not batch:
+                break
+            job.chunks_produced += len(batch)
+            await chunk_queue.put(batch)
+        job.chunks_total = job.chunks_produced
+        job.pages_extracted = len(document_handler.page_timings)
+        job.extraction_seconds = sum(document_handler.page_timings.values())
+        for _ in range(self.embed_concurrency):
+            await chunk_queue.put(_DONE)
+
+    def _next_batch(self, chunks: Iterator[Chunk]) -> List[Chunk]:
+        return list(itertools.islice(chunks, self.embed_batch_size))
+
+    async def _embed_worker(
+        self,
+        job: IngestionJob,
+        chunk_queue: asyncio.Queue,
+        point_queue: asyncio.Queue
+    ) -> None:
+        """
+        嵌入文本塊批次
+
+        已以內容雜湊 id 存在的文本塊在嵌入前略過，無法嵌入的文本塊被捨棄。資料點為
+        (id, 向量, payload, 稀疏向量或 None)。
+        """
+        while True:
+            batch = await chunk_queue.get()
+            if batch is _DONE:
+                return
+            # payload 保留文字本身（暫存的上傳檔匯入後即刪除），位置資訊供持有原文件者定位
+            payloads = [{**chunk.to_payload(), "source": job.filename} for chunk in batch]
+            ids = [make_point_id(payload) for payload in payloads]
+            existing = await self.qdrant_handler.existing_ids(job.collection_name, ids)
+            pending = [i for i, point_id in enumerate(ids) if point_id not in existing]
+            job.chunks_skipped += len(batch) - len(pending)
+            if not pending:
+                continue
+
+            embeddings, failed = await self.embedder.aembed_texts(
+                [batch[i].text for i in pending], self.embed_batch_size
+            )
+            failed_set = set(failed)
+            job.chunks_failed += len(failed_set)
+            encoder = self.sparse_encoder
+            points = [
+                (
+                    ids[i],
+                    embeddings[row].tolist(),
+                    payloads[i],
+                    encoder.encode_document(batch[i].text) if encoder is not None else None
+                )
+                for row, i in enumerate(pending)
+                if row not in failed_set
+            ]
+            job.chunks_embedded += len(points)
+            if points:
+                await point_queue.put(points)
+
+    async def _upsert_worker(self, job: IngestionJob, point_queue: asyncio.Queue) -> None:
+        """寫入已嵌入的資料點，將佇列中的批次合併至最多 upsert_batch_size 個"""
+        finished = False
+        while not finished:
+            item = await point_queue.get()
+            if item is _DONE:
+                return
+            points = list(item)
+            while len(points) < self.upsert_batch_size and not point_queue.empty():
+                item = point_queue.get_nowait()
+                if item is _DONE:
+                    finished = True
+                    break
+                points.extend(item)
+            await self.qdrant_handler.add(
+                collection_name=job.collection_name,
+                vectors=[point[1] for point in points],
+                payloads=[point[2] for point in points],
+                ids=[point[0] for point in points],
+                batch_size=self.upsert_batch_size,
+                sparse_vectors=[point[3] for point in points] if self.sparse_encoder is not None else None
+            )
+            job.points_upserted += len(points)
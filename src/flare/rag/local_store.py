@@ -0,0 +1,1033 @@
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from datetime import datetime, timezone
+from pathlib import Path
+import asyncio
+import json
+import logging
+import re
+import shutil
+import threading
+from qdrant_client.http import models
+from qdrant_client.http.models import Distance
+import numpy as np
+
+from .qdrant_handler import (
+    align_sparse_vectors,
+    build_filter,
+    build_search_params,
+    drop_existing_points,
+    group_searches,
+    prepare_points,
+    search_arguments
+)
+from .sparse import bm25_idf, reciprocal_rank_fusion, validate_mode
+from .vector_store import AsyncVectorStore, VectorStore
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_\-][A-Za-z0-9_.\-]*$")
+INDEX_TYPES = ("ivf",)
+# 最少保留的向量列數，避免每次新增都擴充檔案
+MIN_CAPACITY = 1024
+
+
+def payload_values(payload: Optional[Dict[str, Any]], key: str) -> List[Any]:
+    """
+    取得 payload 欄位的值，與 Qdrant 相同方式攤平
+
+    巢狀欄位以點號表示（"meta.source"），陣列會被展開（"chunks[].page" 或
+    "chunks.page"），因此陣列欄位上的條件只要任一元素符合即成立。
+
+    Args:
+        payload (Dict[str, Any]): 資料點的 payload
+        key (str): 欄位路徑
+
+    Returns:
+        List[Any]: 找到的值（欄位不存在時為空列表）
+    """
+    values = [payload] if payload is not None else []
+    for part in key.split("."):
+        part = part[:-2] if part.endswith("[]") else part
+        found = []
+        for value in values:
+            if isinstance(value, list):
+                value_items = value
+            else:
+                value_items = [value]
+            for item in value_items:
+                if isinstance(item, dict) and part in item:
+                    found.append(item[part])
+        values = found
+    flattened = []
+    for value in values:
+        if isinstance(value, list):
+            flattened.extend(value)
+        else:
+            flattened.append(value)
+    return flattened
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    # 沒有時區的時間視為 UTC
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _in_range(value: Any, bounds: Union[models.Range, models.DatetimeRange]) -> bool:
+    if isinstance(bounds, models.DatetimeRange):
+        value = _as_datetime(value)
+        if value is None:
+            return False
+        gt, gte, lt, lte = (_as_datetime(bound) for bound in (bounds.gt, bounds.gte, bounds.lt, bounds.lte))
+    else:
+        if not _is_number(value):
+            return False
+        gt, gte, lt, lte = bounds.gt, bounds.gte, bounds.lt, bounds.lte
+    if gt is not None and not value > gt:
+        return False
+    if gte is not None and not value >= gte:
+        return False
+    if lt is not None and not value < lt:
+        return False
+    if lte is not None and not value <= lte:
+        return False
+    return True
+
+
+def _match_predicate(match: Any) -> Callable[[Any], bool]:
+    if isinstance(match, models.MatchValue):
+        target = match.value
+        # True 不應等於 1
+        return lambda value: value == target and isinstance(value, bool) == isinstance(target, bool)
+    if isinstance(match, models.MatchAny):
+        options = set(match.any)
+        return lambda value: not isinstance(value, (dict, list)) and value in options
+    if isinstance(match, models.MatchExcept):
+        excluded = set(match.except_)
+        return lambda value: not isinstance(value, (dict, list)) and value not in excluded
+    if isinstance(match, models.MatchText):
+        return lambda value: isinstance(value, str) and match.text in value
+    raise ValueError(f"Unsupported match condition: {type(match).__name__}")
+
+
+def _as_list(conditions: Any) -> List[Any]:
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+
+class _FilterEvaluator:
+    """在集合的 payload 上計算 Qdrant models.Filter"""
+
+    def __init__(self, ids: List[str], column: Callable[[str], List[List[Any]]]):
+        self.ids = ids
+        self.column = column
+        self.size = len(ids)
+
+    def mask(self, query_filter: models.Filter) -> np.ndarray:
+        result = np.ones(self.size, dtype=bool)
+        for condition in _as_list(query_filter.must):
+            result &= self.condition(condition)
+        should = _as_list(query_filter.should)
+        if should:
+            any_should = np.zeros(self.size, dtype=bool)
+            for condition in should:
+                any_should |= self.condition(condition)
+            result &= any_should
+        for condition in _as_list(query_filter.must_not):
+            result &= ~self.condition(condition)
+        return result
+
+    def _field(self, key: str, predicate: Callable[[Any], bool]) -> np.ndarray:
+        return np.fromiter(
+            (any(predicate(value) for value in values) for values in self.column(key)),
+            dtype=bool,
+            count=self.size
+        )
+
+    def condition(self, condition: Any) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self.mask(condition)
+        if isinstance(condition, models.HasIdCondition):
+            wanted = {str(point_id) for point_id in condition.has_id}
+            return np.fromiter((point_id in wanted for point_id in self.ids), dtype=bool, count=self.size)
+        if isinstance(condition, models.IsEmptyCondition):
+            # 與 Qdrant 相同，欄位不存在、為 null 或為空陣列都視為空
+            return np.fromiter(
+                (all(value is None for value in values) for values in self.column(condition.is_empty.key)),
+                dtype=bool,
+                count=self.size
+            )
+        if isinstance(condition, models.IsNullCondition):
+            return np.fromiter(
+                (any(value is None for value in values) for values in self.column(condition.is_null.key)),
+                dtype=bool,
+                count=self.size
+            )
+        if isinstance(condition, models.FieldCondition):
+            result = np.ones(self.size, dtype=bool)
+            if condition.match is not None:
+                result &= self._field(condition.key, _match_predicate(condition.match))
+            if condition.range is not None:
+                bounds = condition.range
+                result &= self._field(condition.key, lambda value: _in_range(value, bounds))
+            if condition.match is None and condition.range is None:
+                raise ValueError(f"Unsupported field condition on {condition.key}")
+            return result
+        raise ValueError(f"Unsupported filter condition: {type(condition).__name__}")
+
+
+class IVFIndex:
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, euclid: bool = False, seed: int = 0):
+        """
+        初始化倒排檔索引（IVF）：向量依最近的 k-means 中心分桶
+
+        搜尋時只計算最接近查詢的 nprobe 個桶中的向量，以少量召回率換取大幅
+        減少的內積計算。
+
+        Args:
+            nlist (Optional[int]): 桶數，預設為集合大小的平方根
+            nprobe (int): 每次查詢掃描的桶數
+            euclid (bool): 以歐氏距離而非內積分桶
+            seed (int): k-means 初始化的隨機種子
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.euclid = euclid
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._lists: List[List[np.ndarray]] = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        # 分段計算，避免 n x nlist 的距離矩陣佔用過多記憶體
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = np.asarray(vectors[start:start + chunk_size])
+            if self.euclid:
+                scores = 2 * chunk @ centroids.T - np.einsum("ij,ij->i", centroids, centroids)
+            else:
+                scores = chunk @ centroids.T
+            assignments[start:start + chunk_size] = np.argmax(scores, axis=1)
+        return assignments
+
+    def train(self, vectors: np.ndarray, iterations: int = 10) -> None:
+        """以（取樣的）向量執行 k-means，並將所有向量分桶"""
+        size = len(vectors)
+        nlist = min(self.nlist or max(1, int(np.sqrt(size))), size)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(size, nlist * 64)
+        sample = np.asarray(vectors[np.sort(rng.choice(size, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = self._assign(sample, centroids)
+            for bucket in range(nlist):
+                members = sample[assignments == bucket]
+                if len(members):
+                    centroids[bucket] = members.mean(axis=0)
+            if not self.euclid:
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                centroids /= np.where(norms == 0, 1, norms)
+        self.centroids = centroids
+        self._lists = [[] for _ in range(nlist)]
+        self.add(np.arange(size), vectors)
+        self.trained_size = size
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """以目前的中心將新向量分桶"""
+        assignments = self._assign(vectors, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        buckets, starts = np.unique(assignments[order], return_index=True)
+        for bucket, members in zip(buckets, np.split(np.asarray(rows)[order], starts[1:])):
+            self._lists[bucket].append(members)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """最接近查詢的各桶中的列"""
+        if self.euclid:
+            scores = 2 * self.centroids @ query - np.einsum("ij,ij->i", self.centroids, self.centroids)
+        else:
+            scores = self.centroids @ query
+        nprobe = min(self.nprobe, len(self.centroids))
+        buckets = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        parts = [part for bucket in buckets for part in self._lists[bucket]]
+        # 覆寫的點會重複出現在 bucket 中
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def _sparse_arrays(vector: Optional[models.SparseVector]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    if vector is None:
+        return None
+    return np.asarray(vector.indices, dtype=np.int64), np.asarray(vector.values, dtype=np.float32)
+
+
+class _Collection:
+    """單一集合的向量（記憶體映射的 float32）、稀疏向量、id 與 payload"""
+
+    def __init__(self, path: Path, vector_size: int, distance: Distance, index: Optional[IVFIndex] = None):
+        self.path = path
+        self.vector_size = vector_size
+        self.distance = distance
+        self.index = index
+        self.ids: List[str] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        self.sparse: List[Optional[Tuple[np.ndarray, np.ndarray]]] = []
+        self.sparse_count = 0
+        self.lock = threading.RLock()
+        self._columns: Dict[str, List[List[Any]]] = {}
+        # term -> (rows, weights)，第一次稀疏搜尋時建立，新增後重建
+        self._postings: Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]] = None
+        self._load_points()
+        self.capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self._ensure_capacity(max(len(self.ids), MIN_CAPACITY))
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def points_path(self) -> Path:
+        return self.path / "points.jsonl"
+
+    @classmethod
+    def create(cls, path: Path, vector_size: int, distance: Distance, index: Optional[IVFIndex]) -> "_Collection":
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"vector_size": vector_size, "distance": distance.value}, f)
+        return cls(path, vector_size, distance, index)
+
+    @classmethod
+    def open(cls, path: Path, index: Optional[IVFIndex]) -> "_Collection":
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(path, meta["vector_size"], Distance(meta["distance"]), index)
+
+    def _load_points(self) -> None:
+        if not self.points_path.exists():
+            return
+        with open(self.points_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 寫入中斷的最後一行
+                    logger.warning(f"Skipping truncated record in {self.points_path}")
+                    continue
+                row = record["row"]
+                sparse = record.get("sparse")
+                if sparse is not None:
+                    sparse = (np.asarray(sparse["indices"], dtype=np.int64), np.asarray(sparse["values"], dtype=np.float32))
+                if row == len(self.ids):
+                    self.ids.append(record["id"])
+                    self.payloads.append(record["payload"])
+                    self.sparse.append(None)
+                    self.rows[record["id"]] = row
+                else:
+                    self.payloads[row] = record["payload"]
+                self._set_sparse(row, sparse)
+
+    def _set_sparse(self, row: int, sparse: Optional[Tuple[np.ndarray, np.ndarray]]) -> None:
+        self.sparse_count += (sparse is not None) - (self.sparse[row] is not None)
+        self.sparse[row] = sparse
+
+    def _ensure_capacity(self, size: int) -> None:
+        if size <= self.capacity:
+            return
+        capacity = max(size, self.capacity * 2, MIN_CAPACITY)
+        if self.vectors is not None:
+            self.vectors.flush()
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.vector_size * 4)
+        # 舊的 memmap 仍可能被進行中的搜尋使用，不主動關閉
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.vector_size))
+        self.capacity = capacity
+
+    def prepare_vectors(self, vectors: Any) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if vectors.shape[1] != self.vector_size:
+            raise ValueError(f"Vector size {vectors.shape[1]} does not match collection size {self.vector_size}")
+        if self.distance == Distance.COSINE:
+            # 寫入時正規化，搜尋時的 cosine 相似度就是內積
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return vectors
+
+    def add(
+        self,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        sparse_vectors: Optional[List[models.SparseVector]] = None
+    ) -> None:
+        vectors = self.prepare_vectors(vectors)
+        if sparse_vectors is None:
+            sparse_vectors = [None] * len(ids)
+        with self.lock:
+            rows = []
+            records = []
+            for point_id, payload, sparse_vector in zip(ids, payloads, sparse_vectors):
+                point_id = str(point_id)
+                sparse = _sparse_arrays(sparse_vector)
+                row = self.rows.get(point_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.ids.append(point_id)
+                    self.payloads.append(payload)
+                    self.sparse.append(None)
+                    self.rows[point_id] = row
+                else:
+                    self.payloads[row] = payload
+                self._set_sparse(row, sparse)
+                rows.append(row)
+                record = {"row": row, "id": point_id, "payload": payload}
+                if sparse_vector is not None:
+                    record["sparse"] = {"indices": list(sparse_vector.indices), "values": list(sparse_vector.values)}
+                records.append(json.dumps(record, ensure_ascii=False, default=str))
+            self._ensure_capacity(len(self.ids))
+            self.vectors[rows] = vectors
+            self.vectors.flush()
+            with open(self.points_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(records) + "\n")
+            self._columns = {}
+            self._postings = None
+            if self.index is not None and self.index.trained:
+                self.index.add(np.asarray(rows), vectors)
+
+    def column(self, key: str, size: int) -> List[List[Any]]:
+        """前 size 個資料點中 payload 欄位攤平後的值（快取至下次新增為止）"""
+        with self.lock:
+            columns = self._columns
+            values = columns.get(key)
+            if values is None or len(values) < size:
+                values = [payload_values(payload, key) for payload in self.payloads]
+                columns[key] = values
+        return values[:size] if len(values) > size else values
+
+    def _candidates(
+        self, query: np.ndarray, size: int, vectors: np.ndarray, min_points: Optional[int]
+    ) -> Optional[np.ndarray]:
+        index = self.index
+        # min_points 為 None 時強制精確搜尋
+        if index is None or min_points is None or size < min_points:
+            return None
+        with self.lock:
+            # 集合大小超過上次訓練的兩倍時重新訓練
+            if not index.trained or size > 2 * index.trained_size:
+                logger.info(f"Training IVF index of {self.path.name} on {size} vectors")
+                index.train(vectors)
+            return index.candidates(query)
+
+    def _mask(self, query_filter: Optional[models.Filter], ids: List[str], size: int) -> Optional[np.ndarray]:
+        if query_filter is None:
+            return None
+        return _FilterEvaluator(ids, lambda key: self.column(key, size)).mask(query_filter)
+
+    def postings(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """稀疏向量的倒排列表：詞 → (列, 權重)，新增資料後重建"""
+        with self.lock:
+            postings = self._postings
+            if postings is None:
+                terms: Dict[int, Tuple[List[np.ndarray], List[np.ndarray]]] = {}
+                for row, sparse in enumerate(self.sparse):
+                    if sparse is None:
+                        continue
+                    for term, weight in zip(sparse[0].tolist(), sparse[1]):
+                        entry = terms.setdefault(term, ([], []))
+                        entry[0].append(row)
+                        entry[1].append(weight)
+                postings = {
+                    term: (np.asarray(rows, dtype=np.int64), np.asarray(weights, dtype=np.float32))
+                    for term, (rows, weights) in terms.items()
+                }
+                self._postings = postings
+        return postings
+
+    def sparse_search(
+        self,
+        sparse_vector: models.SparseVector,
+        limit: int,
+        query_filter: Optional[models.Filter]
+    ) -> List[Dict[str, Any]]:
+        """在倒排列表上進行 BM25 搜尋（與 Qdrant 的 IDF modifier 相同，於搜尋時套用 IDF）"""
+        postings = self.postings()
+        with self.lock:
+            size = self.count
+            ids = self.ids[:size]
+            payloads = self.payloads[:size]
+            document_count = self.sparse_count
+        if document_count == 0:
+            return []
+
+        scores = np.zeros(size, dtype=np.float32)
+        for term, query_weight in zip(sparse_vector.indices, sparse_vector.values):
+            posting = postings.get(term)
+            if posting is None:
+                continue
+            rows, weights = posting
+            if len(rows) and rows[-1] >= size:
+                keep = rows < size
+                rows, weights = rows[keep], weights[keep]
+            if len(rows) == 0:
+                continue
+            scores[rows] += bm25_idf(len(rows), document_count) * query_weight * weights
+        mask = self._mask(query_filter, ids, size)
+        if mask is not None:
+            scores[~mask] = 0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) == 0:
+            return []
+        k = min(limit, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{"id": ids[row], "score": float(scores[row]), "payload": payloads[row]} for row in top]
+
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int,
+        score_threshold: Optional[float],
+        query_filter: Optional[models.Filter],
+        ivf_min_points: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        query = self.prepare_vectors(query_vector)[0]
+        with self.lock:
+            size = self.count
+            vectors = self.vectors[:size]
+            ids = self.ids[:size]
+            payloads = self.payloads[:size]
+        if size == 0:
+            return []
+
+        mask = self._mask(query_filter, ids, size)
+        candidates = self._candidates(query, size, vectors, ivf_min_points)
+        if candidates is not None:
+            candidates = candidates[candidates < size]
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            # 探測的 bucket 中（符合條件的）點不足時改為精確搜尋
+            if len(candidates) < limit:
+                candidates = None
+        if candidates is None and mask is not None:
+            candidates = np.flatnonzero(mask)
+
+        subset = vectors if candidates is None else vectors[candidates]
+        if len(subset) == 0:
+            return []
+        if self.distance == Distance.EUCLID:
+            scores = np.linalg.norm(subset - query, axis=1)
+            order_scores = -scores
+        else:
+            scores = subset @ query
+            order_scores = scores
+        k = min(limit, len(subset))
+        top = np.argpartition(-order_scores, k - 1)[:k]
+        top = top[np.argsort(-order_scores[top], kind="stable")]
+
+        results = []
+        for position in top:
+            score = float(scores[position])
+            if score_threshold is not None:
+                if self.distance == Distance.EUCLID and score > score_threshold:
+                    continue
+                if self.distance != Distance.EUCLID and score < score_threshold:
+                    continue
+            row = int(position if candidates is None else candidates[position])
+            results.append({"id": ids[row], "score": score, "payload": payloads[row]})
+        return results
+
+    def info(self) -> Dict[str, Any]:
+        index = self.index
+        return {
+            "status": "green",
+            "points_count": self.count,
+            "vectors_count": self.count,
+            "config": {
+                "vector_size": self.vector_size,
+                "distance": self.distance.value,
+                "path": str(self.path)
+            },
+            "sparse_vectors_count": self.sparse_count,
+            "index": {
+                "type": "ivf",
+                "trained": index.trained,
+                "nlist": len(index.centroids) if index.trained else index.nlist,
+                "nprobe": index.nprobe
+            } if index is not None else None
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.vectors = None
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(
+        self,
+        path: str = "vector_store",
+        vector_size: int = 1024,
+        distance: Distance = Distance.COSINE,
+        index: Optional[str] = None,
+        ivf_nlist: Optional[int] = None,
+        ivf_nprobe: int = 8,
+        ivf_min_points: int = 20000
+    ):
+        """
+        初始化嵌入於程序內的向量儲存
+
+        每個集合是一個目錄，向量存為記憶體映射的 float32 陣列，id 與 payload
+        存為只附加寫入的 JSON lines 檔。餘弦距離的向量在寫入時正規化，搜尋只
+        需對（過濾後的）向量做一次向量化的矩陣-向量乘法。index="ivf" 時，向量
+        數達 ivf_min_points 的集合以 IVF 索引搜尋，索引在第一次搜尋時於記憶體中
+        訓練，集合大小加倍後重新訓練。稀疏向量與資料點一起保存，以記憶體中的
+        倒排列表搜尋，因此每個集合都支援稀疏與混合搜尋。
+
+        Args:
+            path (str): 集合所在的目錄
+            vector_size (int): 預設向量維度
+            distance (Distance): 預設距離度量（COSINE、DOT 或 EUCLID）
+            index (Optional[str]): None 表示精確搜尋，或 "ivf"
+            ivf_nlist (Optional[int]): IVF 桶數，預設為集合大小的平方根
+            ivf_nprobe (int): 每次查詢掃描的 IVF 桶數
+            ivf_min_points (int): 開始使用 IVF 索引的集合大小
+        """
+        if index is not None and index not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index}")
+        self.path = Path(path)
+        self.vector_size = vector_size
+        self.distance = distance
+        self.index = index
+        self.ivf_nlist = ivf_nlist
+        self.ivf_nprobe = ivf_nprobe
+        self.ivf_min_points = ivf_min_points
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        """
+        建立儲存目錄
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._started = True
+
+    def _require_started(self) -> None:
+        if not self._started:
+            raise RuntimeError("Local vector store not initialized. Call start() first.")
+
+    def _collection_path(self, collection_name: str) -> Path:
+        if not COLLECTION_NAME_PATTERN.match(collection_name):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        return self.path / collection_name
+
+    def _new_index(self, distance: Distance) -> Optional[IVFIndex]:
+        if self.index is None:
+            return None
+        return IVFIndex(self.ivf_nlist, self.ivf_nprobe, euclid=distance == Distance.EUCLID)
+
+    def _get(self, collection_name: str) -> _Collection:
+        self._require_started()
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                path = self._collection_path(collection_name)
+                if not (path / "meta.json").exists():
+                    raise ValueError(f"Collection {collection_name} not found")
+                collection = _Collection.open(path, None)
+                collection.index = self._new_index(collection.distance)
+                self._collections[collection_name] = collection
+            return collection
+
+    def create_collection(
+        self,
+        collection_name: str,
+        vector_size: Optional[int] = None,
+        distance: Optional[Distance] = None,
+        sparse: bool = False,
+        quantization: Optional[str] = None,
+        on_disk: bool = False,
+        on_disk_payload: Optional[bool] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None
+    ) -> None:
+        """
+        建立新集合
+
+        sparse、on_disk、on_disk_payload 與 HNSW 參數只為與 QdrantHandler 相容而
+        接受：本地集合一律保存傳入的稀疏向量，向量一律由磁碟記憶體映射，索引為
+        精確搜尋或 IVF。
+
+        Args:
+            collection_name (str): 集合名稱
+            vector_size (Optional[int]): 向量維度，未指定時使用預設值
+            distance (Optional[Distance]): 距離度量，未指定時使用預設值
+            quantization (Optional[str]): 必須為 None，本地儲存不量化向量
+        """
+        self._require_started()
+        if quantization is not None:
+            raise ValueError("Vector quantization is not supported by the local store")
+        distance = distance or self.distance
+        if distance not in (Distance.COSINE, Distance.DOT, Distance.EUCLID):
+            raise ValueError(f"Unsupported distance for the local store: {distance}")
+        path = self._collection_path(collection_name)
+        with self._lock:
+            if collection_name in self._collections or (path / "meta.json").exists():
+                return
+            self._collections[collection_name] = _Collection.create(
+                path, vector_size or self.vector_size, distance, self._new_index(distance)
+            )
+
+    def add(
+        self,
+        collection_name: str,
+        vectors: Union[List[List[float]], np.ndarray],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        skip_existing: bool = False,
+        sparse_vectors: Optional[List[models.SparseVector]] = None
+    ) -> None:
+        """
+        將向量與相關資料加入集合
+
+        id 已存在的資料點就地覆寫。batch_size、parallel 與 wait 只為與
+        QdrantHandler 相容而接受，回傳前寫入一律已完成。
+
+        Args:
+            collection_name (str): 集合名稱
+            vectors (Union[List[List[float]], np.ndarray]): 向量列表
+            payloads (List[Dict[str, Any]]): 相關資料列表
+            ids (Optional[List[str]]): id 列表，未提供時依內容雜湊產生
+            skip_existing (bool): 不重寫 id 已存在的資料點
+            sparse_vectors (Optional[List[models.SparseVector]]): BM25 稀疏向量（SparseEncoder.encode_documents）
+        """
+        collection = self._get(collection_name)
+        ids, vectors, payloads = prepare_points(vectors, payloads, ids)
+        all_ids = ids
+        if skip_existing:
+            existing = self.existing_ids(collection_name, ids)
+            if existing:
+                ids, vectors, payloads = drop_existing_points(ids, vectors, payloads, existing)
+        sparse_vectors = align_sparse_vectors(all_ids, sparse_vectors, ids)
+        if ids:
+            collection.add(ids, vectors, payloads, sparse_vectors)
+
+    def flush(self) -> List[Any]:
+        """
+        寫入為同步操作，沒有尚未完成的寫入
+        """
+        return []
+
+    def existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """
+        回傳 ids 中已存在於集合的部分
+
+        Args:
+            collection_name (str): 集合名稱
+            ids (List[str]): 候選資料點 id
+
+        Returns:
+            Set[str]: 已存在的 id
+        """
+        rows = self._get(collection_name).rows
+        return {str(point_id) for point_id in ids if str(point_id) in rows}
+
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        payload_filter: Optional[Dict[str, Any]] = None,
+        filter_conditions: Optional[List[Dict[str, Any]]] = None,
+        filter_type: str = "must",
+        sparse_vector: Optional[models.SparseVector] = None,
+        mode: str = "dense",
+        prefetch_limit: Optional[int] = None,
+        filter_expression: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        搜尋最相似的向量
+
+        分數與 Qdrant 相同：餘弦相似度或內積（越高越好），或歐氏距離（越低越好，
+        score_threshold 為上限）；sparse 模式為 BM25 分數，hybrid 模式為 RRF 分數，
+        此時 score_threshold 只套用於稠密搜尋。集合沒有稀疏向量時，sparse 與
+        hybrid 模式退回稠密搜尋。
+
+        Args:
+            collection_name (str): 集合名稱
+            query_vector (List[float]): 查詢向量
+            limit (int): 結果數量
+            score_threshold (Optional[float]): 相似度門檻
+            payload_filter (Optional[Dict[str, Any]]): payload 欄位的簡單過濾條件
+            filter_conditions (Optional[List[Dict[str, Any]]]): 複雜過濾條件列表
+            filter_type (str): 過濾條件的組合方式（"must"、"should"、"must_not"）
+            sparse_vector (Optional[models.SparseVector]): 稀疏查詢向量（SparseEncoder.encode_query）
+            mode (str): "dense"、"sparse"（僅 BM25）或 "hybrid"（稠密與 BM25 以 RRF 融合）
+            prefetch_limit (Optional[int]): 融合前每個搜尋取得的候選數
+            filter_expression (Optional[Dict[str, Any]]): 巢狀過濾運算式（見 FilterCompiler），與其他過濾參數以 "and" 組合
+            search_params (Optional[Dict[str, Any]]): {"exact": True} 時不使用 IVF 索引；其他 Qdrant 搜尋參數會被接受並忽略
+
+        Returns:
+            List[Dict[str, Any]]: 搜尋結果列表
+        """
+        validate_mode(mode, sparse_vector)
+        params = build_search_params(search_params)
+        ivf_min_points = None if params is not None and params.exact else self.ivf_min_points
+        collection = self._get(collection_name)
+        query_filter = build_filter(payload_filter, filter_conditions, filter_type, filter_expression)
+        if mode != "dense" and collection.sparse_count == 0:
+            # 與 QdrantHandler 相同，沒有稀疏向量的集合改用 dense 搜尋
+            mode = "dense"
+        if mode == "sparse":
+            return collection.sparse_search(sparse_vector, limit, query_filter)
+        if mode == "dense":
+            return collection.search(query_vector, limit, score_threshold, query_filter, ivf_min_points)
+        prefetch_limit = prefetch_limit or limit * 4
+        return reciprocal_rank_fusion([
+            collection.search(query_vector, prefetch_limit, score_threshold, query_filter, ivf_min_points),
+            collection.sparse_search(sparse_vector, prefetch_limit, query_filter)
+        ], limit)
+
+    def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        執行多個搜尋
+
+        程序內沒有可省下的往返，搜尋依序執行；所有搜尋會先驗證，有錯誤的項目
+        在任何搜尋執行前就讓整批失敗。
+
+        Args:
+            searches (List[Dict[str, Any]]): search() 的關鍵字參數，每項都含 collection_name
+
+        Returns:
+            List[List[Dict[str, Any]]]: 各搜尋的結果，依請求順序排列
+        """
+        group_searches(searches)
+        return [self.search(search["collection_name"], **search_arguments(search)) for search in searches]
+
+    def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+        """
+        管理集合操作
+
+        Args:
+            action (str): 操作類型（'delete'、'get_info'），不支援 'update'
+            collection_name (str): 集合名稱
+
+        Returns:
+            Any: 操作結果
+        """
+        if action == "delete":
+            self._require_started()
+            path = self._collection_path(collection_name)
+            with self._lock:
+                collection = self._collections.pop(collection_name, None)
+                if collection is not None:
+                    collection.close()
+                if not path.exists():
+                    return False
+                shutil.rmtree(path)
+            return True
+        elif action == "get_info":
+            return self._get(collection_name).info()
+        elif action == "update":
+            raise ValueError("Collection update is not supported by the local store")
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+    def list_collections(self) -> List[str]:
+        """
+        列出所有可用的集合
+
+        Returns:
+            List[str]: 集合名稱列表
+        """
+        self._require_started()
+        return sorted(path.parent.name for path in self.path.glob("*/meta.json"))
+
+    def close(self) -> None:
+        """
+        將記憶體映射的向量寫回磁碟
+        """
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+        self._started = False
+
+
+class AsyncLocalVectorStore(AsyncVectorStore):
+    def __init__(self, **kwargs):
+        """
+        初始化 LocalVectorStore 的非同步包裝
+
+        呼叫在工作執行緒中執行，搜尋大型集合時不會阻塞事件迴圈。開啟後
+        client 為底層的 LocalVectorStore。
+
+        Args:
+            **kwargs: LocalVectorStore 的參數
+        """
+        self.store = LocalVectorStore(**kwargs)
+        self.client: Optional[LocalVectorStore] = None
+        self._pending: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """
+        開啟儲存（已開啟時不做任何事）
+        """
+        if self.client is None:
+            await asyncio.to_thread(self.store.start)
+            self.client = self.store
+
+    async def close(self) -> None:
+        """
+        等待尚未完成的寫入並關閉儲存
+        """
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self.store.close)
+            self.client = None
+
+    def _require_client(self) -> LocalVectorStore:
+        if not self.client:
+            raise RuntimeError("Local vector store not initialized. Call start() first.")
+        return self.client
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        vector_size: Optional[int] = None,
+        distance: Optional[Distance] = None,
+        sparse: bool = False,
+        quantization: Optional[str] = None,
+        on_disk: bool = False,
+        on_disk_payload: Optional[bool] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None
+    ) -> None:
+        await asyncio.to_thread(
+            self._require_client().create_collection,
+            collection_name,
+            vector_size,
+            distance,
+            sparse,
+            quantization,
+            on_disk,
+            on_disk_payload,
+            hnsw_m,
+            hnsw_ef_construct
+        )
+
+    async def add(
+        self,
+        collection_name: str,
+        vectors: Union[List[List[float]], np.ndarray],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        skip_existing: bool = False,
+        sparse_vectors: Optional[List[models.SparseVector]] = None
+    ) -> None:
+        """
+        將向量與相關資料加入集合；wait=False 時寫入在背景工作中執行，
+        以 flush() 等待完成
+        """
+        store = self._require_client()
+        write = asyncio.to_thread(
+            store.add, collection_name, vectors, payloads, ids,
+            skip_existing=skip_existing, sparse_vectors=sparse_vectors
+        )
+        if wait:
+            await write
+        else:
+            self._pending.append(asyncio.create_task(write))
+
+    async def flush(self) -> List[Any]:
+        """
+        等待所有以 wait=False 送出的寫入完成
+
+        Raises:
+            Exception: 尚未完成的寫入中第一個發生的錯誤
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return list(results)
+
+    async def existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        return await asyncio.to_thread(self._require_client().existing_ids, collection_name, ids)
+
+    async def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        payload_filter: Optional[Dict[str, Any]] = None,
+        filter_conditions: Optional[List[Dict[str, Any]]] = None,
+        filter_type: str = "must",
+        sparse_vector: Optional[models.SparseVector] = None,
+        mode: str = "dense",
+        prefetch_limit: Optional[int] = None,
+        filter_expression: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self._require_client().search,
+            collection_name,
+            query_vector,
+            limit,
+            score_threshold,
+            payload_filter,
+            filter_conditions,
+            filter_type,
+            sparse_vector,
+            mode,
+            prefetch_limit,
+            filter_expression,
+            search_params
+        )
+
+    async def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self._require_client().search_batch, searches)
+
+    async def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+        return await asyncio.to_thread(self._require_client().manage, action, collection_name, **kwargs)
+
+    async def list_collections(self) -> List[str]:
+        return await asyncio.to_thread(self._require_client().list_collections)
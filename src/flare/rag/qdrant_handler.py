@@ -1,51 +1,431 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+import logging
+import threading
+import uuid
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Distance, VectorParams
 import numpy as np
 
-class QdrantHandler:
+from .filters import CompiledFilter, PayloadIndexer, compile_filter
+from .sparse import SPARSE_VECTOR_NAME, validate_mode
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+FILTER_ARGUMENTS = ("payload_filter", "filter_conditions", "filter_type", "filter_expression")
+
+# 依內容產生資料點 id 的命名空間，不可變更
+POINT_ID_NAMESPACE = uuid.UUID("5b0e6f1c-4f5e-4a8e-9a43-5d0c2f3b7a11")
+
+
+def make_point_id(payload: Optional[Dict[str, Any]], vector: Optional[Sequence[float]] = None) -> str:
+    """
+    由資料點內容產生穩定的 id
+
+    相同的 payload 一律對應到相同的 id，重新匯入文件時會覆寫（或略過）既有的
+    資料點，而不會重複加入。
+
+    Args:
+        payload (Optional[Dict[str, Any]]): 資料點的 payload，以正規化的 JSON 形式雜湊
+        vector (Optional[Sequence[float]]): 向量，只在 payload 為空時雜湊
+
+    Returns:
+        str: 可作為 Qdrant 資料點 id 的 UUID 字串
+    """
+    if payload:
+        content = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    elif vector is not None:
+        content = np.asarray(vector, dtype=np.float32).tobytes().hex()
+    else:
+        raise ValueError("Either payload or vector is required to build a point id")
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, content))
+
+
+def prepare_points(
+    vectors: Union[List[List[float]], np.ndarray],
+    payloads: List[Dict[str, Any]],
+    ids: Optional[List[str]] = None
+) -> Tuple[List[str], List[List[float]], List[Dict[str, Any]]]:
+    """
+    驗證資料點並補上內容雜湊 id
+
+    Returns:
+        Tuple[List[str], List[List[float]], List[Dict[str, Any]]]: 以一般列表表示的 (ids, vectors, payloads)
+    """
+    if isinstance(vectors, np.ndarray):
+        vectors = vectors.tolist()
+    if len(vectors) != len(payloads):
+        raise ValueError("vectors and payloads must have the same length")
+    if ids is None:
+        ids = [make_point_id(payload, vector) for payload, vector in zip(payloads, vectors)]
+    elif len(ids) != len(vectors):
+        raise ValueError("ids and vectors must have the same length")
+    return list(ids), list(vectors), list(payloads)
+
+
+def drop_existing_points(
+    ids: List[str],
+    vectors: List[List[float]],
+    payloads: List[Dict[str, Any]],
+    existing: Set[str]
+) -> Tuple[List[str], List[List[float]], List[Dict[str, Any]]]:
+    """移除 id 在 existing 中的資料點"""
+    keep = [i for i, point_id in enumerate(ids) if point_id not in existing]
+    return [ids[i] for i in keep], [vectors[i] for i in keep], [payloads[i] for i in keep]
+
+
+def align_sparse_vectors(
+    all_ids: List[str],
+    sparse_vectors: Optional[List[models.SparseVector]],
+    kept_ids: List[str]
+) -> Optional[List[models.SparseVector]]:
+    """保留 drop_existing_points 後仍留下的資料點的稀疏向量"""
+    if sparse_vectors is None:
+        return None
+    if len(sparse_vectors) != len(all_ids):
+        raise ValueError("sparse_vectors and vectors must have the same length")
+    by_id = dict(zip(all_ids, sparse_vectors))
+    return [by_id[point_id] for point_id in kept_ids]
+
+
+def split_batches(
+    ids: List[str],
+    vectors: List[List[float]],
+    payloads: List[Dict[str, Any]],
+    batch_size: int,
+    sparse_vectors: Optional[List[models.SparseVector]] = None
+) -> List[models.Batch]:
+    """將資料點分割成每批最多 batch_size 個的 upsert 批次"""
+    batches = []
+    for start in range(0, len(ids), batch_size):
+        batch_vectors = vectors[start:start + batch_size]
+        if sparse_vectors is not None:
+            # 未命名的 dense 向量名稱為 ""
+            batch_vectors = {"": batch_vectors, SPARSE_VECTOR_NAME: sparse_vectors[start:start + batch_size]}
+        batches.append(models.Batch(
+            ids=ids[start:start + batch_size],
+            vectors=batch_vectors,
+            payloads=payloads[start:start + batch_size]
+        ))
+    return batches
+
+
+def sparse_vectors_config(sparse: bool) -> Optional[Dict[str, models.SparseVectorParams]]:
+    """集合的稀疏向量設定；Qdrant 於搜尋時套用 BM25 的 IDF"""
+    if not sparse:
+        return None
+    return {SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+
+
+def has_sparse_vectors(info: models.CollectionInfo) -> bool:
+    """集合建立時是否包含稀疏向量"""
+    return SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+
+
+QUANTIZATION_TYPES = ("scalar", "product", "binary")
+SEARCH_PARAM_KEYS = ("hnsw_ef", "exact", "rescore", "oversampling")
+
+
+def quantization_config(quantization: Optional[str]) -> Optional[models.QuantizationConfig]:
+    """
+    集合的量化設定
+
+    量化後的向量一律保留在記憶體中，搭配 on_disk 向量時只有壓縮後的副本常駐
+    記憶體，原始向量在重新計分時由磁碟讀取。
+    """
+    if quantization is None:
+        return None
+    if quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if quantization == "product":
+        return models.ProductQuantization(
+            product=models.ProductQuantizationConfig(compression=models.CompressionRatio.X16, always_ram=True)
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unsupported quantization: {quantization} (expected one of {', '.join(QUANTIZATION_TYPES)})")
+
+
+def collection_config(
+    vector_size: int,
+    distance: Distance,
+    sparse: bool = False,
+    quantization: Optional[str] = None,
+    on_disk: bool = False,
+    on_disk_payload: Optional[bool] = None,
+    hnsw_m: Optional[int] = None,
+    hnsw_ef_construct: Optional[int] = None
+) -> Dict[str, Any]:
+    """create_collection 的關鍵字參數（見 QdrantHandler.create_collection）"""
+    hnsw_config = None
+    if hnsw_m is not None or hnsw_ef_construct is not None:
+        hnsw_config = models.HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct)
+    return {
+        "vectors_config": VectorParams(size=vector_size, distance=distance, on_disk=on_disk or None),
+        "sparse_vectors_config": sparse_vectors_config(sparse),
+        "quantization_config": quantization_config(quantization),
+        "hnsw_config": hnsw_config,
+        "on_disk_payload": on_disk_payload
+    }
+
+
+def build_search_params(search_params: Optional[Dict[str, Any]]) -> Optional[models.SearchParams]:
+    """
+    由 search_params 參數建立 Qdrant 搜尋參數
+
+    Args:
+        search_params (Optional[Dict[str, Any]]): {"hnsw_ef": int, "exact": bool, "rescore": bool, "oversampling": float}，
+            皆為可選；rescore 與 oversampling 只影響量化的集合
+
+    Returns:
+        Optional[models.SearchParams]: 搜尋參數，未指定任何選項時為 None
+    """
+    if not search_params:
+        return None
+    unknown = set(search_params) - set(SEARCH_PARAM_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown search params: {', '.join(sorted(unknown))}")
+    quantization = None
+    if search_params.get("rescore") is not None or search_params.get("oversampling") is not None:
+        quantization = models.QuantizationSearchParams(
+            rescore=search_params.get("rescore"),
+            oversampling=search_params.get("oversampling")
+        )
+    return models.SearchParams(
+        hnsw_ef=search_params.get("hnsw_ef"),
+        exact=search_params.get("exact", False),
+        quantization=quantization
+    )
+
+
+def hybrid_query(
+    mode: str,
+    query_vector: List[float],
+    sparse_vector: Optional[models.SparseVector],
+    limit: int,
+    score_threshold: Optional[float],
+    query_filter: Optional[models.Filter],
+    prefetch_limit: Optional[int] = None,
+    params: Optional[models.SearchParams] = None
+) -> Dict[str, Any]:
+    """
+    稀疏或混合搜尋時 query_points 的參數
+
+    混合模式下稠密與稀疏搜尋以 prefetch 執行，再以 reciprocal rank fusion 融合。
+    score_threshold 只套用於稠密搜尋：BM25 與 RRF 分數與餘弦相似度不在同一尺度。
+
+    Args:
+        mode (str): "sparse" 或 "hybrid"
+        query_vector (List[float]): 稠密查詢向量
+        sparse_vector (Optional[models.SparseVector]): 稀疏查詢向量
+        limit (int): 結果數量
+        score_threshold (Optional[float]): 稠密搜尋的相似度門檻
+        query_filter (Optional[models.Filter]): 套用於每個搜尋的 payload 過濾條件
+        prefetch_limit (Optional[int]): 融合前每個搜尋取得的候選數
+        params (Optional[models.SearchParams]): 稠密搜尋的搜尋參數
+
+    Returns:
+        Dict[str, Any]: query_points 的關鍵字參數
+    """
+    if mode == "sparse":
+        return {"query": sparse_vector, "using": SPARSE_VECTOR_NAME, "limit": limit, "query_filter": query_filter}
+    prefetch_limit = prefetch_limit or limit * 4
+    return {
+        "prefetch": [
+            models.Prefetch(
+                query=query_vector, limit=prefetch_limit, filter=query_filter, score_threshold=score_threshold, params=params
+            ),
+            models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME, limit=prefetch_limit, filter=query_filter)
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "limit": limit
+    }
+
+
+def query_request(
+    query_vector: List[float],
+    limit: int = 10,
+    score_threshold: Optional[float] = None,
+    payload_filter: Optional[Dict[str, Any]] = None,
+    filter_conditions: Optional[List[Dict[str, Any]]] = None,
+    filter_type: str = "must",
+    sparse_vector: Optional[models.SparseVector] = None,
+    mode: str = "dense",
+    prefetch_limit: Optional[int] = None,
+    filter_expression: Optional[Dict[str, Any]] = None,
+    search_params: Optional[Dict[str, Any]] = None,
+    sparse: bool = False
+) -> models.QueryRequest:
+    """
+    query_batch_points 請求中的單一搜尋
+
+    參數與 search() 相同；sparse 表示集合是否有稀疏向量，沒有時所有模式都以
+    稠密搜尋執行。
+    """
+    query_filter = build_filter(payload_filter, filter_conditions, filter_type, filter_expression)
+    params = build_search_params(search_params)
+    if mode == "dense" or not sparse:
+        return models.QueryRequest(
+            query=query_vector,
+            filter=query_filter,
+            params=params,
+            score_threshold=score_threshold,
+            limit=limit,
+            with_payload=True
+        )
+    arguments = hybrid_query(
+        mode, query_vector, sparse_vector, limit, score_threshold, query_filter, prefetch_limit, params
+    )
+    arguments["filter"] = arguments.pop("query_filter", None)
+    return models.QueryRequest(**arguments, with_payload=True)
+
+
+def group_searches(searches: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    驗證批次中的搜尋，並依集合分組其位置
+
+    Args:
+        searches (List[Dict[str, Any]]): search() 的關鍵字參數，每項都含 collection_name
+
+    Returns:
+        Dict[str, List[int]]: 集合名稱 → 該集合的搜尋位置（依請求順序）
+    """
+    groups: Dict[str, List[int]] = {}
+    for position, search in enumerate(searches):
+        if "collection_name" not in search or "query_vector" not in search:
+            raise ValueError(f"Search {position} requires collection_name and query_vector")
+        validate_mode(search.get("mode", "dense"), search.get("sparse_vector"))
+        groups.setdefault(search["collection_name"], []).append(position)
+    return groups
+
+
+def search_arguments(search: Dict[str, Any]) -> Dict[str, Any]:
+    """批次項目中 search() 的關鍵字參數（不含集合名稱）"""
+    return {key: value for key, value in search.items() if key != "collection_name"}
+
+
+def filter_arguments(search: Dict[str, Any]) -> Dict[str, Any]:
+    """search() 呼叫或批次項目中的過濾參數，供 compile_filter 使用"""
+    return {key: search[key] for key in FILTER_ARGUMENTS if key in search}
+
+
+def missing_payload_indexes(
+    info: models.CollectionInfo,
+    fields: List[Tuple[str, models.PayloadSchemaType]]
+) -> List[Tuple[str, models.PayloadSchemaType]]:
+    """尚未建立 payload 索引的欄位（不會取代既有的索引）"""
+    indexed = info.payload_schema or {}
+    return [(field, schema) for field, schema in fields if field not in indexed]
+
+
+def build_filter(
+    payload_filter: Optional[Dict[str, Any]] = None,
+    filter_conditions: Optional[List[Dict[str, Any]]] = None,
+    filter_type: str = "must",
+    filter_expression: Optional[Dict[str, Any]] = None
+) -> Optional[models.Filter]:
+    """
+    由簡單與複雜的過濾條件建立 Qdrant 過濾器
+
+    編譯結果會被記憶，見 FilterCompiler。
+
+    Args:
+        payload_filter (Optional[Dict[str, Any]]): payload 欄位的簡單過濾條件
+        filter_conditions (Optional[List[Dict[str, Any]]]): 複雜過濾條件列表
+        filter_type (str): 過濾條件的組合方式（"must"、"should"、"must_not"）
+        filter_expression (Optional[Dict[str, Any]]): 巢狀過濾運算式，與其他條件以 "and" 組合
+
+    Returns:
+        Optional[models.Filter]: 過濾器，未指定任何條件時為 None
+    """
+    compiled = compile_filter(payload_filter, filter_conditions, filter_type, filter_expression)
+    return compiled.filter if compiled is not None else None
+
+
+def format_hits(hits: List[models.ScoredPoint]) -> List[Dict[str, Any]]:
+    """將計分後的資料點轉為一般的結果字典"""
+    return [
+        {
+            "id": hit.id,
+            "score": hit.score,
+            "payload": hit.payload
+        }
+        for hit in hits
+    ]
+
+
+class QdrantHandler(VectorStore):
     def __init__(
         self,
         host: str = "localhost",
         port: int = 6333,
         vector_size: int = 1024,
-        distance: Distance = Distance.COSINE
+        distance: Distance = Distance.COSINE,
+        upsert_batch_size: int = 256,
+        upsert_parallel: int = 4,
+        payload_indexer: Optional[PayloadIndexer] = None
     ):
         """
-        Initialize Qdrant handler
-        
+        初始化 Qdrant 處理器
+
         Args:
-            host: Qdrant server host address
-            port: Qdrant server port
-            vector_size: vector dimension
-            distance: distance metric
+            host (str): Qdrant 伺服器主機位址
+            port (int): Qdrant 伺服器埠號
+            vector_size (int): 向量維度
+            distance (Distance): 距離度量
+            upsert_batch_size (int): 每個 upsert 請求的資料點上限
+            upsert_parallel (int): 平行送出的 upsert 請求數
+            payload_indexer (Optional[PayloadIndexer]): 在經常被過濾的欄位上建立 payload 索引
         """
         self.host = host
         self.port = port
         self.vector_size = vector_size
         self.distance = distance
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_parallel = upsert_parallel
         self.client = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_workers = 0
+        self._pending: List[Future] = []
+        self._pending_lock = threading.Lock()
+        self._sparse_collections: Dict[str, bool] = {}
+        self.payload_indexer = payload_indexer
 
     def start(self) -> None:
-        """
-        Start Qdrant client
-        """
+        """啟動 Qdrant 客戶端"""
         self.client = QdrantClient(host=self.host, port=self.port)
 
     def create_collection(
         self,
         collection_name: str,
         vector_size: Optional[int] = None,
-        distance: Optional[Distance] = None
+        distance: Optional[Distance] = None,
+        sparse: bool = False,
+        quantization: Optional[str] = None,
+        on_disk: bool = False,
+        on_disk_payload: Optional[bool] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None
     ) -> None:
         """
-        Create a new collection
-        
+        建立新集合
+
         Args:
-            collection_name: name of the collection
-            vector_size: vector dimension (optional, uses default if not specified)
-            distance: distance metric (optional, uses default if not specified)
+            collection_name (str): 集合名稱
+            vector_size (Optional[int]): 向量維度，未指定時使用預設值
+            distance (Optional[Distance]): 距離度量，未指定時使用預設值
+            sparse (bool): 同時保存 BM25 稀疏向量，供稀疏與混合搜尋使用
+            quantization (Optional[str]): None、"scalar"（int8）、"product"（x16）或 "binary"（1 bit）；
+                量化後的向量保留在記憶體中
+            on_disk (bool): 原始向量保存在磁碟上（記憶體映射）
+            on_disk_payload (Optional[bool]): payload 保存在磁碟上（None 使用伺服器預設值）
+            hnsw_m (Optional[int]): HNSW 圖的連接數（None 使用伺服器預設值）
+            hnsw_ef_construct (Optional[int]): HNSW 建構時的候選列表大小（None 使用伺服器預設值）
         """
         if not self.client:
             raise RuntimeError("Qdrant client not initialized. Call start() first.")
@@ -56,42 +436,149 @@ class QdrantHandler:
         if collection_name not in collection_names:
             self.client.create_collection(
                 collection_name=collection_name,
-                vectors_config=VectorParams(
-                    size=vector_size or self.vector_size,
-                    distance=distance or self.distance
+                **collection_config(
+                    vector_size or self.vector_size, distance or self.distance, sparse,
+                    quantization, on_disk, on_disk_payload, hnsw_m, hnsw_ef_construct
                 )
             )
+            self._sparse_collections.pop(collection_name, None)
+
+    def has_sparse(self, collection_name: str) -> bool:
+        """集合是否保存稀疏向量（依集合快取）"""
+        if collection_name not in self._sparse_collections:
+            info = self.client.get_collection(collection_name=collection_name)
+            self._sparse_collections[collection_name] = has_sparse_vectors(info)
+        return self._sparse_collections[collection_name]
 
     def add(
         self,
         collection_name: str,
-        vectors: List[List[float]],
+        vectors: Union[List[List[float]], np.ndarray],
         payloads: List[Dict[str, Any]],
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        skip_existing: bool = False,
+        sparse_vectors: Optional[List[models.SparseVector]] = None
     ) -> None:
         """
-        Add vectors and related data to collection
-        
+        將向量與相關資料加入集合
+
+        大量資料會分割成每批最多 batch_size 個資料點並平行 upsert。集合建立時未
+        指定 sparse=True 時，稀疏向量會被捨棄。
+
         Args:
-            collection_name: name of the collection
-            vectors: list of vectors
-            payloads: list of related data
-            ids: optional list of IDs
+            collection_name (str): 集合名稱
+            vectors (Union[List[List[float]], np.ndarray]): 向量列表
+            payloads (List[Dict[str, Any]]): 相關資料列表
+            ids (Optional[List[str]]): id 列表，未提供時依內容雜湊產生
+            batch_size (Optional[int]): 每個 upsert 請求的資料點數，預設為 upsert_batch_size
+            parallel (Optional[int]): 平行請求數，預設為 upsert_parallel
+            wait (bool): 等待 upsert 完成；wait=False 時請求在背景送出，以 flush() 等待完成
+            skip_existing (bool): 不重新送出 id 已存在的資料點
+            sparse_vectors (Optional[List[models.SparseVector]]): BM25 稀疏向量（SparseEncoder.encode_documents）
         """
         if not self.client:
             raise RuntimeError("Qdrant client not initialized. Call start() first.")
         
-        if ids is None:
-            ids = [str(i) for i in range(len(vectors))]
-            
-        self.client.upsert(
+        ids, vectors, payloads = prepare_points(vectors, payloads, ids)
+        all_ids = ids
+        if skip_existing:
+            existing = self.existing_ids(collection_name, ids)
+            if existing:
+                ids, vectors, payloads = drop_existing_points(ids, vectors, payloads, existing)
+        if sparse_vectors is not None and not self.has_sparse(collection_name):
+            sparse_vectors = None
+        sparse_vectors = align_sparse_vectors(all_ids, sparse_vectors, ids)
+        if not ids:
+            return
+
+        batches = split_batches(ids, vectors, payloads, batch_size or self.upsert_batch_size, sparse_vectors)
+
+        if wait and len(batches) == 1:
+            self._upsert(collection_name, batches[0], True)
+            return
+
+        executor = self._get_executor(parallel)
+        futures = [executor.submit(self._upsert, collection_name, batch, wait) for batch in batches]
+        if not wait:
+            with self._pending_lock:
+                self._pending.extend(futures)
+            return
+        for future in futures:
+            future.result()
+
+    def _upsert(self, collection_name: str, batch: models.Batch, wait: bool) -> models.UpdateResult:
+        return self.client.upsert(collection_name=collection_name, points=batch, wait=wait)
+
+    def _get_executor(self, parallel: Optional[int] = None) -> ThreadPoolExecutor:
+        workers = parallel or self.upsert_parallel
+        if self._executor is None or self._executor_workers != workers:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qdrant-upsert")
+            self._executor_workers = workers
+        return self._executor
+
+    def flush(self) -> List[models.UpdateResult]:
+        """
+        等待所有以 wait=False 送出的 upsert 完成
+
+        Returns:
+            List[models.UpdateResult]: 尚未完成的 upsert 的更新結果
+
+        Raises:
+            Exception: 尚未完成的 upsert 中第一個發生的錯誤
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        results = []
+        error = None
+        for future in pending:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """
+        回傳 ids 中已存在於集合的部分
+
+        Args:
+            collection_name (str): 集合名稱
+            ids (List[str]): 候選資料點 id
+
+        Returns:
+            Set[str]: 已存在的 id
+        """
+        if not self.client:
+            raise RuntimeError("Qdrant client not initialized. Call start() first.")
+        if not ids:
+            return set()
+        records = self.client.retrieve(
             collection_name=collection_name,
-            points=models.Batch(
-                ids=ids,
-                vectors=vectors,
-                payloads=payloads
-            )
+            ids=ids,
+            with_payload=False,
+            with_vectors=False
         )
+        return {str(record.id) for record in records}
+
+    def close(self) -> None:
+        """送出尚未完成的 upsert 並釋放客戶端"""
+        try:
+            self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+                self._executor_workers = 0
+            if self.client is not None:
+                self.client.close()
+                self.client = None
 
     def search(
         self,
@@ -101,120 +588,141 @@ class QdrantHandler:
         score_threshold: Optional[float] = None,
         payload_filter: Optional[Dict[str, Any]] = None,
         filter_conditions: Optional[List[Dict[str, Any]]] = None,
-        filter_type: str = "must"
+        filter_type: str = "must",
+        sparse_vector: Optional[models.SparseVector] = None,
+        mode: str = "dense",
+        prefetch_limit: Optional[int] = None,
+        filter_expression: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
-        Search for most similar vectors
-        
+        搜尋最相似的向量
+
+        集合建立時沒有稀疏向量時，sparse 與 hybrid 模式退回稠密搜尋。
+
         Args:
-            collection_name: name of the collection
-            query_vector: query vector
-            limit: number of results
-            score_threshold: similarity threshold
-            payload_filter: simple filter conditions for payload fields (e.g. {"category": "news"})
-            filter_conditions: complex filter conditions list (e.g. [
+            collection_name (str): 集合名稱
+            query_vector (List[float]): 查詢向量
+            limit (int): 結果數量
+            score_threshold (Optional[float]): 相似度門檻
+            payload_filter (Optional[Dict[str, Any]]): payload 欄位的簡單過濾條件（例如 {"category": "news"}）
+            filter_conditions (Optional[List[Dict[str, Any]]]): 複雜過濾條件列表（例如 [
                 {"key": "category", "match": "news", "range": None},
                 {"key": "date", "match": None, "range": {"gte": "2024-01-01"}}
-            ])
-            filter_type: type of filter combination ("must", "should", "must_not")
-            
+            ]）
+            filter_type (str): 過濾條件的組合方式（"must"、"should"、"must_not"）
+            sparse_vector (Optional[models.SparseVector]): 稀疏查詢向量（SparseEncoder.encode_query）
+            mode (str): "dense"、"sparse"（僅 BM25）或 "hybrid"（稠密與 BM25 以 RRF 融合）
+            prefetch_limit (Optional[int]): 融合前每個搜尋取得的候選數
+            filter_expression (Optional[Dict[str, Any]]): 巢狀過濾運算式（見 FilterCompiler），與其他過濾參數以 "and" 組合
+            search_params (Optional[Dict[str, Any]]): 稠密搜尋選項（"hnsw_ef"、"exact"，量化的集合另有 "rescore" 與 "oversampling"）
+
         Returns:
-            list of search results
+            List[Dict[str, Any]]: 搜尋結果列表
         """
         if not self.client:
             raise RuntimeError("Qdrant client not initialized. Call start() first.")
+        validate_mode(mode, sparse_vector)
+        compiled = compile_filter(payload_filter, filter_conditions, filter_type, filter_expression)
+        self._index_filtered_fields(collection_name, compiled)
+        query_filter = compiled.filter if compiled is not None else None
+        params = build_search_params(search_params)
+        
+        if mode != "dense" and self.has_sparse(collection_name):
+            response = self.client.query_points(
+                collection_name=collection_name,
+                **hybrid_query(
+                    mode, query_vector, sparse_vector, limit, score_threshold, query_filter, prefetch_limit, params
+                )
+            )
+            return format_hits(response.points)
         
-        search_params = {}
+        search_kwargs = {}
         if score_threshold is not None:
-            search_params["score_threshold"] = score_threshold
+            search_kwargs["score_threshold"] = score_threshold
             
-        if payload_filter is not None or filter_conditions is not None:
-            conditions = []
-            
-            # 處理簡單的 payload_filter
-            if payload_filter is not None:
-                conditions.extend([
-                    models.FieldCondition(
-                        key=key,
-                        match=models.MatchValue(value=value)
-                    )
-                    for key, value in payload_filter.items()
-                ])
-            
-            # 處理複雜的 filter_conditions
-            if filter_conditions is not None:
-                for condition in filter_conditions:
-                    field_condition = None
-                    
-                    # 處理精確匹配
-                    if condition.get("match") is not None:
-                        field_condition = models.FieldCondition(
-                            key=condition["key"],
-                            match=models.MatchValue(value=condition["match"])
-                        )
-                    
-                    # 處理範圍查詢
-                    if condition.get("range") is not None:
-                        range_params = {}
-                        if "gte" in condition["range"]:
-                            range_params["gte"] = condition["range"]["gte"]
-                        if "lte" in condition["range"]:
-                            range_params["lte"] = condition["range"]["lte"]
-                        if "gt" in condition["range"]:
-                            range_params["gt"] = condition["range"]["gt"]
-                        if "lt" in condition["range"]:
-                            range_params["lt"] = condition["range"]["lt"]
-                            
-                        field_condition = models.FieldCondition(
-                            key=condition["key"],
-                            range=models.Range(**range_params)
-                        )
-                    
-                    if field_condition is not None:
-                        conditions.append(field_condition)
-            
-            # 根據 filter_type 建立對應的過濾器
-            if filter_type == "must":
-                search_params["query_filter"] = models.Filter(must=conditions)
-            elif filter_type == "should":
-                search_params["query_filter"] = models.Filter(should=conditions)
-            elif filter_type == "must_not":
-                search_params["query_filter"] = models.Filter(must_not=conditions)
-            else:
-                raise ValueError(f"Unsupported filter type: {filter_type}")
+        if query_filter is not None:
+            search_kwargs["query_filter"] = query_filter
+        
+        if params is not None:
+            search_kwargs["search_params"] = params
             
         results = self.client.search(
             collection_name=collection_name,
             query_vector=query_vector,
             limit=limit,
-            **search_params
+            **search_kwargs
         )
         
-        return [
-            {
-                "id": hit.id,
-                "score": hit.score,
-                "payload": hit.payload
-            }
-            for hit in results
-        ]
+        return format_hits(results)
 
-    def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+    def _index_filtered_fields(self, collection_name: str, compiled: Optional[CompiledFilter]) -> None:
+        """在達到 payload 索引門檻的欄位上建立 payload 索引"""
+        if self.payload_indexer is None:
+            return
+        due = self.payload_indexer.observe(collection_name, compiled)
+        if not due:
+            return
+        try:
+            info = self.client.get_collection(collection_name=collection_name)
+            for field, schema in missing_payload_indexes(info, due):
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field,
+                    field_schema=schema,
+                    wait=False
+                )
+                logger.info(f"Creating {schema.value} payload index on {collection_name}.{field}")
+        except Exception as e:
+            # 建立索引失敗不影響搜尋
+            logger.warning(f"Failed to create payload indexes on {collection_name}: {e}")
+
+    def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        執行多個搜尋，每個集合只送出一個 query_batch_points 請求
+
+        Args:
+            searches (List[Dict[str, Any]]): search() 的關鍵字參數，每項都含 collection_name，例如
+                [{"collection_name": "docs", "query_vector": [...], "limit": 5}]
+
+        Returns:
+            List[List[Dict[str, Any]]]: 各搜尋的結果，依請求順序排列
         """
-        Manage collection operations
+        if not self.client:
+            raise RuntimeError("Qdrant client not initialized. Call start() first.")
         
+        results: List[List[Dict[str, Any]]] = [[] for _ in searches]
+        for collection_name, positions in group_searches(searches).items():
+            for i in positions:
+                self._index_filtered_fields(collection_name, compile_filter(**filter_arguments(searches[i])))
+            sparse = any(searches[i].get("mode", "dense") != "dense" for i in positions) and self.has_sparse(collection_name)
+            responses = self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=[query_request(**search_arguments(searches[i]), sparse=sparse) for i in positions]
+            )
+            for position, response in zip(positions, responses):
+                results[position] = format_hits(response.points)
+        return results
+
+    def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+        """
+        管理集合操作
+
         Args:
-            action: operation type ('delete', 'update', 'get_info')
-            collection_name: name of the collection
-            **kwargs: operation related parameters
-            
+            action (str): 操作類型（'delete'、'update'、'get_info'）
+            collection_name (str): 集合名稱
+            **kwargs: 操作相關參數
+
         Returns:
-            operation result
+            Any: 操作結果
         """
         if not self.client:
             raise RuntimeError("Qdrant client not initialized. Call start() first.")
             
         if action == "delete":
+            self._sparse_collections.pop(collection_name, None)
+            if self.payload_indexer is not None:
+                self.payload_indexer.forget(collection_name)
             return self.client.delete_collection(collection_name=collection_name)
         elif action == "update":
             # Update collection configuration
@@ -229,10 +737,10 @@ class QdrantHandler:
 
     def list_collections(self) -> List[str]:
         """
-        List all available collections
-        
+        列出所有可用的集合
+
         Returns:
-            list of collection names
+            List[str]: 集合名稱列表
         """
         if not self.client:
             raise RuntimeError("Qdrant client not initialized. Call start() first.")
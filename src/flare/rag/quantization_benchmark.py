@@ -0,0 +1,200 @@
+"""
+集合儲存基準測試：比較各選項的 recall@k、延遲與記憶體用量
+
+每種儲存設定（量化、向量存放於磁碟、HNSW m 與 ef_construct）在 Qdrant 伺服器
+上各自建立一個集合，寫入相同的向量，再以每種搜尋設定（是否重新計分、
+oversampling 倍數）執行查詢。recall@k 以 numpy 計算的精確最近鄰為基準；記憶體
+由集合配置估算：原始向量（未存放於磁碟時）、量化副本與 HNSW 連結。Qdrant 的
+本地模式會忽略量化與 HNSW，因此需要伺服器。
+
+用法:
+    python -m flare.rag.quantization_benchmark --points 20000 --quantization none scalar product binary
+    python -m flare.rag.quantization_benchmark --vectors corpus.npy --queries queries.npy --on-disk --oversampling 1 2 4
+"""
+import argparse
+import json
+import logging
+import math
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from qdrant_client.http import models
+from qdrant_client.http.models import Distance
+
+from flare.rag.qdrant_handler import QdrantHandler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Qdrant 預設的 HNSW m
+DEFAULT_HNSW_M = 16
+
+
+def synthetic_vectors(count: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """在隨機中心周圍產生的正規化向量（比均勻雜訊更接近實際的嵌入向量）"""
+    rng = np.random.default_rng(seed)
+    centres = np.random.default_rng(0).normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.6 * rng.normal(size=(count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """每個查詢的精確 top-k 餘弦最近鄰的 id（列號）"""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    neighbours = []
+    for query in queries:
+        scores = normalized @ (query / np.linalg.norm(query))
+        neighbours.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+    return neighbours
+
+
+def estimated_ram_mb(count: int, dimension: int, quantization: Optional[str], on_disk: bool, hnsw_m: Optional[int]) -> float:
+    """向量、量化副本與 HNSW 連結佔用的記憶體（不含 payload）"""
+    original = 0 if on_disk else count * dimension * 4
+    quantized = {
+        None: 0,
+        "scalar": count * dimension,
+        "product": count * dimension * 4 / 16,
+        "binary": count * math.ceil(dimension / 8)
+    }[quantization]
+    # 第 0 層每個節點約 2m 個 4 bytes 的連結
+    links = count * 2 * (hnsw_m or DEFAULT_HNSW_M) * 4
+    return (original + quantized + links) / (1024 * 1024)
+
+
+def wait_until_indexed(handler: QdrantHandler, collection_name: str, timeout: float) -> models.CollectionInfo:
+    """等待 optimizer 完成建立索引與量化"""
+    deadline = time.monotonic() + timeout
+    while True:
+        info = handler.client.get_collection(collection_name=collection_name)
+        if info.status == models.CollectionStatus.GREEN or time.monotonic() > deadline:
+            return info
+        time.sleep(1)
+
+
+def run_configuration(
+    handler: QdrantHandler,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    k: int,
+    quantization: Optional[str],
+    on_disk: bool,
+    hnsw_m: Optional[int],
+    hnsw_ef_construct: Optional[int],
+    oversampling: List[float],
+    hnsw_ef: Optional[int],
+    index_timeout: float
+) -> List[Dict[str, Any]]:
+    """以一種儲存設定將向量寫入集合，並測量每種搜尋設定"""
+    name = f"bench_{quantization or 'none'}{'_disk' if on_disk else ''}"
+    handler.manage("delete", name)
+    handler.create_collection(
+        name,
+        vector_size=vectors.shape[1],
+        distance=Distance.COSINE,
+        quantization=quantization,
+        on_disk=on_disk,
+        hnsw_m=hnsw_m,
+        hnsw_ef_construct=hnsw_ef_construct
+    )
+    started_at = time.perf_counter()
+    handler.add(name, vectors, [{} for _ in range(len(vectors))], ids=list(range(len(vectors))))
+    info = wait_until_indexed(handler, name, index_timeout)
+    load_seconds = time.perf_counter() - started_at
+
+    settings = [{"rescore": None, "oversampling": None}]
+    if quantization is not None:
+        settings = [{"rescore": False, "oversampling": None}] + [
+            {"rescore": True, "oversampling": factor} for factor in oversampling
+        ]
+    results = []
+    for setting in settings:
+        search_params = {key: value for key, value in {**setting, "hnsw_ef": hnsw_ef}.items() if value is not None}
+        # 暖機一次，不列入統計
+        handler.search(name, queries[0].tolist(), limit=k, search_params=search_params)
+        latencies = []
+        recalls = []
+        for query, expected in zip(queries, truth):
+            started_at = time.perf_counter()
+            hits = handler.search(name, query.tolist(), limit=k, search_params=search_params)
+            latencies.append(time.perf_counter() - started_at)
+            recalls.append(len({int(hit["id"]) for hit in hits} & expected) / k)
+        latencies.sort()
+        results.append({
+            "collection": name,
+            "quantization": quantization or "none",
+            "on_disk": on_disk,
+            "rescore": setting["rescore"],
+            "oversampling": setting["oversampling"],
+            "recall": round(statistics.mean(recalls), 4),
+            "latency_p50_ms": round(1000 * statistics.median(latencies), 2),
+            "latency_p95_ms": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+            "est_ram_mb": round(estimated_ram_mb(len(vectors), vectors.shape[1], quantization, on_disk, hnsw_m), 1),
+            "indexed_vectors": info.indexed_vectors_count,
+            "load_seconds": round(load_seconds, 1)
+        })
+        logger.info(json.dumps(results[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較集合儲存選項的召回率、延遲與記憶體用量")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--vectors", default=None, help=".npy 語料向量（預設使用合成向量）")
+    parser.add_argument("--queries", default=None, help=".npy 查詢向量（預設使用合成向量）")
+    parser.add_argument("--points", type=int, default=20000, help="合成向量數量")
+    parser.add_argument("--dimension", type=int, default=1024, help="合成向量維度（bge-m3 為 1024）")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--quantization", nargs="+", default=["none", "scalar", "product", "binary"],
+                        choices=["none", "scalar", "product", "binary"])
+    parser.add_argument("--on-disk", action="store_true", help="另外以存放於磁碟的向量測試每種量化")
+    parser.add_argument("--oversampling", nargs="+", type=float, default=[1.0, 2.0, 4.0])
+    parser.add_argument("--hnsw-m", type=int, default=None)
+    parser.add_argument("--hnsw-ef-construct", type=int, default=None)
+    parser.add_argument("--hnsw-ef", type=int, default=None, help="搜尋時的 HNSW 候選列表大小")
+    parser.add_argument("--index-timeout", type=float, default=600, help="等待建立索引的秒數")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.points, args.dimension, clusters=64, seed=1)
+    if args.queries:
+        queries = np.load(args.queries).astype(np.float32)
+    else:
+        queries = synthetic_vectors(args.num_queries, vectors.shape[1], clusters=64, seed=2)
+    logger.info(f"Computing exact top-{args.k} of {len(queries)} queries over {len(vectors)} vectors")
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    handler = QdrantHandler(host=args.host, port=args.port, vector_size=vectors.shape[1])
+    handler.start()
+    results = []
+    try:
+        for quantization in args.quantization:
+            for on_disk in ([False, True] if args.on_disk else [False]):
+                results.extend(run_configuration(
+                    handler, vectors, queries, truth, args.k,
+                    None if quantization == "none" else quantization, on_disk,
+                    args.hnsw_m, args.hnsw_ef_construct, args.oversampling, args.hnsw_ef, args.index_timeout
+                ))
+    finally:
+        handler.close()
+
+    print(f"{'quantization':<14}{'on_disk':>8}{'rescore':>9}{'oversample':>12}{f'recall@{args.k}':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'est RAM MiB':>13}")
+    for result in results:
+        rescore = "-" if result["rescore"] is None else str(result["rescore"])
+        oversampling = "-" if result["oversampling"] is None else result["oversampling"]
+        print(
+            f"{result['quantization']:<14}{str(result['on_disk']):>8}{rescore:>9}{oversampling:>12}"
+            f"{result['recall']:>11}{result['latency_p50_ms']:>9}{result['latency_p95_ms']:>9}{result['est_ram_mb']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-base",
+        device: str = "cpu",
+        batch_size: int = 16,
+        max_length: int = 512,
+        max_cached_scores: int = 8192,
+        quantize: bool = False
+    ):
+        """
+        初始化以 cross-encoder 重排序搜尋結果的重排序器
+
+        查詢與每個候選段落一起輸入序列分類模型（bge-reranker 形式，輸出一個
+        相關性 logit）計分，比向量搜尋的 bi-encoder 相似度精確得多，但每個
+        (查詢, 段落) 組合都需要一次前向計算。組合依長度排序後分批計算以減少
+        padding，分數依 (查詢, 段落文字) 快取，重複或微調過的問題取回相同
+        候選時不需重新計分。
+
+        每次呼叫可指定延遲預算：未快取組合的估計耗時超過剩餘時間時略過重排序，
+        超過期限時在批次之間放棄。略過時依原搜尋順序回傳，呼叫端最多等待
+        預算加上一個批次的時間；放棄前已計分的組合仍會保留在快取中。
+
+        Args:
+            model_name (str): Hugging Face 模型名稱或本地路徑
+            device (str): 模型所在的 torch 裝置
+            batch_size (int): 每次前向計算的組合數
+            max_length (int): 每個 (查詢, 段落) 組合的 token 上限
+            max_cached_scores (int): 快取的組合分數數量上限
+            quantize (bool): 是否對 Linear 層做 int8 動態量化（僅限 CPU）
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.max_cached_scores = max_cached_scores
+        self.quantize = quantize
+        self.tokenizer = None
+        self.model = None
+        self._load_lock = threading.Lock()
+        # 同一時間只做一個前向計算，避免多個請求在 CPU 上互搶執行緒
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 每個 pair 的平均計算秒數（指數移動平均），用來估計是否趕得上期限
+        self._seconds_per_pair: Optional[float] = None
+        self.requests = 0
+        self.reranked = 0
+        self.skipped = 0
+        self.abandoned = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self) -> None:
+        """載入 tokenizer 與模型（已載入時不做任何事）"""
+        with self._load_lock:
+            if self.model is not None:
+                return
+            import torch
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+            started_at = time.perf_counter()
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+            model.eval()
+            if self.quantize and self.device == "cpu":
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.tokenizer = tokenizer
+            self.model = model.to(self.device)
+            logger.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - started_at:.1f}s")
+
+    def _key(self, query: str, text: str) -> str:
+        return hashlib.sha1(f"{query}\0{text}".encode("utf-8")).hexdigest()
+
+    def _forward(self, query: str, texts: List[str]) -> List[float]:
+        """每段文字與查詢的相關性，介於 0 與 1 之間"""
+        import torch
+
+        with self._model_lock:
+            inputs = self.tokenizer(
+                [query] * len(texts),
+                texts,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt"
+            ).to(self.device)
+            with torch.inference_mode():
+                logits = self.model(**inputs).logits.float()
+        if logits.shape[-1] == 1:
+            scores = torch.sigmoid(logits[:, 0])
+        else:
+            scores = torch.softmax(logits, dim=-1)[:, -1]
+        return scores.tolist()
+
+    def _estimate(self, pairs: int) -> float:
+        with self._lock:
+            return (self._seconds_per_pair or 0.0) * pairs
+
+    def score(self, query: str, texts: List[str], deadline: Optional[float] = None) -> Optional[List[float]]:
+        """
+        計算各段落與查詢的相關性分數
+
+        Args:
+            query (str): 查詢文字
+            texts (List[str]): 段落文字
+            deadline (Optional[float]): 放棄計分的期限（time.monotonic() 的值）
+
+        Returns:
+            Optional[List[float]]: 每段文字一個分數；期限內無法計算所有未快取的組合時為 None
+        """
+        scores: Dict[int, float] = {}
+        keys = [self._key(query, text) for text in texts]
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+            self.cache_hits += len(scores)
+            self.cache_misses += len(texts) - len(scores)
+        missing = [i for i in range(len(texts)) if i not in scores]
+        if missing and deadline is not None and time.monotonic() + self._estimate(len(missing)) > deadline:
+            with self._lock:
+                self.skipped += 1
+            return None
+        if missing:
+            self.load()
+        # 長度相近的段落放在同一批，減少 padding
+        missing.sort(key=lambda i: len(texts[i]))
+        for start in range(0, len(missing), self.batch_size):
+            if deadline is not None and time.monotonic() + self._estimate(min(self.batch_size, len(missing) - start)) > deadline:
+                with self._lock:
+                    self.abandoned += 1
+                return None
+            batch = missing[start:start + self.batch_size]
+            started_at = time.perf_counter()
+            batch_scores = self._forward(query, [texts[i] for i in batch])
+            per_pair = (time.perf_counter() - started_at) / len(batch)
+            with self._lock:
+                self._seconds_per_pair = per_pair if self._seconds_per_pair is None else 0.8 * self._seconds_per_pair + 0.2 * per_pair
+                self.pairs_scored += len(batch)
+                for i, value in zip(batch, batch_scores):
+                    scores[i] = value
+                    self._cache[keys[i]] = value
+                while len(self._cache) > self.max_cached_scores:
+                    self._cache.popitem(last=False)
+        return [scores[i] for i in range(len(texts))]
+
+    def rerank(
+        self,
+        query: str,
+        hits: List[Dict[str, Any]],
+        top_k: Optional[int] = None,
+        budget_seconds: Optional[float] = None,
+        deadline: Optional[float] = None,
+        min_score: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        依 cross-encoder 的相關性重新排序搜尋結果
+
+        Args:
+            query (str): 查詢文字
+            hits (List[Dict[str, Any]]): 搜尋結果（format_hits 的輸出），段落文字在 payload["text"]
+            top_k (Optional[int]): 保留的結果數
+            budget_seconds (Optional[float]): 本次呼叫可用的秒數
+            deadline (Optional[float]): 重排序必須結束的期限（time.monotonic() 的值，例如從請求開始時起算）；
+                與 budget_seconds 同時指定時取較早者
+            min_score (Optional[float]): 捨棄重排序分數低於此值的結果
+
+        Returns:
+            List[Dict[str, Any]]: 重排序後的結果，"score" 為 cross-encoder 分數，"retrieval_score" 為原搜尋分數；
+                預算不足以重排序時依原搜尋順序回傳前 top_k 筆。沒有文字的結果無法判斷，重排序時會被捨棄
+        """
+        with self._lock:
+            self.requests += 1
+        if budget_seconds is not None:
+            budget_deadline = time.monotonic() + budget_seconds
+            deadline = budget_deadline if deadline is None else min(deadline, budget_deadline)
+        candidates = [hit for hit in hits if (hit.get("payload") or {}).get("text")]
+        if not candidates:
+            return hits[:top_k]
+        scores = self.score(query, [hit["payload"]["text"] for hit in candidates], deadline)
+        if scores is None:
+            return hits[:top_k]
+        with self._lock:
+            self.reranked += 1
+        reranked = [
+            {**hit, "score": score, "retrieval_score": hit.get("score")}
+            for hit, score in zip(candidates, scores)
+            if min_score is None or score >= min_score
+        ]
+        reranked.sort(key=lambda hit: hit["score"], reverse=True)
+        return reranked[:top_k]
+
+    def stats(self) -> Dict[str, Any]:
+        """取得重排序與分數快取的統計"""
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "model_name": self.model_name,
+                "loaded": self.loaded,
+                "requests": self.requests,
+                "reranked": self.reranked,
+                "skipped": self.skipped,
+                "abandoned": self.abandoned,
+                "pairs_scored": self.pairs_scored,
+                "ms_per_pair": 1000 * self._seconds_per_pair if self._seconds_per_pair is not None else None,
+                "cached_scores": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0
+            }
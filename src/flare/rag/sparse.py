@@ -0,0 +1,159 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+import math
+import re
+import zlib
+from qdrant_client.http import models
+
+# 以 sparse=True 建立的 Qdrant 集合中稀疏向量的名稱
+SPARSE_VECTOR_NAME = "bm25"
+SEARCH_MODES = ("dense", "sparse", "hybrid")
+
+# 安全相關的完整詞彙：CVE 編號、IP（可含 CIDR 與連接埠）、登錄機碼路徑、
+# 以及含 . - _ 的識別字（版本號、檔名、雜湊值）
+TOKEN_PATTERN = re.compile(
+    r"CVE-\d{4}-\d{4,}"
+    r"|\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?(?::\d{1,5})?"
+    r"|HK(?:EY_[A-Z_]+|LM|CU|CR|U|CC)(?:\\[^\s\\\"']+)+"
+    r"|[A-Za-z0-9_]+(?:[.\-_:][A-Za-z0-9_]+)*",
+    re.IGNORECASE
+)
+CJK_PATTERN = re.compile(r"[㐀-鿿豈-﫿]+")
+PART_SPLIT_PATTERN = re.compile(r"[.\-_:\\/]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+def tokenize_terms(text: str) -> List[str]:
+    """
+    將文字切分為稀疏索引的詞
+
+    CVE 編號、IP、登錄機碼、檔名與版本等複合詞會整體保留（精確的識別碼可精確
+    比對），同時也拆成各部分（"openssl" 可比對到 "openssl-1.0.1g"）。沒有空白的
+    CJK 文字以字元二元組索引。
+
+    Args:
+        text (str): 要切分的文字
+
+    Returns:
+        List[str]: 轉為小寫的詞，依原順序排列，保留重複
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text):
+        token = match.group(0).lower()
+        parts = [part for part in PART_SPLIT_PATTERN.split(token) if part]
+        if len(parts) > 1:
+            terms.append(token)
+        terms.extend(part for part in parts if part not in STOPWORDS)
+    for match in CJK_PATTERN.finditer(text):
+        run = match.group(0)
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def term_index(term: str) -> int:
+    """詞的穩定稀疏維度（crc32，符合 Qdrant 的 uint32 索引範圍）"""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+class SparseEncoder:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_length: float = 256.0):
+        """
+        初始化以雜湊詞為維度的 BM25 稀疏向量編碼器
+
+        文件向量保存每個詞的 BM25 詞頻部分，文件長度以 avg_length 正規化。IDF 取決於
+        整個集合，因此在搜尋時套用：Qdrant 透過稀疏向量的 IDF modifier，本地儲存則由
+        其倒排列表計算。查詢向量中每個不重複的詞權重皆為 1。
+
+        Args:
+            k1 (float): 詞頻飽和參數
+            b (float): 文件長度正規化參數
+            avg_length (float): 每個文本塊預期的平均詞數
+        """
+        self.k1 = k1
+        self.b = b
+        self.avg_length = avg_length
+
+    def _vector(self, weights: Dict[int, float]) -> models.SparseVector:
+        indices = sorted(weights)
+        return models.SparseVector(indices=indices, values=[weights[index] for index in indices])
+
+    def encode_document(self, text: str) -> models.SparseVector:
+        """
+        取得文本塊的稀疏向量
+
+        Args:
+            text (str): 文本塊內容
+
+        Returns:
+            models.SparseVector: 稀疏向量（雜湊碰撞的權重相加）
+        """
+        terms = tokenize_terms(text)
+        norm = self.k1 * (1 - self.b + self.b * len(terms) / self.avg_length)
+        weights: Dict[int, float] = {}
+        for term, frequency in Counter(terms).items():
+            index = term_index(term)
+            weights[index] = weights.get(index, 0.0) + frequency * (self.k1 + 1) / (frequency + norm)
+        return self._vector(weights)
+
+    def encode_documents(self, texts: Iterable[str]) -> List[models.SparseVector]:
+        return [self.encode_document(text) for text in texts]
+
+    def encode_query(self, text: str) -> models.SparseVector:
+        """
+        取得查詢的稀疏向量
+
+        Args:
+            text (str): 查詢文字
+
+        Returns:
+            models.SparseVector: 每個不重複的詞權重皆為 1 的稀疏向量
+        """
+        return self._vector({term_index(term): 1.0 for term in tokenize_terms(text)})
+
+
+def bm25_idf(document_frequency: int, document_count: int) -> float:
+    """Qdrant 的 IDF modifier 所使用的 IDF"""
+    return math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    limit: int,
+    k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    以 reciprocal rank fusion 融合排序後的搜尋結果
+
+    每筆結果的分數為其出現的各列表中 1 / (k + 名次) 的總和，稠密與稀疏搜尋都排名
+    靠前的段落會排在前面，兩種搜尋無法比較的原始分數不會混用。
+
+    Args:
+        result_lists (List[List[Dict[str, Any]]]): 各搜尋排序後的結果（format_hits 的輸出）
+        limit (int): 融合後的結果數量
+        k (int): 名次的平滑常數
+
+    Returns:
+        List[Dict[str, Any]]: 融合後的結果，"score" 為 RRF 分數
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            key = str(hit["id"])
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {"id": hit["id"], "score": 0.0, "payload": hit["payload"]}
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:limit]
+
+
+def validate_mode(mode: str, sparse_vector: Optional[models.SparseVector]) -> None:
+    """檢查搜尋模式，且稀疏模式必須提供稀疏查詢向量"""
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unsupported search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})")
+    if mode != "dense" and sparse_vector is None:
+        raise ValueError(f"Search mode {mode} requires a sparse query vector")
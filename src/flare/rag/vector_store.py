@@ -0,0 +1,180 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set, Union
+
+import numpy as np
+from qdrant_client.http import models
+from qdrant_client.http.models import Distance
+
+
+class VectorStore(ABC):
+    """
+    向量儲存後端的介面
+
+    由 QdrantHandler（Qdrant 伺服器）與 LocalVectorStore（嵌入於程序內）實作。
+    搜尋結果為含 "id"、"score" 與 "payload" 的字典，過濾條件與 build_filter
+    相同（payload_filter / filter_conditions 以及由 FilterCompiler 編譯的巢狀
+    過濾運算式），稀疏向量由 SparseEncoder 產生。
+    """
+
+    @abstractmethod
+    def start(self) -> None:
+        """開啟後端"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """寫入尚未完成的資料並釋放後端"""
+
+    @abstractmethod
+    def create_collection(
+        self,
+        collection_name: str,
+        vector_size: Optional[int] = None,
+        distance: Optional[Distance] = None,
+        sparse: bool = False,
+        quantization: Optional[str] = None,
+        on_disk: bool = False,
+        on_disk_payload: Optional[bool] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None
+    ) -> None:
+        """集合不存在時建立集合，可選擇加入 BM25 稀疏向量與儲存選項"""
+
+    @abstractmethod
+    def add(
+        self,
+        collection_name: str,
+        vectors: Union[List[List[float]], np.ndarray],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        skip_existing: bool = False,
+        sparse_vectors: Optional[List[models.SparseVector]] = None
+    ) -> None:
+        """新增（或覆寫）資料點"""
+
+    @abstractmethod
+    def flush(self) -> List[Any]:
+        """等待以 wait=False 送出的寫入完成"""
+
+    @abstractmethod
+    def existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """回傳 ids 中已存在於集合的部分"""
+
+    @abstractmethod
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        payload_filter: Optional[Dict[str, Any]] = None,
+        filter_conditions: Optional[List[Dict[str, Any]]] = None,
+        filter_type: str = "must",
+        sparse_vector: Optional[models.SparseVector] = None,
+        mode: str = "dense",
+        prefetch_limit: Optional[int] = None,
+        filter_expression: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """搜尋最相似的向量（稠密、稀疏或混合）"""
+
+    @abstractmethod
+    def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """執行多個搜尋（search() 的參數加上 collection_name），結果依請求順序排列"""
+
+    @abstractmethod
+    def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+        """管理集合操作（'delete'、'update'、'get_info'）"""
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        """列出所有可用的集合"""
+
+
+class AsyncVectorStore(ABC):
+    """
+    向量儲存後端的非同步介面
+
+    由 AsyncQdrantHandler 與 AsyncLocalVectorStore 實作。await start() 之前
+    client 為 None。
+    """
+
+    client: Any = None
+
+    @abstractmethod
+    async def start(self) -> None:
+        """開啟後端（已開啟時不做任何事）"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """等待尚未完成的寫入並釋放後端"""
+
+    @abstractmethod
+    async def create_collection(
+        self,
+        collection_name: str,
+        vector_size: Optional[int] = None,
+        distance: Optional[Distance] = None,
+        sparse: bool = False,
+        quantization: Optional[str] = None,
+        on_disk: bool = False,
+        on_disk_payload: Optional[bool] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None
+    ) -> None:
+        """集合不存在時建立集合，可選擇加入 BM25 稀疏向量與儲存選項"""
+
+    @abstractmethod
+    async def add(
+        self,
+        collection_name: str,
+        vectors: Union[List[List[float]], np.ndarray],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        skip_existing: bool = False,
+        sparse_vectors: Optional[List[models.SparseVector]] = None
+    ) -> None:
+        """新增（或覆寫）資料點"""
+
+    @abstractmethod
+    async def flush(self) -> List[Any]:
+        """等待以 wait=False 送出的寫入完成"""
+
+    @abstractmethod
+    async def existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """回傳 ids 中已存在於集合的部分"""
+
+    @abstractmethod
+    async def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        payload_filter: Optional[Dict[str, Any]] = None,
+        filter_conditions: Optional[List[Dict[str, Any]]] = None,
+        filter_type: str = "must",
+        sparse_vector: Optional[models.SparseVector] = None,
+        mode: str = "dense",
+        prefetch_limit: Optional[int] = None,
+        filter_expression: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """搜尋最相似的向量（稠密、稀疏或混合）"""
+
+    @abstractmethod
+    async def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """執行多個搜尋（search() 的參數加上 collection_name），結果依請求順序排列"""
+
+    @abstractmethod
+    async def manage(self, action: str, collection_name: str, **kwargs) -> Any:
+        """管理集合操作（'delete'、'update'、'get_info'）"""
+
+    @abstractmethod
+    async def list_collections(self) -> List[str]:
+        """列出所有可用的集合"""
@@ -0,0 +1,207 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 可作為分塊邊界的位置：句末標點後的空白，或換行
+_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?。！？])\s|\n")
+# 無 tokenizer 時的近似切分：CJK 字元各自為一個 token，其餘依單字與標點切分
+_FALLBACK_TOKEN_PATTERN = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]|\w+|[^\w\s]"
+)
+
+Span = Tuple[int, int]
+
+
+class Chunk(NamedTuple):
+    """文本塊與其在原始文件中的位置"""
+    text: str
+    start: int
+    end: int
+    page: Optional[int]
+    token_count: int
+
+    def to_payload(self) -> Dict[str, Any]:
+        """
+        轉為寫入向量資料庫的 payload 欄位
+
+        text 刻意保留：上傳的暫存檔在匯入後即刪除，伺服器端沒有可由 start/end
+        定位的原文，而檢索結果、重排序、上下文組裝與 BM25 都直接讀取 payload
+        中的文字。start/end/page 為文本塊在原上傳文件中的字元位置與頁碼，
+        供持有原文件的用戶端標示來源。
+
+        Returns:
+            Dict[str, Any]: 含 text、start、end、page 的 payload
+        """
+        return {"text": self.text, "start": self.start, "end": self.end, "page": self.page}
+
+
+class RegexTokenizer:
+    """無法載入模型 tokenizer 時使用的近似 tokenizer"""
+
+    def token_spans(self, text: str) -> List[Span]:
+        return [match.span() for match in _FALLBACK_TOKEN_PATTERN.finditer(text)]
+
+
+class HuggingFaceTokenizer:
+    """包裝 Hugging Face fast tokenizer，只取每個 token 的字元位置"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def token_spans(self, text: str) -> List[Span]:
+        backend = getattr(self.tokenizer, "backend_tokenizer", None)
+        if backend is not None:
+            offsets = backend.encode(text, add_special_tokens=False).offsets
+        else:
+            offsets = self.tokenizer(
+                text, add_special_tokens=False, return_offsets_mapping=True
+            )["offset_mapping"]
+        return [(start, end) for start, end in offsets if end > start]
+
+
+@lru_cache(maxsize=8)
+def load_tokenizer(tokenizer_name: Optional[str]):
+    """
+    載入並快取 tokenizer，同一名稱在程序內只載入一次
+
+    Args:
+        tokenizer_name (Optional[str]): Hugging Face tokenizer 名稱，None 表示使用近似 tokenizer
+
+    Returns:
+        具有 token_spans(text) 方法的 tokenizer
+    """
+    if tokenizer_name is None:
+        return RegexTokenizer()
+    try:
+        from transformers import AutoTokenizer
+        return HuggingFaceTokenizer(AutoTokenizer.from_pretrained(tokenizer_name, use_fast=True))
+    except Exception as e:
+        logger.warning(f"無法載入 tokenizer {tokenizer_name}，改用近似 tokenizer: {str(e)}")
+        return RegexTokenizer()
+
+
+class TokenChunker:
+    """以 token 數決定大小、單次線性掃描的串流分塊器"""
+
+    def __init__(self,
+                 chunk_tokens: int = 512,
+                 chunk_overlap_tokens: int = 64,
+                 tokenizer_name: Optional[str] = None,
+                 min_chunk_ratio: float = 0.5):
+        """
+        初始化分塊器
+
+        每個塊最多 chunk_tokens 個 token，並盡量在視窗內最後一個句子或段落邊界
+        處結束；邊界太靠近開頭（少於 min_chunk_ratio 的視窗）時直接在 token
+        處切開。下一塊至少前進本塊長度的一半，重疊不會超過本塊的一半。
+
+        Args:
+            chunk_tokens (int): 每個文本塊的 token 上限
+            chunk_overlap_tokens (int): 相鄰文本塊重疊的 token 數
+            tokenizer_name (Optional[str]): tokenizer 名稱（已快取），None 表示使用近似 tokenizer
+            min_chunk_ratio (float): 在邊界處切分時文本塊至少要佔視窗的比例
+        """
+        if chunk_tokens <= 0:
+            raise ValueError("chunk_tokens 必須大於 0")
+        if not 0 <= chunk_overlap_tokens < chunk_tokens:
+            raise ValueError("chunk_overlap_tokens 必須介於 0 與 chunk_tokens 之間")
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.min_chunk_tokens = max(1, int(chunk_tokens * min_chunk_ratio))
+        self.tokenizer = load_tokenizer(tokenizer_name)
+
+    def iter_chunks(self, blocks: Iterable[Tuple[Optional[int], str]]) -> Iterator[Chunk]:
+        """
+        將 (頁碼, 文字) 串流切分成文本塊
+
+        位置以所有文字片段串接後的字元位置表示，與 DocumentHandler.read_file 的
+        結果一致。各文字片段分別進行 tokenize，緩衝區只保留尚未輸出的部分。
+
+        Args:
+            blocks (Iterable[Tuple[Optional[int], str]]): 依序的 (頁碼, 文字) 片段
+
+        Returns:
+            Iterator[Chunk]: 文本塊
+        """
+        buffer = ""
+        base = 0          # buffer[0] 的絕對位置
+        spans: List[Span] = []  # 尚未完全輸出的 token 絕對位置
+        head = 0          # 下一個文本塊的第一個 token 在 spans 中的索引
+        boundaries: List[int] = []
+        boundary_head = 0
+        pages: List[Tuple[int, Optional[int]]] = []
+        page_head = 0
+        offset = 0        # 下一個片段的絕對位置
+
+        def make_chunk(first: int, last: int) -> Chunk:
+            nonlocal page_head
+            start, end = spans[first][0], spans[last][1]
+            text = buffer[start - base:end - base]
+            while page_head + 1 < len(pages) and pages[page_head + 1][0] <= start:
+                page_head += 1
+            page = pages[page_head][1] if pages else None
+            return Chunk(text=text, start=start, end=end, page=page, token_count=last - first + 1)
+
+        def cut(first: int, final: bool) -> int:
+            """決定從 first 開始的文本塊最後一個 token 的索引"""
+            nonlocal boundary_head
+            last = min(first + self.chunk_tokens, len(spans)) - 1
+            if final and last == len(spans) - 1:
+                return last
+            limit = spans[last][1]
+            # 邊界位置單調遞增，指標只會往前移動
+            while boundary_head < len(boundaries) and boundaries[boundary_head] <= spans[first][0]:
+                boundary_head += 1
+            probe = boundary_head
+            best = None
+            while probe < len(boundaries) and boundaries[probe] <= limit:
+                best = boundaries[probe]
+                probe += 1
+            if best is None:
+                return last
+            candidate = last
+            while candidate > first and spans[candidate][1] > best:
+                candidate -= 1
+            if candidate - first + 1 >= self.min_chunk_tokens and spans[candidate][1] <= best:
+                return candidate
+            return last
+
+        def drain(final: bool) -> Iterator[Chunk]:
+            nonlocal head
+            while head < len(spans) and (final or len(spans) - head > self.chunk_tokens):
+                last = cut(head, final)
+                yield make_chunk(head, last)
+                if last == len(spans) - 1 and final:
+                    head = len(spans)
+                    break
+                length = last - head + 1
+                head = max(last + 1 - self.chunk_overlap_tokens, head + (length + 1) // 2)
+
+        for page, text in blocks:
+            if not text:
+                continue
+            if not pages or pages[-1][1] != page:
+                pages.append((offset, page))
+            buffer += text
+            spans.extend((offset + start, offset + end) for start, end in self.tokenizer.token_spans(text))
+            boundaries.extend(offset + match.end() for match in _BOUNDARY_PATTERN.finditer(text))
+            offset += len(text)
+
+            yield from drain(final=False)
+
+            # 捨棄已不需要的 token、邊界與文字，累積到一定量才壓縮以維持線性時間
+            if head > self.chunk_tokens and head * 2 > len(spans):
+                spans = spans[head:]
+                head = 0
+                boundaries = boundaries[boundary_head:]
+                boundary_head = 0
+                pages = pages[page_head:]
+                page_head = 0
+                keep_from = spans[0][0] if spans else offset
+                buffer = buffer[keep_from - base:]
+                base = keep_from
+
+        yield from drain(final=True)
@@ -1,23 +1,100 @@
 import os
-from typing import List, Optional, Dict, Any
+import time
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple, Union, TYPE_CHECKING
 from pathlib import Path
 from pypdf import PdfReader
 import docx
 import chardet
 
+if TYPE_CHECKING:
+    from .chunker import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+def spawn_context() -> multiprocessing.context.BaseContext:
+    """
+    抽取程序池使用的 spawn 啟動方式
+
+    伺服器程序中已有 torch/OpenMP、httpx 與 tokenizer 的執行緒，
+    以 fork 建立子程序可能造成死結，因此一律以 spawn 啟動。
+    """
+    return multiprocessing.get_context("spawn")
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[Tuple[int, str, float]]:
+    """
+    在子程序中抽取 PDF 的 [start, stop) 頁
+    
+    Returns:
+        List[Tuple[int, str, float]]: (頁碼, 文字, 抽取秒數)
+    """
+    pages = []
+    with open(file_path, 'rb') as f:
+        pdf_reader = PdfReader(f)
+        for index in range(start, stop):
+            began = time.perf_counter()
+            text = pdf_reader.pages[index].extract_text()
+            pages.append((index + 1, text + "\n", time.perf_counter() - began))
+    return pages
+
+
+def _extract_docx_text(file_path: str) -> str:
+    """在子程序中抽取整份 Word 文件"""
+    return "\n".join(paragraph.text for paragraph in docx.Document(file_path).paragraphs)
+
+
+def _read_file_serial(file_path: str, block_size: int, detect_bytes: int) -> str:
+    """在子程序中以序列模式讀取整份文件"""
+    return DocumentHandler(block_size=block_size, detect_bytes=detect_bytes).read_file(file_path)
+
+
 class DocumentHandler:
     """文件處理器，用於讀取和分塊處理各種格式的文件"""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self,
+                 chunk_size: int = 1000,
+                 chunk_overlap: int = 200,
+                 block_size: int = 1024 * 1024,
+                 detect_bytes: int = 64 * 1024,
+                 parallel: bool = False,
+                 max_workers: Optional[int] = None,
+                 min_parallel_pages: int = 32,
+                 pages_per_task: int = 8,
+                 executor: Optional[Executor] = None,
+                 tokenizer_name: Optional[str] = None):
         """
         初始化文件處理器
         
         Args:
-            chunk_size (int): 每個文本塊的大小（字符數）
-            chunk_overlap (int): 文本塊之間的重疊大小（字符數）
+            chunk_size (int): 每個文本塊的大小：iter_chunks（匯入管線與 /upload 使用）以 token 數計算，
+                split_into_chunks、iter_document 與 process_document 以字符數計算
+            chunk_overlap (int): 文本塊之間的重疊大小，單位與 chunk_size 相同
+            block_size (int): 串流讀取文本文件時每次讀取的字符數
+            detect_bytes (int): 偵測文本文件編碼時最多讀取的位元組數
+            parallel (bool): 是否以程序池平行抽取 PDF 頁面與 Word 文件
+            max_workers (Optional[int]): 程序池大小，預設為 CPU 核心數
+            min_parallel_pages (int): PDF 頁數少於此值時改用序列抽取，避免程序啟動成本大於收益
+            pages_per_task (int): 每個子程序工作負責的連續頁數
+            executor (Optional[Executor]): 共用的程序池；未提供時每份文件臨時建立
+            tokenizer_name (Optional[str]): iter_chunks 使用的 tokenizer，None 表示使用近似 tokenizer
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.block_size = block_size
+        self.detect_bytes = detect_bytes
+        self.parallel = parallel
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_parallel_pages = min_parallel_pages
+        self.pages_per_task = pages_per_task
+        self.executor = executor
+        self.tokenizer_name = tokenizer_name
+        # 最近一次抽取 PDF 時每頁的耗時（頁碼 → 秒）
+        self.page_timings: Dict[int, float] = {}
         
     def read_file(self, file_path: str) -> str:
         """
@@ -29,6 +106,23 @@ class DocumentHandler:
         Returns:
             str: 文件內容
         """
+        return "".join(self.iter_file(file_path))
+
+    def iter_file(self, file_path: str) -> Iterator[str]:
+        """
+        串流讀取文件內容，逐頁（PDF）、逐段（Word）或逐區塊（文本）產生文字
+        
+        Args:
+            file_path (str): 文件路徑
+            
+        Returns:
+            Iterator[str]: 依序產生的文字片段，串接後即為完整內容
+        """
+        for _, text in self._iter_blocks(file_path):
+            yield text
+
+    def _iter_blocks(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """依副檔名串流讀取文件，產生 (頁碼, 文字)，非 PDF 文件的頁碼為 None"""
         file_path = Path(file_path)
         if not file_path.exists():
             raise FileNotFoundError(f"找不到文件：{file_path}")
@@ -36,71 +130,213 @@ class DocumentHandler:
         file_extension = file_path.suffix.lower()
         
         if file_extension == '.txt':
-            return self._read_text_file(file_path)
+            return ((None, text) for text in self._iter_text_file(file_path))
         elif file_extension == '.pdf':
-            return self._read_pdf_file(file_path)
+            return self._iter_pdf_file(file_path)
         elif file_extension == '.docx':
-            return self._read_docx_file(file_path)
+            return ((None, text) for text in self._iter_docx_file(file_path))
         else:
             raise ValueError(f"不支援的文件格式：{file_extension}")
-    
-    def _read_text_file(self, file_path: Path) -> str:
-        """讀取文本文件"""
+
+    def _detect_encoding(self, file_path: Path) -> str:
+        """只讀取檔案開頭 detect_bytes 位元組來偵測編碼"""
+        detector = chardet.UniversalDetector()
+        read = 0
         with open(file_path, 'rb') as f:
-            raw_data = f.read()
-            detected = chardet.detect(raw_data)
-            encoding = detected['encoding']
-        
-        with open(file_path, 'r', encoding=encoding) as f:
-            return f.read()
+            while read < self.detect_bytes and not detector.done:
+                data = f.read(min(8192, self.detect_bytes - read))
+                if not data:
+                    break
+                detector.feed(data)
+                read += len(data)
+        detector.close()
+        return detector.result['encoding'] or 'utf-8'
     
-    def _read_pdf_file(self, file_path: Path) -> str:
-        """讀取PDF文件"""
-        text = ""
+    def _iter_text_file(self, file_path: Path) -> Iterator[str]:
+        """串流讀取文本文件"""
+        encoding = self._detect_encoding(file_path)
+        # 編碼只由開頭推測，後段若有無法解碼的位元組則以替代字元處理
+        with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+            while True:
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                yield block
+    
+    def _iter_pdf_file(self, file_path: Path) -> Iterator[Tuple[int, str]]:
+        """逐頁讀取PDF文件，頁數足夠時以程序池平行抽取並保持頁序"""
+        self.page_timings = {}
+        began = time.perf_counter()
         with open(file_path, 'rb') as f:
             pdf_reader = PdfReader(f)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            page_count = len(pdf_reader.pages)
+            if not self.parallel or page_count < self.min_parallel_pages:
+                for page_number, page in enumerate(pdf_reader.pages, 1):
+                    page_began = time.perf_counter()
+                    text = page.extract_text()
+                    self.page_timings[page_number] = time.perf_counter() - page_began
+                    yield page_number, text + "\n"
+                return
+        
+        yield from self._iter_pdf_parallel(file_path, page_count)
+        logger.info(
+            f"平行抽取 {file_path.name} 共 {page_count} 頁，耗時 {time.perf_counter() - began:.2f} 秒，"
+            f"單頁累計 {sum(self.page_timings.values()):.2f} 秒"
+        )
+
+    def _iter_pdf_parallel(self, file_path: Path, page_count: int) -> Iterator[Tuple[int, str]]:
+        """將頁面範圍分派到程序池，依序產生結果；同時進行中的工作數有上限以控制記憶體"""
+        executor = self.executor
+        owns_executor = executor is None
+        if owns_executor:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=spawn_context())
+        try:
+            ranges = deque(
+                (start, min(start + self.pages_per_task, page_count))
+                for start in range(0, page_count, self.pages_per_task)
+            )
+            in_flight = deque()
+            while ranges or in_flight:
+                while ranges and len(in_flight) < self.max_workers * 2:
+                    start, stop = ranges.popleft()
+                    in_flight.append(executor.submit(_extract_pdf_pages, str(file_path), start, stop))
+                for page_number, text, seconds in in_flight.popleft().result():
+                    self.page_timings[page_number] = seconds
+                    yield page_number, text
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if owns_executor:
+                executor.shutdown(wait=True)
     
-    def _read_docx_file(self, file_path: Path) -> str:
-        """讀取Word文件"""
+    def _iter_docx_file(self, file_path: Path) -> Iterator[str]:
+        """逐段讀取Word文件；平行模式且有共用程序池時在子程序中抽取"""
+        if self.parallel and self.executor is not None:
+            yield self.executor.submit(_extract_docx_text, str(file_path)).result()
+            return
         doc = docx.Document(file_path)
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        for index, paragraph in enumerate(doc.paragraphs):
+            yield paragraph.text if index == 0 else "\n" + paragraph.text
+
+    def read_files(self, file_paths: List[str]) -> List[str]:
+        """
+        讀取多個文件，平行模式下將整份文件分派到程序池
+        
+        Args:
+            file_paths (List[str]): 文件路徑列表
+            
+        Returns:
+            List[str]: 依輸入順序排列的文件內容
+        """
+        if not self.parallel or len(file_paths) < 2:
+            return [self.read_file(file_path) for file_path in file_paths]
+        
+        executor = self.executor
+        owns_executor = executor is None
+        if owns_executor:
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.max_workers, len(file_paths)), mp_context=spawn_context()
+            )
+        try:
+            futures = [
+                executor.submit(_read_file_serial, str(file_path), self.block_size, self.detect_bytes)
+                for file_path in file_paths
+            ]
+            return [future.result() for future in futures]
+        finally:
+            if owns_executor:
+                executor.shutdown(wait=True)
     
-    def split_into_chunks(self, text: str) -> List[str]:
+    def split_into_chunks(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
         """
         將文本分割成塊
         
+        接受完整字串或文字片段的串流（例如 iter_file 的輸出），並以惰性方式
+        產生文本塊；緩衝區只保留目前視窗附近的文字，記憶體用量與文件大小無關。
+        此模式下 chunk_size 與 chunk_overlap 以字符數計算（以 token 計算請用 iter_chunks）。
+        
         Args:
-            text (str): 要分割的文本
+            text (Union[str, Iterable[str]]): 要分割的文本或文字片段串流
             
         Returns:
-            List[str]: 文本塊列表
+            Iterator[str]: 文本塊
         """
-        if not text:
-            return []
-            
-        chunks = []
+        blocks = iter([text] if isinstance(text, str) else text)
+        buffer = ""
+        base = 0  # buffer[0] 在整份文本中的位置
         start = 0
-        text_length = len(text)
+        exhausted = False
         
-        while start < text_length:
+        while True:
+            # 讀入足夠的文字以判斷視窗後是否還有內容
+            while not exhausted and len(buffer) - (start - base) <= self.chunk_size:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                else:
+                    buffer += block
+            
+            text_length = base + len(buffer)
+            if start >= text_length:
+                break
+                
             end = start + self.chunk_size
             
             # 如果這不是最後一個塊，嘗試在句子或段落邊界處分割
             if end < text_length:
                 # 尋找最近的句子結束符號
                 for sep in ['. ', '! ', '? ', '\n']:
-                    pos = text.rfind(sep, start, end)
+                    pos = buffer.rfind(sep, start - base, end - base)
                     if pos != -1:
-                        end = pos + 1
+                        end = base + pos + 1
                         break
             
-            chunks.append(text[start:end].strip())
-            start = end - self.chunk_overlap
+            chunk = buffer[start - base:end - base].strip()
+            if chunk:
+                yield chunk
+            if end >= text_length:
+                break
+            
+            # 確保每次至少前進一個字符，避免分隔符號太靠近視窗開頭時無限循環
+            start = max(end - self.chunk_overlap, start + 1)
+            
+            # 已處理的文字累積到一定量才捨棄，避免每個塊都複製緩衝區
+            consumed = start - base
+            if consumed > self.chunk_size and consumed * 2 > len(buffer):
+                buffer = buffer[consumed:]
+                base = start
+    
+    def iter_document(self, file_path: str) -> Iterator[str]:
+        """
+        以串流方式處理文件並惰性產生文本塊
+        
+        Args:
+            file_path (str): 文件路徑
+            
+        Returns:
+            Iterator[str]: 文本塊
+        """
+        return self.split_into_chunks(self.iter_file(file_path))
+    
+    def iter_chunks(self, file_path: str) -> Iterator["Chunk"]:
+        """
+        以 token 為單位串流分塊，並附上每塊的字元位置與頁碼
+        
+        此模式下 chunk_size 與 chunk_overlap 以 token 數計算。
+        
+        Args:
+            file_path (str): 文件路徑
             
-        return chunks
+        Returns:
+            Iterator[Chunk]: 含 start/end 字元位置與頁碼的文本塊
+        """
+        from .chunker import TokenChunker
+        chunker = TokenChunker(
+            chunk_tokens=self.chunk_size,
+            chunk_overlap_tokens=self.chunk_overlap,
+            tokenizer_name=self.tokenizer_name
+        )
+        return chunker.iter_chunks(self._iter_blocks(file_path))
     
     def process_document(self, file_path: str) -> List[str]:
         """
@@ -112,5 +348,16 @@ class DocumentHandler:
         Returns:
             List[str]: 文本塊列表
         """
-        text = self.read_file(file_path)
-        return self.split_into_chunks(text)
+        return list(self.iter_document(file_path))
+
+    def process_documents(self, file_paths: List[str]) -> List[List[str]]:
+        """
+        處理多個文件並返回各自分塊後的文本
+        
+        Args:
+            file_paths (List[str]): 文件路徑列表
+            
+        Returns:
+            List[List[str]]: 依輸入順序排列的文本塊列表
+        """
+        return [list(self.split_into_chunks(text)) for text in self.read_files(file_paths)]
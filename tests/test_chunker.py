@@ -0,0 +1,119 @@
+import pytest
+
+from flare.utils.chunker import RegexTokenizer, TokenChunker
+from flare.utils.document_handler import DocumentHandler
+
+
+def make_pages(count, sentences_per_page=12):
+    """(頁碼, 文字) 片段：每頁數個長度不一的句子，段落以換行分隔"""
+    pages = []
+    for page in range(1, count + 1):
+        sentences = [
+            f"Page {page} sentence {i} mentions host-{page}.{i} and " + "word " * (i % 7) + "ends here."
+            for i in range(sentences_per_page)
+        ]
+        pages.append((page, " ".join(sentences) + "\n"))
+    return pages
+
+
+def page_at(pages, position):
+    offset = 0
+    for page, text in pages:
+        if position < offset + len(text):
+            return page
+        offset += len(text)
+    raise AssertionError(f"position {position} is past the end of the document")
+
+
+def token_spans(pages):
+    """每個片段分別 tokenize 後的絕對位置（與 TokenChunker 相同）"""
+    spans = []
+    offset = 0
+    for _, text in pages:
+        spans.extend((offset + start, offset + end) for start, end in RegexTokenizer().token_spans(text))
+        offset += len(text)
+    return spans
+
+
+@pytest.mark.parametrize("chunk_tokens, overlap", [(16, 0), (32, 8), (50, 49), (1000, 64)])
+def test_offsets_slice_back_to_chunk_text(chunk_tokens, overlap):
+    pages = make_pages(30)
+    document = "".join(text for _, text in pages)
+
+    chunks = list(TokenChunker(chunk_tokens, overlap).iter_chunks(pages))
+
+    assert chunks
+    for chunk in chunks:
+        assert document[chunk.start:chunk.end] == chunk.text
+        assert 0 < chunk.token_count <= chunk_tokens
+
+
+def test_chunks_carry_the_page_of_their_start():
+    pages = make_pages(20)
+
+    chunks = list(TokenChunker(24, 4).iter_chunks(pages))
+
+    assert {chunk.page for chunk in chunks} == set(range(1, 21))
+    for chunk in chunks:
+        assert chunk.page == page_at(pages, chunk.start)
+
+
+def test_blocks_without_page_numbers():
+    chunks = list(TokenChunker(8, 2).iter_chunks([(None, "one two three. four five six seven eight nine ten.")]))
+
+    assert chunks
+    assert all(chunk.page is None for chunk in chunks)
+
+
+@pytest.mark.parametrize("chunk_tokens, overlap", [(16, 0), (16, 15), (64, 63), (7, 3)])
+def test_every_token_is_covered(chunk_tokens, overlap):
+    pages = make_pages(25)
+    spans = token_spans(pages)
+
+    chunks = list(TokenChunker(chunk_tokens, overlap).iter_chunks(pages))
+
+    assert chunks[0].start == spans[0][0]
+    assert chunks[-1].end == spans[-1][1]
+    covered = iter(chunks)
+    chunk = next(covered)
+    for start, end in spans:
+        while end > chunk.end:
+            chunk = next(covered)
+        assert chunk.start <= start
+
+
+@pytest.mark.parametrize("chunk_tokens, overlap", [(10, 9), (32, 31), (2, 1)])
+def test_large_overlap_still_moves_forward(chunk_tokens, overlap):
+    pages = make_pages(10)
+    tokens = len(token_spans(pages))
+
+    chunks = list(TokenChunker(chunk_tokens, overlap).iter_chunks(pages))
+
+    starts = [chunk.start for chunk in chunks]
+    assert starts == sorted(set(starts))
+    # 每塊至少前進自身長度的一半
+    assert len(chunks) <= 2 * tokens // max(1, chunk_tokens // 2) + 2
+
+
+@pytest.mark.parametrize("chunk_tokens, overlap", [(8, 8), (8, 20), (0, 0), (8, -1)])
+def test_invalid_sizes_are_rejected(chunk_tokens, overlap):
+    with pytest.raises(ValueError):
+        TokenChunker(chunk_tokens, overlap)
+
+
+def test_empty_blocks_are_skipped():
+    chunks = list(TokenChunker(4, 1).iter_chunks([(1, ""), (2, "alpha beta"), (3, ""), (4, "gamma delta epsilon")]))
+
+    assert chunks[0].page == 2
+    assert chunks[-1].text.endswith("epsilon")
+
+
+def test_split_into_chunks_moves_forward_when_overlap_exceeds_size():
+    text = "abcdefghij. " * 20
+
+    chunks = list(DocumentHandler(chunk_size=10, chunk_overlap=15).split_into_chunks(text))
+
+    assert chunks
+    assert len(chunks) <= len(text)
+    # 最後一塊到達文本結尾
+    assert text.rstrip().endswith(chunks[-1])
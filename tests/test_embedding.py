@@ -0,0 +1,169 @@
+import asyncio
+import json
+
+import httpx
+import numpy as np
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from flare.embedding.main import BGEEmbedding
+
+BAD_TEXT = "malformed"
+
+
+def fake_embedding(text):
+    return [float(len(text)), 1.0]
+
+
+def fake_reply(texts):
+    """模擬 Ollama /api/embed 的狀態碼與內容：含 BAD_TEXT 的批次整批被拒絕"""
+    if BAD_TEXT in texts:
+        return 400, {"error": "invalid input"}
+    return 200, {"embeddings": [fake_embedding(text) for text in texts]}
+
+
+class FakeOllamaAdapter(BaseAdapter):
+    """在本地回應 /api/embed 並記錄每個批次的 requests 傳輸層"""
+
+    def __init__(self, error=None, status=None):
+        super().__init__()
+        self.error = error
+        self.status = status
+        self.batches = []
+
+    def send(self, request, **kwargs):
+        texts = json.loads(request.body)["input"]
+        self.batches.append(texts)
+        if self.error is not None:
+            raise self.error
+        status, body = fake_reply(texts)
+        if self.status is not None:
+            status, body = self.status, {"error": "service unavailable"}
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode("utf-8")
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def make_embedder(adapter, **kwargs):
+    embedder = BGEEmbedding(base_url="http://ollama.test", **kwargs)
+    embedder.session.mount("http://", adapter)
+    return embedder
+
+
+def texts_with_bad(count, bad_index):
+    texts = [f"text number {i}" for i in range(count)]
+    texts[bad_index] = BAD_TEXT
+    return texts
+
+
+def test_embed_texts_bisects_down_to_the_bad_text():
+    adapter = FakeOllamaAdapter()
+    embedder = make_embedder(adapter, batch_size=8)
+    texts = texts_with_bad(8, 5)
+
+    embeddings, failed = embedder.embed_texts(texts)
+
+    assert failed == [5]
+    assert embeddings.shape == (8, 2)
+    assert np.isnan(embeddings[5]).all()
+    for i in range(8):
+        if i != 5:
+            assert embeddings[i].tolist() == fake_embedding(texts[i])
+    # 深度優先二分：整批 -> [0..3] 成功、[4..7] 失敗 -> [4, 5] 失敗 -> [4]、[5] -> [6, 7]
+    assert [len(batch) for batch in adapter.batches] == [8, 4, 4, 2, 1, 1, 2]
+    assert adapter.batches[5] == [BAD_TEXT]
+
+
+def test_embed_texts_reports_empty_texts_without_sending_them():
+    adapter = FakeOllamaAdapter()
+    embedder = make_embedder(adapter)
+
+    embeddings, failed = embedder.embed_texts(["first", "  ", "third"])
+
+    assert failed == [1]
+    assert adapter.batches == [["first", "third"]]
+    assert embeddings[2].tolist() == fake_embedding("third")
+
+
+def test_get_embeddings_raises_when_a_text_fails():
+    embedder = make_embedder(FakeOllamaAdapter(), batch_size=4)
+
+    with pytest.raises(ValueError, match=r"\[2\]"):
+        embedder.get_embeddings(texts_with_bad(4, 2))
+
+
+def test_connection_errors_are_not_bisected():
+    adapter = FakeOllamaAdapter(error=requests.ConnectionError("refused"))
+    embedder = make_embedder(adapter, batch_size=8)
+
+    with pytest.raises(requests.ConnectionError):
+        embedder.embed_texts(texts_with_bad(8, 5))
+    assert len(adapter.batches) == 1
+
+
+def test_server_errors_are_not_bisected():
+    adapter = FakeOllamaAdapter(status=503)
+    embedder = make_embedder(adapter, batch_size=8)
+
+    with pytest.raises(requests.HTTPError):
+        embedder.embed_texts(texts_with_bad(8, 5))
+    # 伺服器持續回應 503：不拆批，也不把文本標記為失敗
+    assert len(adapter.batches) == 1
+
+
+def test_async_embed_texts_bisects_down_to_the_bad_text():
+    batches = []
+
+    def handler(request):
+        texts = json.loads(request.content)["input"]
+        batches.append(texts)
+        status, body = fake_reply(texts)
+        return httpx.Response(status, json=body)
+
+    async def run():
+        embedder = BGEEmbedding(base_url="http://ollama.test", batch_size=4)
+        embedder._async_client = httpx.AsyncClient(base_url=embedder.base_url, transport=httpx.MockTransport(handler))
+        embedder._async_semaphore = asyncio.Semaphore(embedder.max_concurrency)
+        try:
+            texts = texts_with_bad(8, 1)
+            embeddings, failed = await embedder.aembed_texts(texts)
+            with pytest.raises(ValueError, match=r"\[1\]"):
+                await embedder.aget_embeddings(texts)
+            return texts, embeddings, failed
+        finally:
+            await embedder.aclose()
+
+    texts, embeddings, failed = asyncio.run(run())
+
+    assert failed == [1]
+    assert np.isnan(embeddings[1]).all()
+    assert embeddings[7].tolist() == fake_embedding(texts[7])
+    assert [BAD_TEXT] in batches
+
+
+def test_async_server_errors_are_not_bisected():
+    batches = []
+
+    def handler(request):
+        batches.append(json.loads(request.content)["input"])
+        return httpx.Response(503, json={"error": "service unavailable"})
+
+    async def run():
+        embedder = BGEEmbedding(base_url="http://ollama.test", batch_size=8, max_retries=0)
+        embedder._async_client = httpx.AsyncClient(base_url=embedder.base_url, transport=httpx.MockTransport(handler))
+        embedder._async_semaphore = asyncio.Semaphore(embedder.max_concurrency)
+        try:
+            await embedder.aembed_texts(texts_with_bad(8, 1))
+        finally:
+            await embedder.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert len(batches) == 1
@@ -0,0 +1,56 @@
+import numpy as np
+
+from flare.embedding.cache import EmbeddingCache
+
+VECTOR = np.asarray([0.25, 0.5, 0.75], dtype=np.float32)
+
+
+def open_cache(directory, model_name):
+    cache = EmbeddingCache(model_name, cache_dir=str(directory))
+    cache.open()
+    return cache
+
+
+def test_disk_cache_survives_reopen(tmp_path):
+    cache = open_cache(tmp_path, "bge-m3")
+    cache.put("bge-m3", "hello", VECTOR)
+    cache.close()
+
+    cache = open_cache(tmp_path, "bge-m3")
+    assert np.array_equal(cache.get("bge-m3", "hello"), VECTOR)
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+
+def test_model_change_keeps_foreign_files(tmp_path):
+    foreign = tmp_path / "keep.txt"
+    foreign.write_text("not ours", encoding="utf-8")
+    (tmp_path / "nested").mkdir()
+    cache = open_cache(tmp_path, "bge-m3")
+    cache.put("bge-m3", "hello", VECTOR)
+    cache.close()
+
+    # 以另一個模型開啟：清除快取檔案，但目錄中的其他檔案保留
+    cache = open_cache(tmp_path, "other-model")
+    assert cache.get("other-model", "hello") is None
+    assert cache.stats()["disk_entries"] == 0
+    # 執行期間切換模型同樣只清除自己的檔案
+    cache.put("other-model", "hello", VECTOR)
+    assert cache.get("bge-m3", "hello") is None
+    cache.close()
+
+    assert foreign.read_text(encoding="utf-8") == "not ours"
+    assert (tmp_path / "nested").is_dir()
+
+
+def test_unreadable_meta_does_not_touch_foreign_files(tmp_path):
+    foreign = tmp_path / "keep.txt"
+    foreign.write_text("not ours", encoding="utf-8")
+    (tmp_path / "meta.json").write_text("{broken", encoding="utf-8")
+
+    cache = open_cache(tmp_path, "bge-m3")
+    cache.put("bge-m3", "hello", VECTOR)
+    cache.close()
+
+    assert foreign.exists()
+    assert np.array_equal(open_cache(tmp_path, "bge-m3").get("bge-m3", "hello"), VECTOR)
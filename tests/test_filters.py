@@ -0,0 +1,221 @@
+from datetime import datetime, timezone
+
+import pytest
+from qdrant_client.http import models
+
+from flare.rag.filters import FilterCompiler, FilterError, PayloadIndexer, compile_filter
+from flare.rag.qdrant_handler import build_filter
+
+
+def baseline_filter(payload_filter=None, filter_conditions=None, filter_type="must"):
+    """QdrantHandler.search 原本（未使用 FilterCompiler 前）建立過濾器的方式"""
+    if payload_filter is None and filter_conditions is None:
+        return None
+    conditions = [
+        models.FieldCondition(key=key, match=models.MatchValue(value=value))
+        for key, value in (payload_filter or {}).items()
+    ]
+    for condition in filter_conditions or []:
+        field_condition = None
+        if condition.get("match") is not None:
+            field_condition = models.FieldCondition(
+                key=condition["key"], match=models.MatchValue(value=condition["match"])
+            )
+        if condition.get("range") is not None:
+            range_params = {bound: condition["range"][bound] for bound in ("gte", "lte", "gt", "lt") if bound in condition["range"]}
+            field_condition = models.FieldCondition(key=condition["key"], range=models.Range(**range_params))
+        if field_condition is not None:
+            conditions.append(field_condition)
+    if filter_type == "must":
+        return models.Filter(must=conditions)
+    if filter_type == "should":
+        return models.Filter(should=conditions)
+    if filter_type == "must_not":
+        return models.Filter(must_not=conditions)
+    raise ValueError(f"Unsupported filter type: {filter_type}")
+
+
+LEGACY_CASES = [
+    ({"category": "news"}, None, "must"),
+    ({"category": "news", "year": 2024, "published": True}, None, "must"),
+    (None, [{"key": "severity", "range": {"gte": 7, "lt": 9.5}}], "must"),
+    ({"source": "nvd.pdf"}, [{"key": "page", "match": 3}, {"key": "score", "range": {"gt": 0.5}}], "should"),
+    (None, [{"key": "status", "match": "rejected"}], "must_not"),
+    # range 與 match 並存時以 range 為準，沒有條件的項目被忽略
+    (None, [{"key": "year", "match": 2020, "range": {"lte": 2022}}, {"key": "ignored"}], "must"),
+    ({}, None, "must"),
+    (None, None, "must"),
+]
+
+
+@pytest.mark.parametrize("payload_filter, filter_conditions, filter_type", LEGACY_CASES)
+def test_legacy_arguments_compile_to_baseline_filter(payload_filter, filter_conditions, filter_type):
+    assert build_filter(payload_filter, filter_conditions, filter_type) == baseline_filter(
+        payload_filter, filter_conditions, filter_type
+    )
+
+
+def test_legacy_filter_type_is_validated():
+    with pytest.raises(ValueError):
+        build_filter({"category": "news"}, filter_type="any")
+
+
+def test_nested_boolean_expression():
+    compiled = FilterCompiler().compile({"and": [
+        {"key": "source", "any": ["nvd.pdf", "mitre.pdf"]},
+        {"or": [
+            {"key": "severity", "range": {"gte": 7}},
+            {"not": {"key": "status", "match": "rejected"}}
+        ]},
+        {"has_id": [1, 2]}
+    ]})
+
+    assert compiled.filter == models.Filter(must=[
+        models.FieldCondition(key="source", match=models.MatchAny(any=["nvd.pdf", "mitre.pdf"])),
+        models.Filter(should=[
+            models.FieldCondition(key="severity", range=models.Range(gte=7)),
+            models.Filter(must_not=[models.FieldCondition(key="status", match=models.MatchValue(value="rejected"))])
+        ]),
+        models.HasIdCondition(has_id=[1, 2])
+    ])
+    assert compiled.fields == {
+        "source": models.PayloadSchemaType.KEYWORD,
+        "severity": models.PayloadSchemaType.INTEGER,
+        "status": models.PayloadSchemaType.KEYWORD
+    }
+
+
+def test_single_condition_and_field_operators():
+    compiler = FilterCompiler()
+
+    assert compiler.compile({"key": "tag", "except": [1, 2]}).filter == models.Filter(must=[
+        models.FieldCondition(key="tag", match=models.MatchExcept(**{"except": [1, 2]}))
+    ])
+    assert compiler.compile({"key": "body", "text": "heartbleed"}).fields == {"body": models.PayloadSchemaType.TEXT}
+    assert compiler.compile({"not": [{"key": "notes", "is_empty": True}]}).filter == models.Filter(must_not=[
+        models.IsEmptyCondition(is_empty=models.PayloadField(key="notes"))
+    ])
+    assert compiler.compile({"key": "notes", "is_null": True}).filter.must == [
+        models.IsNullCondition(is_null=models.PayloadField(key="notes"))
+    ]
+    assert compiler.compile({"key": "score", "range": {"gt": 0.5}}).fields == {"score": models.PayloadSchemaType.FLOAT}
+
+
+def test_string_range_bounds_become_datetime_range():
+    compiled = FilterCompiler().compile(
+        {"key": "published", "range": {"gte": "2024-01-01T00:00:00Z", "lt": "2024-07-01T08:00:00+08:00"}}
+    )
+
+    condition = compiled.filter.must[0]
+    assert isinstance(condition.range, models.DatetimeRange)
+    assert condition.range.gte == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert condition.range.lt == datetime(2024, 7, 1, 0, 0, tzinfo=timezone.utc)
+    assert compiled.fields == {"published": models.PayloadSchemaType.DATETIME}
+
+
+def test_naive_datetime_bounds_are_utc():
+    compiled = FilterCompiler().compile({"key": "published", "range": {"lte": "2024-03-05"}})
+
+    assert compiled.filter.must[0].range.lte == datetime(2024, 3, 5, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("expression", [
+    ["not", "an", "object"],
+    {"and": [], "or": []},
+    {"and": {"key": "a", "match": 1}},
+    {"match": "news"},
+    {"key": "", "match": "news"},
+    {"key": "tag", "match": ["a", "b"]},
+    {"key": "tag", "match": "a", "any": ["b"]},
+    {"key": "tag", "equals": "a"},
+    {"key": "tag", "any": []},
+    {"key": "tag", "any": ["a", 1]},
+    {"key": "tag", "any": [1.5, 2.5]},
+    {"key": "body", "text": ""},
+    {"key": "year", "range": {}},
+    {"key": "year", "range": {"above": 3}},
+    {"key": "year", "range": {"gte": 2020, "lt": "2024-01-01"}},
+    {"key": "published", "range": {"gte": "yesterday"}},
+    {"key": "notes", "is_empty": False},
+    {"has_id": []},
+    {"has_id": [1], "key": "tag"},
+    {"key": "tag", "match": {1, 2}},
+])
+def test_malformed_expressions_raise_filter_error(expression):
+    compiler = FilterCompiler()
+
+    with pytest.raises(FilterError):
+        compiler.compile(expression)
+    assert compiler.stats()["entries"] == 0
+
+
+def test_filter_error_is_a_value_error():
+    assert issubclass(FilterError, ValueError)
+
+
+def test_compilation_is_memoized_by_canonical_form():
+    compiler = FilterCompiler()
+
+    first = compiler.compile({"key": "tag", "match": "news"})
+    second = compiler.compile({"match": "news", "key": "tag"})
+
+    assert second is first
+    assert compiler.stats()["hits"] == 1
+    assert compiler.stats()["misses"] == 1
+
+
+def test_memoization_is_bounded_lru():
+    compiler = FilterCompiler(max_entries=2)
+    a = compiler.compile({"key": "a", "match": 1})
+    compiler.compile({"key": "b", "match": 1})
+    # a 最近被使用，加入 c 時淘汰的是 b
+    assert compiler.compile({"key": "a", "match": 1}) is a
+    compiler.compile({"key": "c", "match": 1})
+
+    assert compiler.stats()["entries"] == 2
+    assert compiler.compile({"key": "a", "match": 1}) is a
+    misses = compiler.stats()["misses"]
+    compiler.compile({"key": "b", "match": 1})
+    assert compiler.stats()["misses"] == misses + 1
+
+
+def test_expression_is_combined_with_legacy_arguments():
+    compiled = compile_filter(
+        payload_filter={"category": "news"},
+        filter_expression={"key": "year", "range": {"gte": 2020}},
+        compiler=FilterCompiler()
+    )
+
+    assert compiled.filter == models.Filter(must=[
+        models.Filter(must=[models.FieldCondition(key="category", match=models.MatchValue(value="news"))]),
+        models.FieldCondition(key="year", range=models.Range(gte=2020))
+    ])
+    assert compile_filter() is None
+
+
+def test_payload_indexer_reports_a_field_once_at_threshold():
+    compiler = FilterCompiler()
+    indexer = PayloadIndexer(min_uses=3)
+    compiled = compiler.compile({"and": [{"key": "source", "match": "nvd"}, {"key": "year", "range": {"gte": 2020}}]})
+
+    assert indexer.observe("docs", compiled) == []
+    assert indexer.observe("docs", compiled) == []
+    assert indexer.observe("docs", compiled) == [
+        ("source", models.PayloadSchemaType.KEYWORD),
+        ("year", models.PayloadSchemaType.INTEGER)
+    ]
+    assert indexer.observe("docs", compiled) == []
+
+
+def test_payload_indexer_counts_per_collection_and_forgets():
+    compiled = FilterCompiler().compile({"key": "source", "match": "nvd"})
+    indexer = PayloadIndexer(min_uses=2)
+
+    indexer.observe("docs", compiled)
+    assert indexer.observe("other", compiled) == []
+    assert indexer.observe("docs", compiled) == [("source", models.PayloadSchemaType.KEYWORD)]
+
+    indexer.forget("docs")
+    assert indexer.observe("docs", compiled) == []
+    assert indexer.observe("docs", compiled) == [("source", models.PayloadSchemaType.KEYWORD)]
+    assert indexer.observe("docs", None) == []
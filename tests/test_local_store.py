@@ -0,0 +1,270 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from qdrant_client.http.models import Distance
+
+from flare.rag.local_store import LocalVectorStore, _FilterEvaluator, payload_values
+from flare.rag.sparse import SparseEncoder
+
+DIMENSION = 8
+TEXTS = [
+    "openssl heartbleed CVE-2014-0160 patch for 10.0.0.5",
+    "apache struts remote code execution",
+    "windows registry persistence HKLM\\Software\\Run",
+    "openssl 1.0.1g fixes heartbleed",
+    "phishing email with malicious attachment",
+    "ransomware encrypts files on shared drives",
+]
+
+
+def unit_vectors(count, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(path=str(tmp_path / "store"), vector_size=DIMENSION)
+    store.start()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def encoder():
+    return SparseEncoder()
+
+
+def add_documents(store, encoder, vectors, name="docs"):
+    store.create_collection(name)
+    store.add(
+        name,
+        vectors,
+        [{"text": text, "row": row} for row, text in enumerate(TEXTS)],
+        ids=[str(row) for row in range(len(TEXTS))],
+        sparse_vectors=encoder.encode_documents(TEXTS)
+    )
+
+
+def test_dense_search_matches_brute_force(store, encoder):
+    vectors = unit_vectors(len(TEXTS))
+    add_documents(store, encoder, vectors)
+    query = unit_vectors(1, seed=1)[0]
+
+    results = store.search("docs", query.tolist(), limit=3)
+
+    expected = np.argsort(-(vectors @ query))[:3]
+    assert [hit["id"] for hit in results] == [str(row) for row in expected]
+    assert [hit["score"] for hit in results] == pytest.approx((vectors @ query)[expected].tolist(), abs=1e-5)
+    assert results[0]["payload"]["text"] == TEXTS[expected[0]]
+
+
+def test_dense_search_score_threshold(store, encoder):
+    vectors = unit_vectors(len(TEXTS))
+    add_documents(store, encoder, vectors)
+
+    results = store.search("docs", vectors[2].tolist(), limit=10, score_threshold=0.99)
+
+    assert [hit["id"] for hit in results] == ["2"]
+
+
+def test_euclid_scores_are_distances(store):
+    store.create_collection("points", distance=Distance.EUCLID)
+    store.add("points", [[0.0] * DIMENSION, [1.0] * DIMENSION, [3.0] * DIMENSION], [{}, {}, {}], ids=["a", "b", "c"])
+
+    results = store.search("points", [0.9] * DIMENSION, limit=3, score_threshold=3.0)
+
+    assert [hit["id"] for hit in results] == ["b", "a"]
+    assert results[0]["score"] == pytest.approx(0.1 * np.sqrt(DIMENSION), abs=1e-5)
+
+
+def test_sparse_search_ranks_exact_terms(store, encoder):
+    add_documents(store, encoder, unit_vectors(len(TEXTS)))
+
+    results = store.search(
+        "docs", [0.0] * DIMENSION, limit=5, mode="sparse", sparse_vector=encoder.encode_query("CVE-2014-0160")
+    )
+
+    assert [hit["id"] for hit in results] == ["0"]
+    heartbleed = store.search(
+        "docs", [0.0] * DIMENSION, limit=5, mode="sparse", sparse_vector=encoder.encode_query("heartbleed")
+    )
+    assert {hit["id"] for hit in heartbleed} == {"0", "3"}
+
+
+def test_hybrid_search_fuses_dense_and_sparse(store, encoder):
+    vectors = unit_vectors(len(TEXTS))
+    add_documents(store, encoder, vectors)
+
+    # dense 查詢最接近 id 5，稀疏查詢只命中 id 1
+    results = store.search(
+        "docs", vectors[5].tolist(), limit=6, mode="hybrid",
+        sparse_vector=encoder.encode_query("struts")
+    )
+
+    ids = [hit["id"] for hit in results]
+    assert ids[:2] == ["5", "1"] or ids[:2] == ["1", "5"]
+    # 同時出現在兩個列表的點（id 1）分數為兩個倒數排名之和
+    dense_rank = [hit["id"] for hit in store.search("docs", vectors[5].tolist(), limit=24)].index("1") + 1
+    assert results[ids.index("1")]["score"] == pytest.approx(1 / (60 + 1) + 1 / (60 + dense_rank))
+
+
+def test_sparse_modes_fall_back_to_dense_without_sparse_vectors(store, encoder):
+    vectors = unit_vectors(len(TEXTS))
+    store.create_collection("dense_only")
+    store.add("dense_only", vectors, [{} for _ in TEXTS], ids=[str(row) for row in range(len(TEXTS))])
+
+    results = store.search(
+        "dense_only", vectors[4].tolist(), limit=1, mode="hybrid", sparse_vector=encoder.encode_query("phishing")
+    )
+
+    assert [hit["id"] for hit in results] == ["4"]
+
+
+def test_re_adding_points_is_idempotent(store, encoder):
+    vectors = unit_vectors(len(TEXTS))
+    add_documents(store, encoder, vectors)
+    add_documents(store, encoder, vectors)
+
+    assert store.manage("get_info", "docs")["points_count"] == len(TEXTS)
+    results = store.search("docs", vectors[3].tolist(), limit=len(TEXTS) * 2)
+    assert sorted(hit["id"] for hit in results) == sorted(str(row) for row in range(len(TEXTS)))
+
+
+def test_re_adding_overwrites_unless_skip_existing(store, encoder):
+    vectors = unit_vectors(2)
+    store.create_collection("docs")
+    store.add("docs", vectors, [{"version": 1}, {"version": 1}], ids=["a", "b"])
+
+    store.add("docs", vectors[:1], [{"version": 2}], ids=["a"])
+    store.add("docs", vectors, [{"version": 3}, {"version": 3}], ids=["a", "b"], skip_existing=True)
+
+    payloads = {hit["id"]: hit["payload"] for hit in store.search("docs", vectors[0].tolist(), limit=5)}
+    assert payloads == {"a": {"version": 2}, "b": {"version": 1}}
+    assert store.existing_ids("docs", ["a", "c"]) == {"a"}
+
+
+def test_collections_persist_across_reopen(tmp_path, encoder):
+    path = str(tmp_path / "store")
+    vectors = unit_vectors(len(TEXTS))
+    store = LocalVectorStore(path=path, vector_size=DIMENSION)
+    store.start()
+    add_documents(store, encoder, vectors)
+    store.add("docs", vectors[:1], [{"text": "updated", "row": 0}], ids=["0"])
+    dense = store.search("docs", vectors[1].tolist(), limit=3)
+    store.close()
+
+    reopened = LocalVectorStore(path=path, vector_size=DIMENSION)
+    reopened.start()
+    try:
+        assert reopened.list_collections() == ["docs"]
+        assert reopened.manage("get_info", "docs")["points_count"] == len(TEXTS)
+        assert reopened.search("docs", vectors[1].tolist(), limit=3) == dense
+        assert reopened.search("docs", vectors[0].tolist(), limit=1)[0]["payload"]["text"] == "updated"
+        sparse = reopened.search(
+            "docs", [0.0] * DIMENSION, limit=5, mode="sparse", sparse_vector=encoder.encode_query("ransomware")
+        )
+        assert [hit["id"] for hit in sparse] == ["5"]
+    finally:
+        reopened.close()
+
+
+def test_ivf_search_with_all_buckets_matches_exact(tmp_path):
+    vectors = unit_vectors(500, seed=3)
+    store = LocalVectorStore(path=str(tmp_path / "ivf"), vector_size=DIMENSION, index="ivf",
+                             ivf_nlist=8, ivf_nprobe=8, ivf_min_points=100)
+    store.start()
+    try:
+        store.create_collection("docs")
+        store.add("docs", vectors, [{} for _ in range(len(vectors))], ids=[str(row) for row in range(len(vectors))])
+        query = unit_vectors(1, seed=4)[0].tolist()
+        indexed = store.search("docs", query, limit=10)
+        exact = store.search("docs", query, limit=10, search_params={"exact": True})
+        assert [hit["id"] for hit in indexed] == [hit["id"] for hit in exact]
+    finally:
+        store.close()
+
+
+# _FilterEvaluator 與 Qdrant 的過濾語意比較
+PAYLOADS = [
+    {"tag": "malware", "tags": ["apt", "windows"], "year": 2014, "score": 9.8, "published": "2014-04-07T00:00:00Z",
+     "active": True, "meta": {"source": "nvd"}},
+    {"tag": "phishing", "tags": ["email"], "year": 2019, "score": 5.0, "published": "2019-01-15T12:00:00Z",
+     "active": False, "meta": {"source": "internal"}},
+    {"tag": "malware", "tags": [], "year": 2021, "score": 7.5, "published": "2021-06-30T08:30:00Z",
+     "optional": None},
+    {"tag": "ransomware", "tags": ["windows", "smb"], "year": 2017, "published": "2017-05-12T00:00:00Z",
+     "optional": "set", "meta": {"source": "nvd"}},
+    {"tag": "recon", "year": 2023, "score": 3.1, "active": True, "optional": []},
+    {"tags": ["linux"], "year": "2020", "score": 6.0},
+]
+
+
+def field(key, **kwargs):
+    return models.FieldCondition(key=key, **kwargs)
+
+
+FILTERS = {
+    "must match": models.Filter(must=[field("tag", match=models.MatchValue(value="malware"))]),
+    "must two": models.Filter(must=[
+        field("tag", match=models.MatchValue(value="malware")),
+        field("year", range=models.Range(gte=2015))
+    ]),
+    "should": models.Filter(should=[
+        field("tag", match=models.MatchValue(value="phishing")),
+        field("tags", match=models.MatchValue(value="smb"))
+    ]),
+    "must_not": models.Filter(must_not=[field("tag", match=models.MatchValue(value="malware"))]),
+    "must and must_not": models.Filter(
+        must=[field("tags", match=models.MatchValue(value="windows"))],
+        must_not=[field("year", range=models.Range(lt=2015))]
+    ),
+    "nested should in must": models.Filter(must=[
+        models.Filter(should=[
+            field("year", range=models.Range(lt=2016)),
+            field("year", range=models.Range(gt=2020))
+        ]),
+        field("active", match=models.MatchValue(value=True))
+    ]),
+    "range numeric": models.Filter(must=[field("score", range=models.Range(gt=5.0, lte=9.8))]),
+    "range ignores strings": models.Filter(must=[field("year", range=models.Range(gte=2018))]),
+    "datetime range": models.Filter(must=[
+        field("published", range=models.DatetimeRange(gte="2017-01-01T00:00:00Z", lt="2021-06-30T09:00:00Z"))
+    ]),
+    "match any": models.Filter(must=[field("tag", match=models.MatchAny(any=["phishing", "recon"]))]),
+    "match any array": models.Filter(must=[field("tags", match=models.MatchAny(any=["smb", "linux"]))]),
+    "match except": models.Filter(must=[field("tag", match=models.MatchExcept(**{"except": ["malware"]}))]),
+    "match bool": models.Filter(must=[field("active", match=models.MatchValue(value=False))]),
+    "nested key": models.Filter(must=[field("meta.source", match=models.MatchValue(value="nvd"))]),
+    "is_empty": models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="optional"))]),
+    "is_empty array": models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="tags"))]),
+    "not is_empty": models.Filter(must_not=[models.IsEmptyCondition(is_empty=models.PayloadField(key="optional"))]),
+    "is_null": models.Filter(must=[models.IsNullCondition(is_null=models.PayloadField(key="optional"))]),
+    "has_id": models.Filter(must=[models.HasIdCondition(has_id=[1, 4])]),
+}
+
+
+@pytest.fixture(scope="module")
+def qdrant():
+    client = QdrantClient(":memory:")
+    client.create_collection("parity", vectors_config=models.VectorParams(size=2, distance=Distance.COSINE))
+    client.upsert("parity", points=[
+        models.PointStruct(id=row, vector=[1.0, 0.0], payload=payload) for row, payload in enumerate(PAYLOADS)
+    ])
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("name", sorted(FILTERS))
+def test_filter_evaluator_matches_qdrant(qdrant, name):
+    query_filter = FILTERS[name]
+    expected, _ = qdrant.scroll("parity", scroll_filter=query_filter, limit=len(PAYLOADS))
+    evaluator = _FilterEvaluator(
+        [str(row) for row in range(len(PAYLOADS))],
+        lambda key: [payload_values(payload, key) for payload in PAYLOADS]
+    )
+
+    mask = evaluator.mask(query_filter)
+
+    assert {str(row) for row in np.flatnonzero(mask)} == {str(point.id) for point in expected}
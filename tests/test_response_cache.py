@@ -0,0 +1,73 @@
+import numpy as np
+
+from flare.llm.response_cache import ResponseCache, context_fingerprint
+
+CHECKPOINT = "checkpoint-100"
+GREEDY = {"max_new_tokens": 32, "do_sample": False}
+INSTRUCTION = "請根據參考資料回答問題"
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_exact_hit_requires_same_context():
+    cache = ResponseCache()
+    docs_a = context_fingerprint(["A docs"])
+    docs_b = context_fingerprint(["B docs"])
+
+    cache.put(CHECKPOINT, GREEDY, INSTRUCTION, "question", "answer grounded in A", docs_a)
+
+    assert cache.get(CHECKPOINT, GREEDY, INSTRUCTION, "question", docs_a) == "answer grounded in A"
+    assert cache.get(CHECKPOINT, GREEDY, INSTRUCTION, "question", docs_b) is None
+
+
+def test_semantic_hits_do_not_cross_contexts():
+    cache = ResponseCache(semantic_threshold=0.9)
+    docs_a = context_fingerprint(["A docs"])
+    docs_b = context_fingerprint(["B docs"])
+    query = unit(1.0, 0.0, 0.0)
+
+    cache.put(CHECKPOINT, GREEDY, INSTRUCTION, "question", "answer grounded in A", docs_a, query)
+
+    assert cache.get(CHECKPOINT, GREEDY, INSTRUCTION, "question", docs_b, query) is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 0
+    assert stats["misses"] == 1
+
+
+def test_semantic_hit_for_similar_query_with_same_context():
+    cache = ResponseCache(semantic_threshold=0.9)
+    docs = context_fingerprint(["A docs"])
+
+    cache.put(CHECKPOINT, GREEDY, INSTRUCTION, "how to patch openssl", "answer", docs, unit(1.0, 0.1, 0.0))
+
+    assert cache.get(CHECKPOINT, GREEDY, INSTRUCTION, "openssl patching?", docs, unit(1.0, 0.0, 0.05)) == "answer"
+    assert cache.get(CHECKPOINT, GREEDY, INSTRUCTION, "unrelated", docs, unit(0.0, 1.0, 0.0)) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_semantic_hits_do_not_cross_checkpoints():
+    cache = ResponseCache(semantic_threshold=0.9)
+    docs = context_fingerprint(["A docs"])
+    query = unit(1.0, 0.0)
+
+    cache.put(CHECKPOINT, GREEDY, INSTRUCTION, "question", "answer", docs, query)
+
+    assert cache.get("checkpoint-200", GREEDY, INSTRUCTION, "question", docs, query) is None
+
+
+def test_sampled_generation_is_bypassed_unless_enabled():
+    sampled = {"max_new_tokens": 32, "do_sample": True, "temperature": 0.8}
+    cache = ResponseCache()
+
+    cache.put(CHECKPOINT, sampled, INSTRUCTION, "question", "answer")
+
+    assert not cache.is_cacheable(sampled)
+    assert cache.get(CHECKPOINT, sampled, INSTRUCTION, "question") is None
+    assert cache.stats()["bypassed"] == 1
+
+    cache = ResponseCache(cache_sampled=True)
+    cache.put(CHECKPOINT, sampled, INSTRUCTION, "question", "answer")
+    assert cache.get(CHECKPOINT, sampled, INSTRUCTION, "question") == "answer"